@@ -1,16 +1,192 @@
 import argparse
-from src.build_dwh import build_data_warehouse
-from src.spotify_playlists import spotify_playlists
-from src.spotify_auth_test import test_spotify_auth
-from src.backup_dwh import backup_database_to_csv
+import importlib
+import os
+from collections import namedtuple
 
+from src.instrumentation import run_command
 
-def main():
-    """Main entrypoint for the project CLI."""
+# Handlers are imported only when their command runs, so `--help` and the
+# short runs from cron and watch wrappers don't pay for pandas, SQLAlchemy,
+# spotipy, http.server or the Gemini client up front. Keep top-level imports light.
+
+# `function` of `module` runs the command with the keyword arguments that
+# `arguments` builds from the parsed args; when `failed` is set and returns
+# True for the handler's result, the CLI exits with status 1.
+Command = namedtuple(
+    "Command", ["module", "function", "arguments", "failed"], defaults=[None]
+)
+
+
+def _without_none(**kwargs):
+    """Drops unset options so the handler's own defaults apply."""
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+COMMANDS = {
+    "build": Command(
+        "src.build_dwh",
+        "build_data_warehouse",
+        lambda args: {"load_engine": args.engine},
+    ),
+    "playlist": Command(
+        "src.spotify_playlists",
+        "spotify_playlists",
+        lambda args: {
+            "journey_name_filter": args.name,
+            "recreate": args.recreate,
+            "changed_since": args.changed_since,
+            "dirty_only": args.dirty_only,
+        },
+    ),
+    "test-auth": Command("src.spotify_auth_test", "test_spotify_auth", lambda args: {}),
+    "backup": Command("src.backup_dwh", "backup_database_to_csv", lambda args: {}),
+    "import-spotify-playlist": Command(
+        "src.import_spotify_playlist",
+        "import_spotify_playlist",
+        lambda args: {
+            "playlist_url": args.SpotifyPlaylistURL,
+            "journey_id": args.journey_id,
+            "granularity": args.granularity,
+        },
+    ),
+    "import-spotify-playlists": Command(
+        "src.import_spotify_playlist",
+        "import_spotify_playlists",
+        lambda args: {
+            "source": args.source,
+            "granularity": args.granularity,
+            "workers": args.workers,
+            "requests_per_second": args.rate_limit,
+        },
+    ),
+    "essays": Command(
+        "src.essay_queue",
+        "run_essay_worker",
+        lambda args: {
+            "max_workers": args.workers,
+            "max_attempts": args.max_attempts,
+            "stream": args.stream,
+        },
+    ),
+    "generate-essays": Command(
+        "src.generate_essays",
+        "generate_essays",
+        lambda args: {
+            "max_workers": args.workers,
+            "max_attempts": args.max_attempts,
+            "journey_ids": args.journey_id,
+            "force": args.force,
+            "refresh": args.refresh,
+            "mode": args.mode,
+            "changed_since": args.changed_since,
+            "dirty_only": args.dirty_only,
+        },
+    ),
+    "sync-md": Command(
+        "src.sync_journey_md_to_db",
+        "sync_journeys_dir",
+        lambda args: {"incremental": not args.full},
+    ),
+    "watch": Command(
+        "src.watch",
+        "watch",
+        lambda args: {
+            "interval": args.interval,
+            "debounce": args.debounce,
+            "sync_playlists": not args.no_playlist,
+        },
+    ),
+    "search": Command(
+        "src.search_index",
+        "search_dwh",
+        lambda args: {
+            "query": args.query,
+            "kinds": args.kind,
+            "limit": args.limit,
+            "rebuild": args.reindex,
+        },
+    ),
+    "validate": Command(
+        "src.validate_dwh",
+        "validate_dwh",
+        lambda args: _without_none(output=args.output, spotify=not args.no_spotify),
+        failed=lambda report: not report["ok"],
+    ),
+    "dedupe": Command(
+        "src.dedupe_dwh",
+        "dedupe_dwh",
+        lambda args: _without_none(
+            output=args.output,
+            threshold=args.threshold,
+            apply=args.apply,
+            pairs=args.pairs,
+        ),
+    ),
+    "benchmark": Command(
+        "src.benchmark",
+        "benchmark",
+        lambda args: {
+            "scale": args.scale,
+            "output": args.output,
+            "compare": args.compare,
+            "tolerance": args.tolerance,
+            "keep": args.keep,
+        },
+        # Truthy when the run regressed against --compare
+        failed=bool,
+    ),
+    "standin": Command(
+        "src.standin_server",
+        "run_standin_server",
+        lambda args: {
+            "host": args.host,
+            "port": args.port,
+            "mode": args.mode,
+            "cassette_path": args.cassette,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "gemini_latency_ms": args.gemini_latency_ms,
+            "rate_limit_probability": args.rate_limit_probability,
+            "retry_after": args.retry_after,
+            "page_size": args.page_size,
+            "playlist_size": args.playlist_size,
+            "seed": args.seed,
+        },
+    ),
+}
+
+
+def build_parser():
+    """Builds the CLI parser; every command has an entry in COMMANDS."""
     parser = argparse.ArgumentParser(
         description="Music Journey Data Warehouse and Playlist Manager."
     )
 
+    # Global options, given before the command (e.g. `main.py --profile playlist`)
+    parser.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PATH",
+        help="(Optional) Run the command under cProfile and save the stats (default: output/profile-<command>.prof).",
+    )
+    parser.add_argument(
+        "--run-summary",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="(Optional) Write per-stage timings, counters and API calls of the run as JSON.",
+    )
+    parser.add_argument(
+        "--prometheus-textfile",
+        type=str,
+        default=os.getenv("PROMETHEUS_TEXTFILE"),
+        metavar="PATH",
+        help="(Optional) Also write the run metrics as a Prometheus textfile (env: PROMETHEUS_TEXTFILE).",
+    )
+
     subparsers = parser.add_subparsers(
         dest="command", required=True, help="Available commands"
     )
@@ -19,7 +195,13 @@ def main():
     parser_build = subparsers.add_parser(
         "build", help="Builds or rebuilds the SQLite data warehouse from CSVs."
     )
-    parser_build.set_defaults(func=build_data_warehouse)
+    parser_build.add_argument(
+        "--engine",
+        type=str,
+        choices=["pandas", "stream"],
+        default="pandas",
+        help="(Optional) Load the CSVs with pandas, or stream them with csv and sqlite3 (lighter on memory).",
+    )
 
     # Command: playlist
     parser_playlist = subparsers.add_parser(
@@ -38,19 +220,25 @@ def main():
         help="(Optional) Deletes existing playlists and creates them from scratch.",
     )
     # --- END OF ADDITION ---
-    parser_playlist.set_defaults(func=spotify_playlists)
+    parser_playlist.add_argument(
+        "--changed-since",
+        type=str,
+        default=None,
+        help="(Optional) Only sync journeys changed after this ChangeSeq or ISO timestamp.",
+    )
+    parser_playlist.add_argument(
+        "--dirty-only",
+        action="store_true",
+        help="(Optional) Only sync journeys changed since the last --dirty-only run.",
+    )
 
     # Command: test-auth
-    parser_auth = subparsers.add_parser(
-        "test-auth", help="Tests Spotify authentication."
-    )
-    parser_auth.set_defaults(func=test_spotify_auth)
+    subparsers.add_parser("test-auth", help="Tests Spotify authentication.")
 
     # Command: backup
-    parser_backup = subparsers.add_parser(
+    subparsers.add_parser(
         "backup", help="Exports the SQLite database back to CSV files."
     )
-    parser_backup.set_defaults(func=backup_database_to_csv)
 
     # Command: import-spotify-playlist
     parser_import = subparsers.add_parser(
@@ -74,30 +262,345 @@ def main():
         help="(Optional) Granularity for journey steps: Album or Track.",
     )
 
-    def import_spotify_playlist_cli(
-        SpotifyPlaylistURL, journey_id=None, granularity="Track"
-    ):
-        from src.import_spotify_playlist import import_spotify_playlist
+    # Command: import-spotify-playlists
+    parser_bulk_import = subparsers.add_parser(
+        "import-spotify-playlists",
+        help="Imports many Spotify playlists listed in a file or on stdin.",
+    )
+    parser_bulk_import.add_argument(
+        "source",
+        type=str,
+        nargs="?",
+        default="-",
+        help="(Optional) File with one playlist URL or JourneyID per line, optionally followed by a granularity. Defaults to stdin.",
+    )
+    parser_bulk_import.add_argument(
+        "--granularity",
+        type=str,
+        choices=["Album", "Track"],
+        default="Track",
+        help="(Optional) Granularity for entries that do not name their own: Album or Track.",
+    )
+    parser_bulk_import.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="(Optional) Number of playlists fetched concurrently.",
+    )
+    parser_bulk_import.add_argument(
+        "--rate-limit",
+        type=float,
+        default=8.0,
+        help="(Optional) Maximum Spotify requests per second across all workers.",
+    )
+
+    # Command: essays
+    parser_essays = subparsers.add_parser(
+        "essays",
+        help="Drains the queue of pending Gemini essay jobs.",
+    )
+    parser_essays.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="(Optional) Number of essays generated concurrently.",
+    )
+    parser_essays.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="(Optional) Attempts per job before it is marked as failed.",
+    )
+
+    parser_essays.add_argument(
+        "--stream",
+        action="store_true",
+        help="(Optional) Stream each essay into its markdown file as it is generated.",
+    )
 
-        import_spotify_playlist(
-            SpotifyPlaylistURL, journey_id=journey_id, granularity=granularity
-        )
+    # Command: generate-essays
+    parser_generate_essays = subparsers.add_parser(
+        "generate-essays",
+        help="Regenerates Gemini essays for every journey whose steps changed.",
+    )
+    parser_generate_essays.add_argument(
+        "--journey-id",
+        type=str,
+        action="append",
+        default=None,
+        help="(Optional) Limit generation to this JourneyID. Can be repeated.",
+    )
+    parser_generate_essays.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="(Optional) Number of essays generated concurrently.",
+    )
+    parser_generate_essays.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="(Optional) Attempts per journey before giving up.",
+    )
+    parser_generate_essays.add_argument(
+        "--force",
+        action="store_true",
+        help="(Optional) Regenerate essays even when the steps are unchanged.",
+    )
+    parser_generate_essays.add_argument(
+        "--refresh",
+        action="store_true",
+        help="(Optional) Bypass the Gemini response cache.",
+    )
+    parser_generate_essays.add_argument(
+        "--mode",
+        type=str,
+        choices=["auto", "single", "chunked"],
+        default="auto",
+        help="(Optional) Single prompt, act-chunked map-reduce, or auto by journey size.",
+    )
+
+    parser_generate_essays.add_argument(
+        "--changed-since",
+        type=str,
+        default=None,
+        help="(Optional) Only consider journeys changed after this ChangeSeq or ISO timestamp.",
+    )
+    parser_generate_essays.add_argument(
+        "--dirty-only",
+        action="store_true",
+        help="(Optional) Only consider journeys changed since the last --dirty-only run.",
+    )
+
+    # Command: sync-md
+    parser_sync_md = subparsers.add_parser(
+        "sync-md",
+        help="Syncs changed journeys/*.md files back into the DWH.",
+    )
+    parser_sync_md.add_argument(
+        "--full",
+        action="store_true",
+        help="(Optional) Re-sync every markdown file, not only the changed ones.",
+    )
+
+    # Command: watch
+    parser_watch = subparsers.add_parser(
+        "watch",
+        help="Watches data/*.csv and journeys/*.md and syncs changed journeys continuously.",
+    )
+    parser_watch.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="(Optional) Seconds between file polls.",
+    )
+    parser_watch.add_argument(
+        "--debounce",
+        type=float,
+        default=2.0,
+        help="(Optional) Quiet seconds to wait before applying a burst of edits.",
+    )
+    parser_watch.add_argument(
+        "--no-playlist",
+        action="store_true",
+        help="(Optional) Only update the DWH; do not sync playlists to Spotify.",
+    )
+
+    # Command: search
+    parser_search = subparsers.add_parser(
+        "search",
+        help="Full-text search over journeys, works, movements and curation notes.",
+    )
+    parser_search.add_argument(
+        "query",
+        type=str,
+        nargs="?",
+        default=None,
+        help="Search terms (FTS5 syntax, e.g. 'storm AND piano' or 'noct*').",
+    )
+    parser_search.add_argument(
+        "--kind",
+        type=str,
+        action="append",
+        choices=["journey", "work", "movement", "step"],
+        default=None,
+        help="(Optional) Limit results to this kind of document. Can be repeated.",
+    )
+    parser_search.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="(Optional) Maximum number of results.",
+    )
+    parser_search.add_argument(
+        "--reindex",
+        action="store_true",
+        help="(Optional) Rebuild the search index from the DWH tables first.",
+    )
+
+    # Command: validate
+    parser_validate = subparsers.add_parser(
+        "validate",
+        help="Checks referential integrity and Spotify URLs of the whole DWH; exits 1 on errors.",
+    )
+    parser_validate.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="(Optional) JSON report file. Defaults to output/validation-report.json.",
+    )
+    parser_validate.add_argument(
+        "--no-spotify",
+        action="store_true",
+        help="(Optional) Skip checking that well-formed Spotify URLs exist.",
+    )
+
+    # Command: dedupe
+    parser_dedupe = subparsers.add_parser(
+        "dedupe",
+        help="Finds duplicate performers and albums; merges them with --apply.",
+    )
+    parser_dedupe.add_argument(
+        "--threshold",
+        type=float,
+        default=0.85,
+        help="(Optional) Minimum name similarity (0 to 1) for a pair to count as a duplicate.",
+    )
+    parser_dedupe.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="(Optional) CSV report of the pairs found. Defaults to output/dedupe-candidates.csv.",
+    )
+    parser_dedupe.add_argument(
+        "--pairs",
+        type=str,
+        default=None,
+        help="(Optional) Use the pairs of this reviewed report instead of searching.",
+    )
+    parser_dedupe.add_argument(
+        "--apply",
+        action="store_true",
+        help="(Optional) Merge the pairs in one transaction; without it, only the report is written.",
+    )
 
-    parser_import.set_defaults(func=import_spotify_playlist_cli)
+    # Command: benchmark
+    parser_benchmark = subparsers.add_parser(
+        "benchmark",
+        help="Times build, backup, step queries and playlist planning on synthetic data.",
+    )
+    parser_benchmark.add_argument(
+        "--scale",
+        type=str,
+        choices=["small", "medium", "large"],
+        default="small",
+        help="(Optional) Synthetic catalog size; large is 10k journeys, 1M steps, 200k recordings.",
+    )
+    parser_benchmark.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="(Optional) Results file. Defaults to benchmarks/baseline-<scale>.json.",
+    )
+    parser_benchmark.add_argument(
+        "--compare",
+        type=str,
+        default=None,
+        help="(Optional) Baseline JSON to check this run against; exits 1 on regressions.",
+    )
+    parser_benchmark.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="(Optional) Allowed slowdown against the baseline, as a fraction.",
+    )
+    parser_benchmark.add_argument(
+        "--keep",
+        action="store_true",
+        help="(Optional) Keep the generated CSVs and database in output/benchmark/.",
+    )
+
+    # Command: standin
+    parser_standin = subparsers.add_parser(
+        "standin",
+        help="Runs a local Spotify/Gemini stand-in server (simulate, record or replay).",
+    )
+    parser_standin.add_argument("--host", default="127.0.0.1")
+    parser_standin.add_argument("--port", type=int, default=8765)
+    parser_standin.add_argument(
+        "--mode", choices=["simulate", "record", "replay"], default="simulate"
+    )
+    parser_standin.add_argument(
+        "--cassette",
+        default="recordings/session.jsonl",
+        help="JSON-lines file for record/replay (default: recordings/session.jsonl)",
+    )
+    parser_standin.add_argument(
+        "--latency-ms", type=float, default=0.0, help="Added latency per Spotify call"
+    )
+    parser_standin.add_argument(
+        "--jitter-ms", type=float, default=0.0, help="Random extra latency, up to this"
+    )
+    parser_standin.add_argument(
+        "--gemini-latency-ms",
+        type=float,
+        default=0.0,
+        help="Added latency per Gemini call",
+    )
+    parser_standin.add_argument(
+        "--rate-limit-probability",
+        type=float,
+        default=0.0,
+        help="Share of requests answered with 429",
+    )
+    parser_standin.add_argument(
+        "--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s"
+    )
+    parser_standin.add_argument(
+        "--page-size",
+        type=int,
+        default=100,
+        help="Largest page returned by paginated endpoints",
+    )
+    parser_standin.add_argument(
+        "--playlist-size",
+        type=int,
+        default=120,
+        help="Tracks in synthetic playlists",
+    )
+    parser_standin.add_argument("--seed", type=int, default=0)
+
+    return parser
 
-    args = parser.parse_args()
 
-    # Call the function associated with the chosen command
-    if args.command == "playlist":
-        args.func(journey_name_filter=args.name, recreate=args.recreate)
-    elif args.command == "import-spotify-playlist":
-        args.func(
-            args.SpotifyPlaylistURL,
-            journey_id=args.journey_id,
-            granularity=args.granularity,
+def run_cli_command(args):
+    """Imports the handler of `args.command` and runs it with the parsed options."""
+    command = COMMANDS[args.command]
+    handler = getattr(importlib.import_module(command.module), command.function)
+    result = handler(**command.arguments(args))
+    if command.failed and command.failed(result):
+        raise SystemExit(1)
+    return result
+
+
+def main():
+    """Main entrypoint for the project CLI."""
+    args = build_parser().parse_args()
+
+    profile_path = None
+    if args.profile is not None:
+        from src.db import OUTPUT_DIR
+
+        profile_path = args.profile or os.path.join(
+            OUTPUT_DIR, f"profile-{args.command}.prof"
         )
-    else:
-        args.func()
+    run_command(
+        args.command,
+        lambda: run_cli_command(args),
+        profile_path=profile_path,
+        summary_path=args.run_summary,
+        textfile_path=args.prometheus_textfile,
+    )
 
 
 if __name__ == "__main__":
@@ -1,12 +1,12 @@
 import os
+import warnings
 import pandas as pd
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import inspect
+from src.db import DB_PATH, get_engine
+from src.instrumentation import count, stage
 
 # --- Configuration ---
 DATA_DIR = "data"
-OUTPUT_DIR = "output"
-DB_NAME = "music_journeys.db"
-DB_PATH = os.path.join(OUTPUT_DIR, DB_NAME)
 
 # Mapping from table names to CSV filenames
 TABLE_TO_CSV_MAP = {
@@ -22,17 +22,17 @@ TABLE_TO_CSV_MAP = {
 }
 
 
-def backup_database_to_csv():
+def backup_database_to_csv(data_dir=DATA_DIR, db_path=DB_PATH):
     """
     Exports all tables from the SQLite database back to their source CSV files.
     """
     print("Starting database to CSV backup process...")
 
-    if not os.path.exists(DB_PATH):
-        print(f"ERROR: Database not found at {DB_PATH}. Cannot perform backup.")
+    if not os.path.exists(db_path):
+        print(f"ERROR: Database not found at {db_path}. Cannot perform backup.")
         return
 
-    engine = create_engine(f"sqlite:///{DB_PATH}")
+    engine = get_engine(db_path)
 
     try:
         # The inspector is used to get schema information, like table names
@@ -44,15 +44,23 @@ def backup_database_to_csv():
         for table_name in table_names:
             if table_name in TABLE_TO_CSV_MAP:
                 csv_file = TABLE_TO_CSV_MAP[table_name]
-                csv_path = os.path.join(DATA_DIR, csv_file)
+                csv_path = os.path.join(data_dir, csv_file)
 
                 print(f"Exporting table '{table_name}' to '{csv_path}'...")
 
                 # Read the entire table into a pandas DataFrame
-                df = pd.read_sql_table(table_name, engine)
+                # Reflection can't describe the expression index on
+                # BridgeAlbumMovement (see journey_step_wide); it isn't needed here
+                with stage("backup.read_table"), warnings.catch_warnings():
+                    warnings.filterwarnings(
+                        "ignore", message="Skipped unsupported reflection"
+                    )
+                    df = pd.read_sql_table(table_name, engine)
 
                 # Save the DataFrame to a CSV file, overwriting the existing one
-                df.to_csv(csv_path, index=False)
+                with stage("backup.write_csv"):
+                    df.to_csv(csv_path, index=False)
+                count(f"rows_exported.{table_name}", len(df))
 
                 print(f"Successfully exported {len(df)} rows to '{csv_file}'.")
             else:
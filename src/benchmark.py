@@ -0,0 +1,311 @@
+"""
+Benchmark suite for the CLI and the DWH at synthetic scale.
+
+Times CLI startup first (`main.py --help` must not import the heavy
+dependencies of any command). Then generates a synthetic catalog (see
+`synthetic_dwh`) and times the stages that grow with it:
+`build_data_warehouse` (with both load engines), `backup_database_to_csv`, the journey step queries
+behind playlist sync and essay generation, and playlist diff planning for
+every journey. Results are written as a JSON baseline; with
+`--compare`, a run is checked against an earlier baseline and timings that got
+slower than the tolerance allows are reported as regressions.
+
+Everything runs in its own work directory (output/benchmark/) and database,
+so data/ and the real DWH are never touched, and no Spotify or Gemini calls
+are made.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import UTC, datetime
+
+from sqlalchemy import text
+
+from src.backup_dwh import backup_database_to_csv
+from src.build_dwh import build_data_warehouse
+from src.db import DB_NAME, OUTPUT_DIR, dispose_engines, get_engine
+from src.generate_dwh_journey import ALBUM_STEPS_QUERY, TRACK_STEPS_QUERY
+from src.journey_step_wide import ensure_fresh_journey
+from src.logger import setup_logger
+from src.spotify_playlists import (
+    ALBUM_URIS_QUERY,
+    TRACK_URIS_QUERY,
+    plan_playlist_update,
+)
+from src.synthetic_dwh import DEFAULT_SEED, SCALES, generate_synthetic_dwh
+
+# --- Configuration ---
+BENCHMARK_DIR = os.path.join(OUTPUT_DIR, "benchmark")
+BASELINE_DIR = "benchmarks"
+QUERY_SAMPLES = 200
+# A timing regresses when it is this much slower than the baseline...
+DEFAULT_TOLERANCE = 0.25
+# ...and by more than this many milliseconds, so tiny timings don't flap
+MIN_REGRESSION_MS = 5.0
+
+# CLI invocations whose startup is timed; argparse exits after the help, so
+# these measure imports and parser setup only
+STARTUP_COMMANDS = {
+    "help": ["--help"],
+    "test_auth_help": ["test-auth", "--help"],
+}
+STARTUP_SAMPLES = 5
+# Modules a bare CLI start must leave to the command that needs them
+HEAVY_MODULES = ("pandas", "numpy", "sqlalchemy", "spotipy", "requests", "jinja2")
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "main.py")
+
+STEP_QUERIES = {
+    "track_uris": TRACK_URIS_QUERY,
+    "album_uris": ALBUM_URIS_QUERY,
+    "track_steps": TRACK_STEPS_QUERY,
+    "album_steps": ALBUM_STEPS_QUERY,
+}
+JOURNEYS_QUERY = text(
+    "SELECT JourneyID, JourneyName, JourneyDescription FROM DimJourney ORDER BY JourneyID"
+)
+
+
+@contextlib.contextmanager
+def _timed(timings, name):
+    started = time.perf_counter()
+    yield
+    timings[f"{name}_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _remove_database(db_path):
+    dispose_engines()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+def time_cli_startup(timings, samples=STARTUP_SAMPLES):
+    """
+    Times fresh `main.py` processes for each of STARTUP_COMMANDS and returns
+    the heavy modules a bare `main.py --help` still imports.
+    """
+    for name, argv in STARTUP_COMMANDS.items():
+        elapsed = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            subprocess.run(
+                [sys.executable, MAIN_SCRIPT, *argv], capture_output=True, check=True
+            )
+            elapsed.append((time.perf_counter() - started) * 1000)
+        timings[f"startup_{name}_p50_ms"] = round(statistics.median(elapsed), 3)
+
+    # -X importtime lists every module imported, one per line on stderr
+    trace = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN_SCRIPT, "--help"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    imported = {
+        line.rsplit("|", 1)[1].strip()
+        for line in trace.splitlines()
+        if line.startswith("import time:")
+    }
+    return [module for module in HEAVY_MODULES if module in imported]
+
+
+def time_step_queries(
+    engine, journey_ids, timings, samples=QUERY_SAMPLES, seed=DEFAULT_SEED
+):
+    """Times each step query, as its callers run it, for a sample of journeys."""
+    sample = random.Random(seed).sample(journey_ids, min(samples, len(journey_ids)))
+    for name, query in STEP_QUERIES.items():
+        elapsed = []
+        for journey_id in sample:
+            started = time.perf_counter()
+            with engine.begin() as connection:
+                ensure_fresh_journey(connection, journey_id)
+                connection.execute(query, {"jid": journey_id}).fetchall()
+            elapsed.append((time.perf_counter() - started) * 1000)
+        timings[f"query_{name}_p50_ms"] = round(statistics.median(elapsed), 3)
+        timings[f"query_{name}_p95_ms"] = round(_percentile(elapsed, 0.95), 3)
+
+
+def time_playlist_planning(engine, journeys, timings):
+    """
+    Plans the playlist update of every journey against a simulated current
+    playlist: every other journey is already in sync, the rest lost a track.
+    """
+    planned = []
+    for i, (journey_id, name, description) in enumerate(journeys):
+        with engine.connect() as connection:
+            uris = [
+                row[0]
+                for row in connection.execute(TRACK_URIS_QUERY, {"jid": journey_id})
+                if row[0]
+            ]
+        planned.append(
+            (
+                name if i % 2 else name + " (old)",
+                description,
+                uris[: len(uris) - i % 2],
+                name,
+                uris,
+            )
+        )
+    with _timed(timings, "plan_playlists"):
+        for title, description, current, name, uris in planned:
+            plan_playlist_update(title, description, current, name, description, uris)
+
+
+def run_benchmark(
+    scale="small", work_dir=BENCHMARK_DIR, seed=DEFAULT_SEED, samples=QUERY_SAMPLES
+):
+    """Runs every benchmark stage at `scale` and returns the results."""
+    logger = setup_logger()
+    size = SCALES[scale]
+    scale_dir = os.path.join(work_dir, scale)
+    data_dir = os.path.join(scale_dir, "data")
+    backup_dir = os.path.join(scale_dir, "backup")
+    db_path = os.path.join(scale_dir, DB_NAME)
+    os.makedirs(backup_dir, exist_ok=True)
+    timings = {}
+
+    logger.info("Timing CLI startup...")
+    startup_imports = time_cli_startup(timings)
+    if startup_imports:
+        logger.warning(
+            "main.py --help imports %s; import them inside the command handler.",
+            ", ".join(startup_imports),
+        )
+
+    logger.info(
+        "Generating the '%s' synthetic catalog in %s: %s", scale, data_dir, size
+    )
+    with _timed(timings, "generate"):
+        rows = generate_synthetic_dwh(data_dir, seed=seed, **size)
+
+    logger.info("Building the DWH...")
+    _remove_database(db_path)
+    # The build reports every table; only the timings matter here
+    with contextlib.redirect_stdout(io.StringIO()), _timed(timings, "build"):
+        build_data_warehouse(data_dir, db_path, enrich=False)
+
+    logger.info("Building the DWH with the streaming loader...")
+    stream_db_path = os.path.join(scale_dir, f"stream-{DB_NAME}")
+    _remove_database(stream_db_path)
+    with contextlib.redirect_stdout(io.StringIO()), _timed(timings, "build_stream"):
+        build_data_warehouse(
+            data_dir, stream_db_path, enrich=False, load_engine="stream"
+        )
+
+    logger.info("Backing up the DWH to CSV...")
+    with contextlib.redirect_stdout(io.StringIO()), _timed(timings, "backup"):
+        backup_database_to_csv(backup_dir, db_path)
+
+    engine = get_engine(db_path)
+    with engine.connect() as connection:
+        journeys = connection.execute(JOURNEYS_QUERY).fetchall()
+
+    logger.info("Timing step queries for %s journeys...", min(samples, len(journeys)))
+    time_step_queries(engine, [row[0] for row in journeys], timings, samples, seed)
+
+    logger.info("Planning playlist updates for %s journeys...", len(journeys))
+    time_playlist_planning(engine, journeys, timings)
+
+    return {
+        "scale": scale,
+        "size": size,
+        "seed": seed,
+        "rows": rows,
+        "timings": timings,
+        "startup_imports": startup_imports,
+        "created_utc": datetime.now(UTC).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+    }
+
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Returns [(timing, baseline ms, current ms)] for every timing that regressed."""
+    regressions = []
+    for name, base in baseline.get("timings", {}).items():
+        current = results["timings"].get(name)
+        if current is None:
+            continue
+        if current > base * (1 + tolerance) and current - base > MIN_REGRESSION_MS:
+            regressions.append((name, base, current))
+    return regressions
+
+
+def benchmark(
+    scale="small",
+    output=None,
+    compare=None,
+    tolerance=DEFAULT_TOLERANCE,
+    work_dir=BENCHMARK_DIR,
+    keep=False,
+):
+    """
+    Runs the suite, writes the results to `output` (benchmarks/baseline-<scale>.json
+    by default) and, with `compare`, checks them against that baseline file.
+    Returns the regressions found. The work directory is removed unless `keep`.
+    """
+    logger = setup_logger()
+    baseline = None
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != scale:
+            logger.warning(
+                "Baseline %s was recorded at scale '%s', not '%s'.",
+                compare,
+                baseline.get("scale"),
+                scale,
+            )
+
+    try:
+        results = run_benchmark(scale, work_dir)
+    finally:
+        if not keep:
+            dispose_engines()
+            shutil.rmtree(os.path.join(work_dir, scale), ignore_errors=True)
+
+    for name, elapsed in results["timings"].items():
+        logger.info("%s: %.1f", name, elapsed)
+
+    output = output or os.path.join(BASELINE_DIR, f"baseline-{scale}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    logger.info("Benchmark results written to %s", output)
+
+    if baseline is None:
+        return []
+    regressions = compare_results(results, baseline, tolerance)
+    for name, base, current in regressions:
+        logger.error(
+            "Regression in %s: %.1f ms -> %.1f ms (+%.1f ms)",
+            name,
+            base,
+            current,
+            current - base,
+        )
+    if not regressions:
+        logger.info(
+            f"No timing regressed by more than {tolerance:.0%} against {compare}."
+        )
+    return regressions
@@ -1,12 +1,21 @@
-import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import os
+import re
+from spotipy.exceptions import SpotifyBaseException
+from src.catalog_index import refresh_catalog_index
+from src.change_log import (
+    create_change_log,
+    prune_change_log,
+    record_journey_changes,
+)
+from src.db import DB_PATH, OUTPUT_DIR, get_engine
+from src.instrumentation import count, stage
+from src.spotify_client import fetch_items, get_spotify_client
+from src.journey_step_wide import rebuild_journey_step_wide
+from src.search_index import create_search_index
 
 # --- Configuration ---
 DATA_DIR = "data"
-OUTPUT_DIR = "output"
-DB_NAME = "music_journeys.db"
-DB_PATH = os.path.join(OUTPUT_DIR, DB_NAME)
 
 # Define all tables and their corresponding CSV files
 TABLES = {
@@ -21,22 +30,181 @@ TABLES = {
     "BridgeAlbumMovement": "BridgeAlbumMovement.csv",
 }
 
+# Characters stripped from DimRecording.SpotifyURL on load
+SPOTIFY_URL_JUNK = re.compile(r"[^a-zA-Z0-9:/._-]")
+# Columns filled by Spotify enrichment, in `spotify_title_matches` order
+SPOTIFY_MATCH_COLUMNS = ("SpotifyTitleKey", "SpotifyTitleScore", "SpotifyTitleReason")
+SPOTIFY_TITLE_COLUMNS = ("SpotifyTitle", *SPOTIFY_MATCH_COLUMNS)
+# Replaced by the key/score/reason columns; dropped from older CSV backups
+LEGACY_SPOTIFY_COLUMNS = ("SpotifyTitleMatch",)
 
-def build_data_warehouse():
+
+def spotify_title_matches(kind, urls, expected_titles):
+    """
+    Looks up the album or track URLs in `urls` ({row: url}) with Spotify's
+    batch endpoints and returns {row: (SpotifyTitle, SpotifyTitleKey,
+    SpotifyTitleScore, SpotifyTitleReason)} for each row with a URL of that
+    kind. The titles found are scored against `expected_titles` in one
+    vectorized pass (see `title_matching.match_titles`). IDs Spotify does not
+    know get an empty title and the reason "not_found"; rows that could not be
+    checked (rate limit, outage) get the reason "unchecked" instead of being
+    recorded as mismatches.
+    """
+    from src.title_matching import match_titles
+
+    prefix = f"https://open.spotify.com/{kind}/"
+    ids = {
+        row: url.split("/")[-1]
+        for row, url in urls.items()
+        if isinstance(url, str) and url.startswith(prefix)
+    }
+    if not ids:
+        return {}
+    try:
+        with stage("build.spotify_titles"):
+            items = fetch_items(get_spotify_client(), kind, ids.values())
+    # Missing credentials raise SpotifyOauthError; requests' errors are OSErrors
+    except (SpotifyBaseException, OSError) as e:
+        print(f"   -> WARNING: Could not connect to Spotify: {e}")
+        items = {}
+    matches = {}
+    found = {}
+    for row, item_id in ids.items():
+        if item_id not in items:
+            matches[row] = (None, None, None, "unchecked")
+        elif items[item_id]:
+            found[row] = items[item_id]["name"]
+        else:
+            matches[row] = ("", "", 0.0, "not_found")
+    if found:
+        with stage("build.title_matching"):
+            scored = match_titles(
+                [expected_titles[row] for row in found], found.values()
+            )
+        for row, spotify_title, (key, score, reason) in zip(
+            found, found.values(), scored.itertuples(index=False)
+        ):
+            matches[row] = (spotify_title, key, score, reason)
+    unchecked = sum(1 for match in matches.values() if match[3] == "unchecked")
+    if unchecked:
+        print(
+            f"   -> WARNING: {unchecked} {kind} URLs could not be checked on Spotify; their SpotifyTitle is left empty."
+        )
+    return matches
+
+
+def add_spotify_titles(df, kind, expected_titles):
+    """
+    Fills SpotifyTitle, SpotifyTitleKey, SpotifyTitleScore and
+    SpotifyTitleReason for the album or track URLs in df["SpotifyURL"] (see
+    `spotify_title_matches`). Rows without such a URL keep an empty title and
+    no score.
+    """
+    import pandas as pd
+
+    df["SpotifyTitle"] = ""
+    for column in SPOTIFY_MATCH_COLUMNS:
+        df[column] = pd.Series(None, index=df.index, dtype=object)
+    for idx, match in spotify_title_matches(
+        kind, df["SpotifyURL"].to_dict(), expected_titles
+    ).items():
+        for column, value in zip(SPOTIFY_TITLE_COLUMNS, match):
+            df.at[idx, column] = value
+
+
+def load_tables_pandas(engine, data_dir=DATA_DIR, enrich=True):
+    """Loads every CSV with pandas read_csv and to_sql."""
+    import pandas as pd
+
+    for table_name, csv_file in TABLES.items():
+        try:
+            csv_path = os.path.join(data_dir, csv_file)
+            print(f"Processing {csv_file} -> loading into table '{table_name}'...")
+
+            with stage("build.read_csv"):
+                df = pd.read_csv(csv_path)
+            df = df.drop(columns=list(LEGACY_SPOTIFY_COLUMNS), errors="ignore")
+
+            # Add the SpotifyTitle columns for albums and recordings
+            if enrich and table_name == "DimAlbum" and "SpotifyURL" in df.columns:
+                # No mapping needed, PerformerID is already present
+                add_spotify_titles(df, "album", df["AlbumTitle"])
+            if enrich and table_name == "DimRecording" and "SpotifyURL" in df.columns:
+                # Load DimMovement for MovementTitle lookup
+                movement_path = os.path.join(data_dir, "DimMovement.csv")
+                df_movement = pd.read_csv(movement_path)
+                movement_title_map = dict(
+                    zip(df_movement["MovementID"], df_movement["MovementTitle"])
+                )
+                add_spotify_titles(
+                    df, "track", df["MovementID"].map(movement_title_map).fillna("")
+                )
+
+            # --- START DATA CLEANING FIX ---
+            if table_name == "DimRecording" and "SpotifyURL" in df.columns:
+                print(f"   -> Cleaning SpotifyURL column in {csv_file}...")
+                if pd.api.types.is_string_dtype(df["SpotifyURL"]):
+                    df["SpotifyURL"] = df["SpotifyURL"].str.replace(
+                        SPOTIFY_URL_JUNK, "", regex=True
+                    )
+                    print("   -> Cleaning complete.")
+                else:
+                    print(
+                        "   -> Skipping cleaning: SpotifyURL column is not string type."
+                    )
+            # --- END DATA CLEANING FIX ---
+
+            # For DimPlaylist, append since we've already created the table
+            if table_name == "DimPlaylist":
+                if not df.empty:
+                    with stage("build.load"):
+                        df.to_sql(
+                            table_name, con=engine, if_exists="append", index=False
+                        )
+                    count(f"rows_loaded.{table_name}", len(df))
+                    print(f"Successfully appended {len(df)} rows into '{table_name}'.")
+                else:
+                    print(f"'{table_name}' CSV is empty, skipping append.")
+            else:
+                if not df.empty:
+                    with stage("build.load"):
+                        df.to_sql(
+                            table_name, con=engine, if_exists="append", index=False
+                        )
+                    count(f"rows_loaded.{table_name}", len(df))
+                    print(f"Successfully loaded {len(df)} rows into '{table_name}'.")
+                else:
+                    print(f"'{table_name}' CSV is empty, skipping append.")
+
+        except FileNotFoundError:
+            print(
+                f"ERROR: CSV file not found at {csv_path}. Skipping table '{table_name}'."
+            )
+        except Exception as e:
+            print(f"An error occurred while processing {csv_file}: {e}")
+
+
+def build_data_warehouse(
+    data_dir=DATA_DIR, db_path=DB_PATH, enrich=True, load_engine="pandas"
+):
     """
     Extracts data from CSV files and loads it into a SQLite database.
     This version explicitly creates the DimPlaylist table with a composite primary key.
+    With enrich=False the Spotify title lookups are skipped (e.g. for benchmarks).
+    load_engine="stream" loads the CSVs without pandas (see `stream_build`);
+    both engines build the same database.
     """
     print("Starting the Data Warehouse build process...")
 
     # --- Create Output Directory ---
-    if not os.path.exists(OUTPUT_DIR):
-        print(f"Creating output directory at: {OUTPUT_DIR}")
-        os.makedirs(OUTPUT_DIR)
+    output_dir = os.path.dirname(db_path) or OUTPUT_DIR
+    if not os.path.exists(output_dir):
+        print(f"Creating output directory at: {output_dir}")
+        os.makedirs(output_dir)
 
     # --- Create Database Engine ---
-    engine = create_engine(f"sqlite:///{DB_PATH}")
-    print(f"Database engine created. DWH will be built at: {DB_PATH}")
+    engine = get_engine(db_path)
+    print(f"Database engine created. DWH will be built at: {db_path}")
 
     # --- Drop and Recreate All Tables ---
     with engine.connect() as connection:
@@ -82,7 +250,9 @@ def build_data_warehouse():
                 RecordingLabel TEXT,
                 SpotifyURL TEXT,
                 SpotifyTitle TEXT,
-                SpotifyTitleMatch BOOLEAN,
+                SpotifyTitleKey TEXT,
+                SpotifyTitleScore REAL,
+                SpotifyTitleReason TEXT,
                 SpotifyReleaseDate INTEGER,
                 SpotifyGenre TEXT,
                 UNIQUE(AlbumTitle, PerformerID)
@@ -116,7 +286,9 @@ def build_data_warehouse():
                 PerformerID TEXT,
                 SpotifyURL TEXT,
                 SpotifyTitle TEXT,
-                SpotifyTitleMatch BOOLEAN
+                SpotifyTitleKey TEXT,
+                SpotifyTitleScore REAL,
+                SpotifyTitleReason TEXT
             );
         """
             )
@@ -184,111 +356,137 @@ def build_data_warehouse():
         """
             )
         )
+        # SearchIndex triggers index rows as the CSVs are loaded below
+        create_search_index(connection)
         connection.commit()
         print("All tables created successfully.")
 
     # --- Loop Through Tables and Load Data ---
-    for table_name, csv_file in TABLES.items():
-        try:
-            csv_path = os.path.join(DATA_DIR, csv_file)
-            print(f"Processing {csv_file} -> loading into table '{table_name}'...")
+    if load_engine == "stream":
+        from src.stream_build import load_tables_stream
 
-            df = pd.read_csv(csv_path)
+        load_tables_stream(data_dir, db_path, enrich)
+    else:
+        load_tables_pandas(engine, data_dir, enrich)
 
-            # Add SpotifyTitle and SpotifyTitleMatch columns for albums and recordings
-            if table_name == "DimAlbum" and "SpotifyURL" in df.columns:
-                import spotipy
-                from spotipy.oauth2 import SpotifyClientCredentials
+    # --- Capture changes from here on and materialize the journey steps ---
+    with stage("build.journey_step_wide"), engine.begin() as connection:
+        create_change_log(connection)
+        # The build is the change log's maintenance step
+        pruned = prune_change_log(connection)
+        if pruned:
+            print(f"Pruned {pruned} old change log entries.")
+        record_journey_changes(connection, source="build")
+        step_count = rebuild_journey_step_wide(connection)
+    print(f"JourneyStepWide materialized with {step_count} steps.")
 
-                sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials())
-                df["SpotifyTitle"] = ""
-                df["SpotifyTitleMatch"] = False
-                # No mapping needed, PerformerID is already present
-                for idx, row in df.iterrows():
-                    url = row["SpotifyURL"]
-                    if isinstance(url, str) and url.startswith(
-                        "https://open.spotify.com/album/"
-                    ):
-                        album_id = url.split("/")[-1]
-                        try:
-                            album = sp.album(album_id)
-                            spotify_title = album["name"]
-                            df.at[idx, "SpotifyTitle"] = spotify_title
-                            df.at[idx, "SpotifyTitleMatch"] = (
-                                spotify_title.strip().lower()
-                                == str(row["AlbumTitle"]).strip().lower()
-                            )
-                        except Exception:
-                            df.at[idx, "SpotifyTitle"] = ""
-                            df.at[idx, "SpotifyTitleMatch"] = False
-            if table_name == "DimRecording" and "SpotifyURL" in df.columns:
-                import spotipy
-                from spotipy.oauth2 import SpotifyClientCredentials
+    # --- Build the local catalog search index ---
+    with stage("build.catalog_index"):
+        refresh_catalog_index(engine, rebuild=True)
 
-                sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials())
-                df["SpotifyTitle"] = ""
-                df["SpotifyTitleMatch"] = False
-                # Load DimMovement for MovementTitle lookup
-                movement_path = os.path.join(DATA_DIR, "DimMovement.csv")
-                df_movement = pd.read_csv(movement_path)
-                movement_title_map = dict(
-                    zip(df_movement["MovementID"], df_movement["MovementTitle"])
-                )
-                for idx, row in df.iterrows():
-                    url = row["SpotifyURL"]
-                    if isinstance(url, str) and url.startswith(
-                        "https://open.spotify.com/track/"
-                    ):
-                        track_id = url.split("/")[-1]
-                        try:
-                            track = sp.track(track_id)
-                            spotify_title = track["name"]
-                            df.at[idx, "SpotifyTitle"] = spotify_title
-                            movement_title = movement_title_map.get(
-                                row["MovementID"], ""
-                            )
-                            df.at[idx, "SpotifyTitleMatch"] = (
-                                spotify_title.strip().lower()
-                                == str(movement_title).strip().lower()
-                            )
-                        except Exception:
-                            df.at[idx, "SpotifyTitle"] = ""
-                            df.at[idx, "SpotifyTitleMatch"] = False
+    print("\nData Warehouse build process is complete.")
+    print(f"Database is located at: {db_path}")
 
-            # --- START DATA CLEANING FIX ---
-            if table_name == "DimRecording" and "SpotifyURL" in df.columns:
-                print(f"   -> Cleaning SpotifyURL column in {csv_file}...")
-                if df["SpotifyURL"].dtype == object:
-                    df["SpotifyURL"] = df["SpotifyURL"].str.replace(
-                        r"[^a-zA-Z0-9:/._-]", "", regex=True
-                    )
-                    print("   -> Cleaning complete.")
-                else:
-                    print(
-                        "   -> Skipping cleaning: SpotifyURL column is not string type."
-                    )
-            # --- END DATA CLEANING FIX ---
 
-            # For DimPlaylist, append since we've already created the table
-            if table_name == "DimPlaylist":
-                if not df.empty:
-                    df.to_sql(table_name, con=engine, if_exists="append", index=False)
-                    print(f"Successfully appended {len(df)} rows into '{table_name}'.")
-                else:
-                    print(f"'{table_name}' CSV is empty, skipping append.")
-            else:
-                if not df.empty:
-                    df.to_sql(table_name, con=engine, if_exists="append", index=False)
-                    print(f"Successfully loaded {len(df)} rows into '{table_name}'.")
-                else:
-                    print(f"'{table_name}' CSV is empty, skipping append.")
+# --- Incremental CSV Loads ---
 
-        except FileNotFoundError:
-            print(
-                f"ERROR: CSV file not found at {csv_path}. Skipping table '{table_name}'."
-            )
-        except Exception as e:
-            print(f"An error occurred while processing {csv_file}: {e}")
 
-    print("\nData Warehouse build process is complete.")
-    print(f"Database is located at: {DB_PATH}")
+def _delta_value(value):
+    """Normalizes a CSV or DB value so both sides compare equal when unchanged."""
+    import pandas as pd
+
+    # None, NaN and NaT all become None
+    if pd.isna(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _delta_key_columns(connection, table_name, columns):
+    """The table's primary key, else a UNIQUE constraint, fully present in the CSV."""
+    info = connection.execute(text(f"PRAGMA table_info({table_name})")).fetchall()
+    primary_key = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+    if primary_key and set(primary_key) <= set(columns):
+        return primary_key
+    for index in connection.execute(text(f"PRAGMA index_list({table_name})")):
+        if not index[2]:
+            continue
+        index_columns = [
+            row[2]
+            for row in connection.execute(text(f"PRAGMA index_info('{index[1]}')"))
+        ]
+        if set(index_columns) <= set(columns):
+            return index_columns
+    return list(columns)
+
+
+def apply_csv_delta(connection, table_name, csv_path):
+    """
+    Loads a CSV into an existing table by applying only the difference:
+    new keys are inserted, changed rows updated and missing keys deleted, so
+    the change-capture and search triggers fire for the touched rows alone.
+    Only the CSV's columns are compared; columns the full build enriches from
+    Spotify (SpotifyTitle and its key, score and reason) keep their stored
+    values.
+    Returns (inserted, updated, deleted).
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    df = df.drop(columns=list(LEGACY_SPOTIFY_COLUMNS), errors="ignore")
+    if (
+        table_name == "DimRecording"
+        and "SpotifyURL" in df.columns
+        and pd.api.types.is_string_dtype(df["SpotifyURL"])
+    ):
+        df["SpotifyURL"] = df["SpotifyURL"].str.replace(
+            SPOTIFY_URL_JUNK, "", regex=True
+        )
+    columns = list(df.columns)
+    key_columns = _delta_key_columns(connection, table_name, columns)
+    value_columns = [column for column in columns if column not in key_columns]
+    column_list = ", ".join(columns)
+
+    def key_of(row):
+        return tuple(_delta_value(row[column]) for column in key_columns)
+
+    stored = {}
+    for values in connection.execute(text(f"SELECT {column_list} FROM {table_name}")):
+        row = dict(zip(columns, values))
+        stored[key_of(row)] = tuple(_delta_value(row[c]) for c in value_columns)
+
+    inserts, updates, seen = [], [], set()
+    for record in df.astype(object).where(df.notna(), None).to_dict("records"):
+        key = key_of(record)
+        seen.add(key)
+        if key not in stored:
+            inserts.append(record)
+        elif value_columns and stored[key] != tuple(
+            _delta_value(record[c]) for c in value_columns
+        ):
+            updates.append(record)
+    deletes = [dict(zip(key_columns, key)) for key in stored if key not in seen]
+
+    # IS, so keys with a NULL column (e.g. a nullable UNIQUE column) still match
+    key_match = " AND ".join(f"{column} IS :{column}" for column in key_columns)
+    if inserts:
+        connection.execute(
+            text(
+                f"INSERT INTO {table_name} ({column_list}) "
+                f"VALUES ({', '.join(':' + column for column in columns)})"
+            ),
+            inserts,
+        )
+    if updates:
+        connection.execute(
+            text(
+                f"UPDATE {table_name} SET "
+                f"{', '.join(f'{column} = :{column}' for column in value_columns)} "
+                f"WHERE {key_match}"
+            ),
+            updates,
+        )
+    if deletes:
+        connection.execute(text(f"DELETE FROM {table_name} WHERE {key_match}"), deletes)
+    return len(inserts), len(updates), len(deletes)
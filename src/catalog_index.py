@@ -0,0 +1,270 @@
+"""
+Local full-text index of the DWH album catalog.
+
+CatalogIndex is an SQLite FTS5 table over diacritic-folded album titles and
+performer names of every album with a SpotifyURL, so generated (performer,
+album) pairs can be resolved without calling Spotify. Its rowid is the AlbumID.
+Triggers on DimAlbum and DimPerformer queue the albums they touch in
+CatalogIndexPending, and `refresh_catalog_index` re-indexes only those.
+"""
+
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+from src.db import DB_PATH, get_engine
+
+# --- Configuration ---
+# Trigram tokenization matches substrings of titles; older SQLite builds fall
+# back to word tokens with diacritics removed.
+TOKENIZERS = ("trigram", "unicode61 remove_diacritics 2")
+# A hit's album title must match the requested one this closely, with or
+# without a performer term
+MIN_TITLE_SIMILARITY = 0.9
+# Best-ranked hits compared against MIN_TITLE_SIMILARITY
+LOOKUP_CANDIDATES = 5
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+ALBUM_ROWS_SQL = """
+    SELECT da.AlbumID, da.AlbumTitle, dp.PerformerName, da.SpotifyURL
+    FROM DimAlbum da
+    LEFT JOIN DimPerformer dp ON da.PerformerID = dp.PerformerID
+    WHERE da.SpotifyURL LIKE 'https://open.spotify.com/album/%'
+"""
+
+# (table, event, statement queuing the affected albums)
+PENDING_TRIGGERS = (
+    ("DimAlbum", "INSERT", "VALUES (new.AlbumID)"),
+    ("DimAlbum", "UPDATE", "VALUES (old.AlbumID), (new.AlbumID)"),
+    ("DimAlbum", "DELETE", "VALUES (old.AlbumID)"),
+    (
+        "DimPerformer",
+        "UPDATE",
+        "SELECT AlbumID FROM DimAlbum WHERE PerformerID IN (old.PerformerID, new.PerformerID)",
+    ),
+    (
+        "DimPerformer",
+        "DELETE",
+        "SELECT AlbumID FROM DimAlbum WHERE PerformerID = old.PerformerID",
+    ),
+)
+
+
+def fold(value):
+    """Lowercases, strips diacritics and collapses punctuation to single spaces."""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(value))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", stripped.lower()).strip()
+
+
+def _create_index_table(connection):
+    """Creates CatalogIndex with the first tokenizer this SQLite build supports."""
+    connection.execute(text("DROP TABLE IF EXISTS CatalogIndex"))
+    for tokenizer in TOKENIZERS:
+        try:
+            connection.execute(
+                text(
+                    f"""
+                CREATE VIRTUAL TABLE CatalogIndex USING fts5(
+                    AlbumKey, PerformerKey, SpotifyURL UNINDEXED,
+                    tokenize = '{tokenizer}'
+                )
+            """
+                )
+            )
+            return tokenizer
+        except OperationalError:
+            continue
+    raise RuntimeError("SQLite was built without FTS5 support.")
+
+
+def _create_pending_triggers(connection):
+    """Creates CatalogIndexPending and the triggers that fill it."""
+    connection.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS CatalogIndexPending (AlbumID INTEGER PRIMARY KEY)"
+        )
+    )
+    for table, event, albums in PENDING_TRIGGERS:
+        trigger = f"{table}_catalog_{event.lower()}"
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(
+            text(
+                f"CREATE TRIGGER {trigger} AFTER {event} ON {table} BEGIN "
+                f"INSERT OR IGNORE INTO CatalogIndexPending (AlbumID) {albums}; END"
+            )
+        )
+
+
+def _index_albums(connection, rows):
+    if rows:
+        connection.execute(
+            text(
+                """
+            INSERT INTO CatalogIndex (rowid, AlbumKey, PerformerKey, SpotifyURL)
+            VALUES (:album_id, :album_key, :performer_key, :url)
+        """
+            ),
+            [
+                {
+                    "album_id": album_id,
+                    "album_key": fold(album_title),
+                    "performer_key": fold(performer_name),
+                    "url": url,
+                }
+                for album_id, album_title, performer_name, url in rows
+            ],
+        )
+    return len(rows)
+
+
+def build_catalog_index(connection):
+    """(Re)builds CatalogIndex from DimAlbum and DimPerformer, with its triggers."""
+    tokenizer = _create_index_table(connection)
+    _create_pending_triggers(connection)
+    connection.execute(text("DELETE FROM CatalogIndexPending"))
+    rows = connection.execute(text(ALBUM_ROWS_SQL)).fetchall()
+    return tokenizer, _index_albums(connection, rows)
+
+
+def update_catalog_index(connection):
+    """Re-indexes the albums queued in CatalogIndexPending; returns how many were queued."""
+    album_ids = [
+        row[0]
+        for row in connection.execute(text("SELECT AlbumID FROM CatalogIndexPending"))
+    ]
+    if not album_ids:
+        return 0
+    params = {"album_ids": album_ids}
+    connection.execute(
+        text("DELETE FROM CatalogIndex WHERE rowid IN :album_ids").bindparams(
+            bindparam("album_ids", expanding=True)
+        ),
+        params,
+    )
+    rows = connection.execute(
+        text(f"{ALBUM_ROWS_SQL} AND da.AlbumID IN :album_ids").bindparams(
+            bindparam("album_ids", expanding=True)
+        ),
+        params,
+    ).fetchall()
+    _index_albums(connection, rows)
+    connection.execute(text("DELETE FROM CatalogIndexPending"))
+    return len(album_ids)
+
+
+def _has_pending_triggers(connection):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'CatalogIndexPending'")
+    ).scalar()
+
+
+def refresh_catalog_index(engine, logger=None, rebuild=False):
+    """
+    Brings the index up to date in its own transaction: re-indexes the queued
+    albums, or rebuilds everything with `rebuild` or when the index (or its
+    triggers) does not exist yet. Failures are reported, not raised.
+    """
+    try:
+        with engine.begin() as connection:
+            tokenizer = _index_tokenizer(connection)
+            if rebuild or not tokenizer or not _has_pending_triggers(connection):
+                tokenizer, count = build_catalog_index(connection)
+                message = f"Catalog index rebuilt with {count} albums ({tokenizer} tokenizer)."
+            else:
+                count = update_catalog_index(connection)
+                message = f"Catalog index updated for {count} changed albums."
+        if logger:
+            logger.info(message)
+        else:
+            print(message)
+    except (SQLAlchemyError, RuntimeError) as e:
+        message = f"Could not refresh the catalog index: {e}"
+        if logger:
+            logger.error(message)
+        else:
+            print(message)
+
+
+def _phrase(key):
+    return '"' + key.replace('"', '""') + '"'
+
+
+def _searchable(key, tokenizer):
+    # Trigram queries need at least three characters
+    return len(key) >= 3 if tokenizer == "trigram" else bool(key)
+
+
+def _index_tokenizer(connection):
+    sql = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE name = 'CatalogIndex'")
+    ).scalar()
+    if not sql:
+        return None
+    return "trigram" if "trigram" in sql else "unicode61"
+
+
+def lookup_album_url(connection, artist, album, tokenizer=None):
+    """
+    Returns the SpotifyURL of the best local match for (artist, album), or None.
+
+    The album phrase is matched against album titles and the performer phrase
+    against performer names, ranked by bm25 with album titles weighted highest.
+    Only a hit whose album title is at least MIN_TITLE_SIMILARITY similar to
+    `album` is accepted, so a generic title ("Adagio") does not resolve to
+    whichever album contains it.
+    """
+    tokenizer = tokenizer or _index_tokenizer(connection)
+    album_key, artist_key = fold(album), fold(artist)
+    if not tokenizer or not _searchable(album_key, tokenizer):
+        return None
+    query = "AlbumKey: " + _phrase(album_key)
+    if _searchable(artist_key, tokenizer):
+        query += " AND PerformerKey: " + _phrase(artist_key)
+    rows = connection.execute(
+        text(
+            """
+        SELECT AlbumKey, SpotifyURL FROM CatalogIndex
+        WHERE CatalogIndex MATCH :query
+        ORDER BY bm25(CatalogIndex, 10.0, 5.0)
+        LIMIT :limit
+    """
+        ),
+        {"query": query, "limit": LOOKUP_CANDIDATES},
+    ).fetchall()
+    best_url, best_similarity = None, MIN_TITLE_SIMILARITY
+    for candidate_key, url in rows:
+        similarity = SequenceMatcher(None, album_key, candidate_key).ratio()
+        if similarity >= best_similarity:
+            best_url, best_similarity = url, similarity
+            if similarity == 1.0:
+                break
+    return best_url
+
+
+def lookup_album_urls(pairs, db_path=DB_PATH):
+    """Resolves (artist, album) pairs from the local index; returns {pair: url} for hits."""
+    if not os.path.exists(db_path):
+        return {}
+    engine = get_engine(db_path)
+    found = {}
+    with engine.connect() as connection:
+        tokenizer = _index_tokenizer(connection)
+        if not tokenizer:
+            return {}
+        for artist, album in dict.fromkeys(pairs):
+            url = lookup_album_url(connection, artist, album, tokenizer)
+            if url:
+                found[(artist, album)] = url
+    return found
+
+
+if __name__ == "__main__":
+    refresh_catalog_index(get_engine(), rebuild=True)
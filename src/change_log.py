@@ -0,0 +1,292 @@
+"""
+Change-data capture for journeys.
+
+Triggers on the journey fact and dimension tables append the JourneyIDs a
+write affects to JourneyChangeLog under a monotonically increasing ChangeSeq.
+Consumers (playlist sync, essay generation, JourneyStepWide) keep a cursor in
+ChangeConsumer and only process the journeys changed since their last run.
+
+Advancing a cursor never deletes log entries, since `--changed-since` readers
+may still ask for them. The log is pruned by `build` (see `prune_change_log`):
+only entries older than the retention window that every registered consumer
+has seen are removed.
+"""
+
+from datetime import UTC, datetime
+
+from sqlalchemy import text
+
+# Table -> SQL matching the journey steps affected by a changed row `{r}`
+JOURNEY_MATCH = {
+    "DimAlbum": (
+        "fs.AlbumID = {r}.AlbumID OR fs.RecordingID IN "
+        "(SELECT RecordingID FROM DimRecording WHERE AlbumID = {r}.AlbumID)"
+    ),
+    "DimRecording": "fs.RecordingID = {r}.RecordingID",
+    "DimPerformer": (
+        "fs.AlbumID IN (SELECT AlbumID FROM DimAlbum WHERE PerformerID = {r}.PerformerID) "
+        "OR fs.RecordingID IN (SELECT RecordingID FROM DimRecording WHERE PerformerID = {r}.PerformerID)"
+    ),
+    "BridgeAlbumMovement": "fs.RecordingID = {r}.recording_id",
+    "DimMovement": (
+        "fs.RecordingID IN "
+        "(SELECT recording_id FROM BridgeAlbumMovement WHERE movement_id = {r}.MovementID)"
+    ),
+}
+# Tables whose rows carry the JourneyID themselves
+JOURNEY_TABLES = ("FactJourneyStep", "DimJourney")
+
+NOW_SQL = "strftime('%Y-%m-%dT%H:%M:%S', 'now')"
+# Log entries are kept at least this long, whatever the consumer cursors say
+CHANGE_LOG_RETENTION_DAYS = 30
+
+
+def _log_sql(table, rows):
+    if table in JOURNEY_TABLES:
+        return " ".join(
+            "INSERT INTO JourneyChangeLog (JourneyID, SourceTable, ChangedUTC) "
+            f"VALUES ({row}.JourneyID, '{table}', {NOW_SQL});"
+            for row in rows
+        )
+    match = " OR ".join(f"({JOURNEY_MATCH[table].format(r=row)})" for row in rows)
+    return (
+        "INSERT INTO JourneyChangeLog (JourneyID, SourceTable, ChangedUTC) "
+        f"SELECT DISTINCT fs.JourneyID, '{table}', {NOW_SQL} "
+        f"FROM FactJourneyStep fs WHERE {match};"
+    )
+
+
+def create_change_log(connection):
+    """
+    Creates JourneyChangeLog, ChangeConsumer and the capture triggers.
+    Like the essay queue, the log lives outside the CSV-backed tables and
+    survives `build`; the triggers are recreated with their tables.
+    """
+    connection.execute(
+        text(
+            """
+        CREATE TABLE IF NOT EXISTS JourneyChangeLog (
+            ChangeSeq INTEGER PRIMARY KEY AUTOINCREMENT,
+            JourneyID TEXT NOT NULL,
+            SourceTable TEXT,
+            ChangedUTC TEXT
+        )
+    """
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_change_log_time ON JourneyChangeLog (ChangedUTC)"
+        )
+    )
+    connection.execute(
+        text(
+            """
+        CREATE TABLE IF NOT EXISTS ChangeConsumer (
+            Consumer TEXT PRIMARY KEY,
+            LastSeq INTEGER NOT NULL,
+            UpdatedUTC TEXT
+        )
+    """
+        )
+    )
+    tables = {
+        row[0]
+        for row in connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table'")
+        )
+    }
+    for table in JOURNEY_TABLES + tuple(JOURNEY_MATCH):
+        if table not in tables:
+            continue
+        for event, rows in (
+            ("INSERT", ("new",)),
+            ("UPDATE", ("old", "new")),
+            ("DELETE", ("old",)),
+        ):
+            trigger = f"{table}_cdc_{event.lower()}"
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            connection.execute(
+                text(
+                    f"CREATE TRIGGER {trigger} AFTER {event} ON {table} "
+                    f"BEGIN {_log_sql(table, rows)} END"
+                )
+            )
+
+
+def ensure_change_log(connection):
+    """Creates the change log on databases built before it existed."""
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'FactJourneyStep_cdc_insert'")
+    ).scalar()
+    if not exists:
+        create_change_log(connection)
+
+
+def current_seq(connection):
+    """Latest ChangeSeq handed out; read from sqlite_sequence so pruning cannot lower it."""
+    return (
+        connection.execute(
+            text("SELECT seq FROM sqlite_sequence WHERE name = 'JourneyChangeLog'")
+        ).scalar()
+        or 0
+    )
+
+
+def record_journey_changes(connection, journey_ids=None, source="manual"):
+    """Logs a change for the given journeys, or for every journey when None."""
+    if journey_ids is None:
+        connection.execute(
+            text(
+                "INSERT INTO JourneyChangeLog (JourneyID, SourceTable, ChangedUTC) "
+                f"SELECT JourneyID, :source, {NOW_SQL} FROM DimJourney"
+            ),
+            {"source": source},
+        )
+        return
+    journey_ids = list(journey_ids)
+    if journey_ids:
+        connection.execute(
+            text(
+                "INSERT INTO JourneyChangeLog (JourneyID, SourceTable, ChangedUTC) "
+                f"VALUES (:jid, :source, {NOW_SQL})"
+            ),
+            [{"jid": journey_id, "source": source} for journey_id in journey_ids],
+        )
+
+
+def parse_changed_since(value):
+    """
+    Reads a --changed-since value: an integer ChangeSeq, or an ISO date/time
+    (interpreted as UTC when it has no offset).
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo:
+        moment = moment.astimezone(UTC)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def journeys_changed_since(connection, since):
+    """
+    Returns (JourneyIDs, high_seq) for changes after `since`, which is a ChangeSeq
+    or a UTC timestamp string from parse_changed_since.
+    """
+    high_seq = current_seq(connection)
+    if isinstance(since, int):
+        condition, params = "ChangeSeq > :since", {"since": since}
+    else:
+        condition, params = "ChangedUTC >= :since", {"since": since}
+    params["high"] = high_seq
+    journey_ids = [
+        row[0]
+        for row in connection.execute(
+            text(
+                f"SELECT DISTINCT JourneyID FROM JourneyChangeLog "
+                f"WHERE {condition} AND ChangeSeq <= :high"
+            ),
+            params,
+        )
+    ]
+    return sorted(journey_ids), high_seq
+
+
+def consumer_cursor(connection, consumer):
+    """Returns the consumer's last processed ChangeSeq, or None if it never advanced."""
+    return connection.execute(
+        text(
+            "SELECT LastSeq FROM ChangeConsumer "
+            "WHERE Consumer = :consumer AND UpdatedUTC IS NOT NULL"
+        ),
+        {"consumer": consumer},
+    ).scalar()
+
+
+def register_consumer(connection, consumer):
+    """
+    Registers a consumer that has not advanced yet. Its cursor stays at 0 (and
+    `consumer_cursor` keeps returning None), so pruning keeps every entry until
+    the consumer first advances.
+    """
+    connection.execute(
+        text(
+            "INSERT OR IGNORE INTO ChangeConsumer (Consumer, LastSeq, UpdatedUTC) "
+            "VALUES (:consumer, 0, NULL)"
+        ),
+        {"consumer": consumer},
+    )
+
+
+def pending_journeys(connection, consumer):
+    """
+    Returns (JourneyIDs, high_seq) changed since the consumer's cursor.
+    JourneyIDs is None for a consumer without a cursor, meaning "everything".
+    """
+    cursor = consumer_cursor(connection, consumer)
+    if cursor is None:
+        return None, current_seq(connection)
+    return journeys_changed_since(connection, cursor)
+
+
+def advance_consumer(connection, consumer, seq):
+    """Moves the consumer's cursor to `seq`; the log itself is left untouched."""
+    connection.execute(
+        text(
+            """
+        INSERT INTO ChangeConsumer (Consumer, LastSeq, UpdatedUTC) VALUES (:consumer, :seq, :ts)
+        ON CONFLICT(Consumer) DO UPDATE SET LastSeq = excluded.LastSeq, UpdatedUTC = excluded.UpdatedUTC
+    """
+        ),
+        {
+            "consumer": consumer,
+            "seq": seq,
+            "ts": datetime.now(UTC).isoformat(),
+        },
+    )
+
+
+def prune_change_log(connection, retention_days=CHANGE_LOG_RETENTION_DAYS):
+    """
+    Deletes log entries older than `retention_days` that every registered
+    consumer has already processed. Returns the number of entries removed.
+    """
+    result = connection.execute(
+        text(
+            """
+        DELETE FROM JourneyChangeLog
+        WHERE ChangedUTC < strftime('%Y-%m-%dT%H:%M:%S', 'now', :age)
+          AND ChangeSeq <= (SELECT COALESCE(MIN(LastSeq), 0) FROM ChangeConsumer)
+    """
+        ),
+        {"age": f"-{retention_days} days"},
+    )
+    return result.rowcount
+
+
+def filter_journey_ids(journey_ids, changed):
+    """Intersects an optional JourneyID filter with an optional changed set."""
+    if changed is None:
+        return journey_ids
+    if journey_ids is None:
+        return list(changed)
+    changed = set(changed)
+    return [journey_id for journey_id in journey_ids if journey_id in changed]
+
+
+def select_changed_journeys(connection, consumer, changed_since=None, dirty_only=False):
+    """
+    Resolves --changed-since / --dirty-only into (JourneyIDs or None, high_seq).
+    None means "no restriction"; high_seq is only meaningful for dirty_only.
+    The caller is registered as a consumer, so pruning keeps what it has not seen.
+    """
+    ensure_change_log(connection)
+    register_consumer(connection, consumer)
+    if changed_since is not None:
+        return journeys_changed_since(connection, parse_changed_since(changed_since))
+    if dirty_only:
+        return pending_journeys(connection, consumer)
+    return None, None
@@ -0,0 +1,98 @@
+"""
+Shared database access for the DWH.
+
+Every module gets its engine from `get_engine`, which keeps one pooled engine
+per database file for the whole process. Connections are tuned with SQLite
+pragmas when they are opened, and each keeps a prepared-statement cache, so
+queries hoisted to module-level `text()` constants are parsed and compiled once
+and reused on every call.
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+
+from src.instrumentation import count, metrics
+
+# --- Configuration ---
+OUTPUT_DIR = "output"
+DB_NAME = "music_journeys.db"
+DB_PATH = os.path.join(OUTPUT_DIR, DB_NAME)
+
+BUSY_TIMEOUT_MS = 30000
+# Prepared statements kept per connection by the sqlite3 driver
+STATEMENT_CACHE_SIZE = 256
+POOL_SIZE = 5
+
+# Applied to every new connection
+CONNECT_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in CONNECT_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.statement_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - context.statement_started) * 1000
+    metrics.add_time("db.execute", elapsed_ms)
+    count("db.statements")
+
+
+def get_engine(db_path=DB_PATH):
+    """Returns the process-wide engine of `db_path`, creating it on first use."""
+    key = os.path.abspath(db_path)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(
+                f"sqlite:///{db_path}",
+                pool_size=POOL_SIZE,
+                connect_args={
+                    "timeout": BUSY_TIMEOUT_MS / 1000,
+                    "check_same_thread": False,
+                    "cached_statements": STATEMENT_CACHE_SIZE,
+                },
+            )
+            event.listen(engine, "connect", _apply_pragmas)
+            # Statement counts and time feed the run summary
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            _engines[key] = engine
+        return engine
+
+
+def raw_connection(db_path=DB_PATH):
+    """
+    Checks a DBAPI (sqlite3) connection out of the shared pool. It behaves like a
+    sqlite3 connection; close() hands it back to the pool instead of closing it.
+    """
+    return get_engine(db_path).raw_connection()
+
+
+def dispose_engines():
+    """Closes every pooled connection, e.g. before the database file is replaced."""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
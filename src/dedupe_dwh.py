@@ -0,0 +1,448 @@
+"""
+Duplicate performer and album detection and merge.
+
+Imports key performers on the exact PerformerName and albums on the exact
+(AlbumTitle, PerformerID), so spelling variants ("Herbert von Karajan",
+"Karajan, Herbert von", "Herbert Von Karajan") pile up as separate rows.
+`find_duplicates` finds them without comparing every pair of rows:
+
+- Blocking: names are reduced to their `title_matching` key with the tokens
+  sorted, and only rows sharing a block are compared: the same key, or a
+  token starting with the same BLOCK_PREFIX characters (for albums, also the
+  same performer). Blocks larger than MAX_BLOCK_SIZE are skipped.
+- Scoring: candidate pairs are scored in batches of SCORE_BATCH_SIZE by the
+  Dice similarity of the keys' character trigrams, encoded as integers and
+  looked up with one sorted search per batch. Pairs whose numbers differ
+  ("Symphony No. 5" and "Symphony No. 6") are never duplicates.
+
+The pairs at or above the threshold are written to a CSV report for review.
+With `apply`, the pairs (or those left in a reviewed report) are merged in
+one transaction: they are grouped into clusters, the lowest ID of each
+cluster is kept, and FactJourneyStep, DimRecording, BridgeAlbumMovement and
+DimAlbum are repointed to it before the duplicates are deleted. The change
+capture triggers log the affected journeys, so JourneyStepWide and
+`playlist --dirty-only` pick the merge up.
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.catalog_index import refresh_catalog_index
+from src.db import DB_PATH, OUTPUT_DIR, get_engine
+from src.instrumentation import count, stage
+from src.logger import setup_logger
+from src.title_matching import title_keys
+
+# --- Configuration ---
+REPORT_PATH = os.path.join(OUTPUT_DIR, "dedupe-candidates.csv")
+DEFAULT_THRESHOLD = 0.85
+SCORE_DECIMALS = 3
+BLOCK_PREFIX = 4
+# Shorter tokens ("de", "la", "op") only block through the whole key
+MIN_BLOCK_TOKEN = 3
+# Common tokens ("orchestra", "symphony") make blocks too large to be useful
+MAX_BLOCK_SIZE = 500
+SCORE_BATCH_SIZE = 100_000
+
+REPORT_COLUMNS = [
+    "Entity",
+    "KeepID",
+    "KeepName",
+    "MergeID",
+    "MergeName",
+    "Score",
+    "Reason",
+]
+# Albums that end up with the same title and performer once their performers
+# are merged; UNIQUE(AlbumTitle, PerformerID) forces their merge
+COLLISION_REASON = "performer_merged"
+
+PERFORMERS_QUERY = text(
+    "SELECT PerformerID, PerformerName FROM DimPerformer ORDER BY PerformerID"
+)
+ALBUMS_QUERY = text(
+    "SELECT AlbumID, AlbumTitle, PerformerID FROM DimAlbum ORDER BY AlbumID"
+)
+
+# Merge maps, (MergeID -> KeepID), filled for the merge transaction
+MAP_TABLES = {
+    "album": "DedupeAlbumMap",
+    "performer": "DedupePerformerMap",
+}
+# Merge steps in order: (map, action, table, column). Merged albums are
+# deleted before performers are repointed, so no two albums share
+# (AlbumTitle, PerformerID) at any point. DimRecording and the bridge hold IDs
+# as TEXT; comparing them with the INTEGER map columns applies numeric
+# affinity, so "12" and "12.0" both match.
+MERGE_STEPS = (
+    ("album", "repointed", "FactJourneyStep", "AlbumID"),
+    ("album", "repointed", "DimRecording", "AlbumID"),
+    ("album", "repointed", "BridgeAlbumMovement", "album_id"),
+    # Bridge rows the kept album already has were left behind by OR IGNORE
+    ("album", "deleted", "BridgeAlbumMovement", "album_id"),
+    ("album", "deleted", "DimAlbum", "AlbumID"),
+    ("performer", "repointed", "DimAlbum", "PerformerID"),
+    ("performer", "repointed", "DimRecording", "PerformerID"),
+    ("performer", "deleted", "DimPerformer", "PerformerID"),
+)
+
+
+def entity_keys(names):
+    """The `title_matching` key of each name with its tokens sorted."""
+    return title_keys(names).str.split().map(sorted).str.join(" ")
+
+
+def _candidate_pairs(keys, groups=None):
+    """
+    Returns the positional (left, right) pairs, left < right, of rows sharing
+    a block: the whole key, or the first BLOCK_PREFIX characters of a token,
+    within the same group. Also returns the number of blocks skipped.
+    """
+    tokens = keys.str.split().explode().dropna()
+    tokens = tokens[tokens.str.len() >= MIN_BLOCK_TOKEN]
+    blocks = pd.concat(
+        [
+            pd.DataFrame({"row": keys.index, "block": "=" + keys.to_numpy()}),
+            pd.DataFrame(
+                {"row": tokens.index, "block": tokens.str[:BLOCK_PREFIX].to_numpy()}
+            ),
+        ],
+        ignore_index=True,
+    )
+    blocks = blocks[blocks["block"] != "="]
+    block_columns = ["block"]
+    if groups is not None:
+        blocks["group"] = groups.to_numpy()[blocks["row"].to_numpy()]
+        blocks = blocks[blocks["group"].notna()]
+        block_columns.append("group")
+    blocks = blocks.drop_duplicates()
+    sizes = blocks.groupby(block_columns)["row"].transform("size")
+    skipped = blocks.loc[sizes > MAX_BLOCK_SIZE, block_columns].drop_duplicates()
+    blocks = blocks[(sizes > 1) & (sizes <= MAX_BLOCK_SIZE)]
+    pairs = blocks.merge(blocks, on=block_columns, suffixes=("_left", "_right"))
+    pairs = pairs[pairs["row_left"] < pairs["row_right"]]
+    pairs = pairs[["row_left", "row_right"]].drop_duplicates()
+    return pairs.to_numpy(dtype=np.int64).reshape(-1, 2), len(skipped)
+
+
+def _trigram_index(keys):
+    """
+    Encodes each row's distinct character trigrams (of the key padded with a
+    space) as row * vocabulary size + trigram code. Returns the rows' first
+    position and count in the row-ordered codes, the codes, the sorted
+    encoded pairs and the vocabulary size.
+    """
+    grams = keys.map(
+        lambda key: sorted({f" {key} "[i : i + 3] for i in range(len(key))})
+    ).explode()
+    grams = grams[grams.notna()]
+    codes, vocabulary = pd.factorize(grams)
+    rows = grams.index.to_numpy(dtype=np.int64)
+    sizes = np.bincount(rows, minlength=len(keys))
+    starts = np.cumsum(sizes) - sizes
+    vocabulary_size = max(len(vocabulary), 1)
+    encoded = np.sort(rows * vocabulary_size + codes)
+    return starts, sizes, codes, encoded, vocabulary_size
+
+
+def _dice_scores(pairs, index):
+    """Trigram Dice similarity of each (left, right) row pair of one batch."""
+    starts, sizes, codes, encoded, vocabulary_size = index
+    left, right = pairs[:, 0], pairs[:, 1]
+    lengths = sizes[left]
+    pair_of_gram = np.repeat(np.arange(len(pairs)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    grams = codes[np.repeat(starts[left], lengths) + offsets]
+    # Each left trigram, looked up among the right row's trigrams
+    probes = right[pair_of_gram] * vocabulary_size + grams
+    found = np.searchsorted(encoded, probes)
+    hits = encoded[np.minimum(found, len(encoded) - 1)] == probes
+    shared = np.bincount(pair_of_gram[hits], minlength=len(pairs))
+    total = sizes[left] + sizes[right]
+    return np.divide(2.0 * shared, total, out=np.zeros(len(pairs)), where=total > 0)
+
+
+def duplicate_pairs(
+    frame, id_column, name_column, threshold=DEFAULT_THRESHOLD, group_column=None
+):
+    """
+    Scores the candidate pairs of `frame` (one row per entity, sorted by ID)
+    and returns those at or above `threshold` with KeepID (the lower ID),
+    KeepName, MergeID, MergeName, Score and Reason ("normalized" when the
+    keys are equal, else "similar"). Also returns the blocks skipped.
+    """
+    frame = frame.reset_index(drop=True)
+    keys = entity_keys(frame[name_column])
+    groups = frame[group_column] if group_column else None
+    with stage("dedupe.blocking"):
+        pairs, skipped = _candidate_pairs(keys, groups)
+        digits = keys.str.findall(r"\d+").map(sorted).str.join(" ").to_numpy()
+        pairs = pairs[digits[pairs[:, 0]] == digits[pairs[:, 1]]]
+    count("dedupe.candidate_pairs", len(pairs))
+
+    with stage("dedupe.scoring"):
+        index = _trigram_index(keys)
+        scores = np.concatenate(
+            [np.zeros(0)]
+            + [
+                _dice_scores(pairs[start : start + SCORE_BATCH_SIZE], index)
+                for start in range(0, len(pairs), SCORE_BATCH_SIZE)
+            ]
+        )
+    key_values = keys.to_numpy()
+    equal = key_values[pairs[:, 0]] == key_values[pairs[:, 1]]
+    scores = np.where(equal, 1.0, scores).round(SCORE_DECIMALS)
+    accepted = scores >= threshold
+    left, right = pairs[accepted, 0], pairs[accepted, 1]
+    return (
+        pd.DataFrame(
+            {
+                "KeepID": frame[id_column].to_numpy()[left],
+                "KeepName": frame[name_column].to_numpy()[left],
+                "MergeID": frame[id_column].to_numpy()[right],
+                "MergeName": frame[name_column].to_numpy()[right],
+                "Score": scores[accepted],
+                "Reason": np.where(equal[accepted], "normalized", "similar"),
+            }
+        ),
+        skipped,
+    )
+
+
+def merge_map(edges):
+    """
+    Groups (KeepID, MergeID) edges into clusters and returns {ID: kept ID}
+    for every ID merged away; the lowest ID of each cluster is kept.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if not len(edges):
+        return {}
+    ids, inverse = np.unique(edges, return_inverse=True)
+    left, right = inverse.reshape(-1, 2).T
+    # Min-label propagation; ids are sorted, so the lowest label is the lowest ID
+    labels = np.arange(len(ids))
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, left, labels[right])
+        np.minimum.at(labels, right, labels[left])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            break
+    return {
+        int(merged): int(kept)
+        for merged, kept in zip(ids, ids[labels])
+        if merged != kept
+    }
+
+
+def merged_performers(albums, performer_map):
+    """Each album's PerformerID once the performers in `performer_map` are merged."""
+    return albums["PerformerID"].map(performer_map).fillna(albums["PerformerID"])
+
+
+def album_collisions(albums, performer_map):
+    """
+    Album pairs that share AlbumTitle and PerformerID once the performers in
+    `performer_map` are merged, as (KeepID, KeepName, MergeID, MergeName,
+    Score, Reason) rows.
+    """
+    merged = albums.assign(PerformerID=merged_performers(albums, performer_map))
+    merged = merged[merged["AlbumTitle"].notna() & merged["PerformerID"].notna()]
+    keep = merged.groupby(["AlbumTitle", "PerformerID"])["AlbumID"].transform("min")
+    merged = merged[merged["AlbumID"] != keep]
+    return pd.DataFrame(
+        {
+            "KeepID": keep[merged.index].to_numpy(),
+            "KeepName": merged["AlbumTitle"].to_numpy(),
+            "MergeID": merged["AlbumID"].to_numpy(),
+            "MergeName": merged["AlbumTitle"].to_numpy(),
+            "Score": 1.0,
+            "Reason": COLLISION_REASON,
+        }
+    )
+
+
+def find_duplicates(connection, threshold=DEFAULT_THRESHOLD, logger=None):
+    """
+    Finds duplicate performers, then duplicate albums of the same (merged)
+    performer. Returns the report: one row per pair, REPORT_COLUMNS.
+    """
+    performers = pd.read_sql(PERFORMERS_QUERY, connection)
+    albums = pd.read_sql(ALBUMS_QUERY, connection)
+    performer_pairs, performer_skipped = duplicate_pairs(
+        performers, "PerformerID", "PerformerName", threshold
+    )
+    performer_map = merge_map(performer_pairs[["KeepID", "MergeID"]])
+
+    albums["MergedPerformerID"] = merged_performers(albums, performer_map)
+    album_pairs, album_skipped = duplicate_pairs(
+        albums, "AlbumID", "AlbumTitle", threshold, group_column="MergedPerformerID"
+    )
+    album_pairs = pd.concat(
+        [album_collisions(albums, performer_map), album_pairs], ignore_index=True
+    ).drop_duplicates(subset=["KeepID", "MergeID"])
+
+    if logger and (performer_skipped or album_skipped):
+        logger.warning(
+            "Skipped %s performer and %s album blocks larger than %s rows.",
+            performer_skipped,
+            album_skipped,
+            MAX_BLOCK_SIZE,
+        )
+    return pd.concat(
+        [
+            performer_pairs.assign(Entity="performer"),
+            album_pairs.assign(Entity="album"),
+        ],
+        ignore_index=True,
+    )[REPORT_COLUMNS]
+
+
+def merge_maps(connection, report):
+    """
+    Returns the (performer map, album map) of a report. Pairs naming a row
+    that no longer exists are dropped. Album merges forced by the performer
+    merges are recomputed, so removing a performer pair from a reviewed
+    report also drops the album merges it caused.
+    """
+    performers = pd.read_sql(PERFORMERS_QUERY, connection)
+    albums = pd.read_sql(ALBUMS_QUERY, connection)
+
+    def edges(entity, ids):
+        pairs = report[
+            (report["Entity"] == entity) & (report["Reason"] != COLLISION_REASON)
+        ]
+        pairs = pairs[pairs["KeepID"].isin(ids) & pairs["MergeID"].isin(ids)]
+        return pairs[["KeepID", "MergeID"]]
+
+    performer_map = merge_map(edges("performer", performers["PerformerID"]))
+    album_edges = pd.concat(
+        [
+            edges("album", albums["AlbumID"]),
+            album_collisions(albums, performer_map)[["KeepID", "MergeID"]],
+        ],
+        ignore_index=True,
+    )
+    return performer_map, merge_map(album_edges)
+
+
+def merge_duplicates(connection, performer_map, album_map):
+    """
+    Repoints every reference to a merged album or performer to the kept one
+    and deletes the merged rows, on `connection`'s transaction. Returns
+    {"repointed": {table: rows}, "deleted": {table: rows}}.
+    """
+    maps = {"album": album_map, "performer": performer_map}
+    for entity, table in MAP_TABLES.items():
+        connection.execute(
+            text(
+                f"CREATE TEMP TABLE IF NOT EXISTS {table} "
+                "(MergeID INTEGER PRIMARY KEY, KeepID INTEGER NOT NULL)"
+            )
+        )
+        connection.execute(text(f"DELETE FROM temp.{table}"))
+        if maps[entity]:
+            connection.execute(
+                text(
+                    f"INSERT INTO temp.{table} (MergeID, KeepID) VALUES (:merge, :keep)"
+                ),
+                [
+                    {"merge": merge, "keep": keep}
+                    for merge, keep in maps[entity].items()
+                ],
+            )
+
+    changed = {"repointed": {}, "deleted": {}}
+    for entity, action, table, column in MERGE_STEPS:
+        if not maps[entity]:
+            continue
+        merged = f"SELECT MergeID FROM temp.{MAP_TABLES[entity]}"
+        if action == "deleted":
+            statement = f"DELETE FROM {table} WHERE {column} IN ({merged})"
+        else:
+            statement = (
+                f"UPDATE OR IGNORE {table} SET {column} = "
+                f"(SELECT m.KeepID FROM temp.{MAP_TABLES[entity]} m "
+                f"WHERE m.MergeID = {table}.{column}) "
+                f"WHERE {column} IN ({merged})"
+            )
+        rows = connection.execute(text(statement)).rowcount
+        changed[action][table] = changed[action].get(table, 0) + rows
+    for table in MAP_TABLES.values():
+        connection.execute(text(f"DROP TABLE temp.{table}"))
+    return changed
+
+
+def dedupe_dwh(
+    db_path=DB_PATH,
+    output=REPORT_PATH,
+    threshold=DEFAULT_THRESHOLD,
+    apply=False,
+    pairs=None,
+):
+    """
+    Finds duplicate performers and albums in the DWH at `db_path` and writes
+    them to the CSV report `output`. With `pairs`, the pairs of that reviewed
+    report are used instead of searching. With apply=True they are merged.
+    Returns the number of performer and album pairs and, when applied, the
+    rows merged (see `merge_duplicates`).
+    """
+    logger = setup_logger()
+    started = time.perf_counter()
+    engine = get_engine(db_path)
+
+    # One transaction, so the merge applies to the rows the maps were made from
+    with engine.begin() as connection:
+        if pairs:
+            report = pd.read_csv(pairs)
+            logger.info("Read %s pairs from %s.", len(report), pairs)
+        else:
+            with stage("dedupe.find"):
+                report = find_duplicates(connection, threshold, logger)
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            report.to_csv(output, index=False)
+        performer_map, album_map = merge_maps(connection, report)
+        summary = {
+            "performer_pairs": int((report["Entity"] == "performer").sum()),
+            "album_pairs": int((report["Entity"] == "album").sum()),
+            "merged": {},
+        }
+        logger.info(
+            "%s duplicate performer pairs and %s album pairs in %.0f ms: %s performers and %s albums to merge.",
+            summary["performer_pairs"],
+            summary["album_pairs"],
+            (time.perf_counter() - started) * 1000,
+            len(performer_map),
+            len(album_map),
+        )
+        if apply and (performer_map or album_map):
+            with stage("dedupe.merge"):
+                summary["merged"] = merge_duplicates(
+                    connection, performer_map, album_map
+                )
+
+    if not apply:
+        if not pairs and len(report):
+            logger.info(
+                "Review %s, remove the pairs that are not duplicates, then run `dedupe --apply --pairs %s`.",
+                output,
+                output,
+            )
+        return summary
+    if not summary["merged"]:
+        logger.info("Nothing to merge.")
+        return summary
+
+    count("dedupe.performers_merged", len(performer_map))
+    count("dedupe.albums_merged", len(album_map))
+    for action, tables in summary["merged"].items():
+        for table, rows in tables.items():
+            logger.info("%s: %s rows %s.", table, rows, action)
+    refresh_catalog_index(engine, logger)
+    return summary
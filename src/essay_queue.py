@@ -0,0 +1,406 @@
+import hashlib
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import UTC, datetime, timedelta
+from jinja2 import TemplateError
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import SQLAlchemyError
+from src.db import get_engine
+from src.logger import setup_logger
+
+# --- Configuration ---
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 5
+# A worker renews the lease of its running jobs every JOB_HEARTBEAT_SECONDS;
+# a running job whose lease is older than JOB_LEASE_SECONDS was abandoned
+JOB_HEARTBEAT_SECONDS = 60
+JOB_LEASE_SECONDS = 600
+
+# Added after the first release; created on older queues by `ensure_essay_queue`
+JOB_COLUMNS = {"StepsHash": "TEXT", "WorkerID": "TEXT"}
+
+
+def ensure_essay_queue(connection):
+    """
+    Creates the EssayJobQueue table if it does not exist yet.
+    The queue lives outside the CSV-backed tables, so `build` leaves it alone.
+    """
+    connection.execute(
+        text(
+            """
+        CREATE TABLE IF NOT EXISTS EssayJobQueue (
+            JobID INTEGER PRIMARY KEY AUTOINCREMENT,
+            JourneyID TEXT NOT NULL,
+            Granularity TEXT,
+            Status TEXT NOT NULL DEFAULT 'pending',
+            Attempts INTEGER NOT NULL DEFAULT 0,
+            LastError TEXT,
+            CreatedUTC TEXT,
+            UpdatedUTC TEXT
+        );
+    """
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_essay_job_status ON EssayJobQueue (Status, JobID)"
+        )
+    )
+    columns = {
+        row[1] for row in connection.execute(text("PRAGMA table_info(EssayJobQueue)"))
+    }
+    for column, column_type in JOB_COLUMNS.items():
+        if column not in columns:
+            connection.execute(
+                text(f"ALTER TABLE EssayJobQueue ADD COLUMN {column} {column_type}")
+            )
+
+
+def enqueue_essay_job(connection, journey_id, granularity):
+    """
+    Adds a pending essay job for a journey and returns its JobID.
+    If the journey already has a pending or running job, that job is reused
+    instead. A running job stores the step hash it was claimed with, so a
+    journey that changes while its essay is running stays stale and is picked
+    up again by `generate-essays`.
+    """
+    ensure_essay_queue(connection)
+    existing = connection.execute(
+        text(
+            "SELECT JobID FROM EssayJobQueue WHERE JourneyID = :jid AND Status IN ('pending', 'running')"
+        ),
+        {"jid": journey_id},
+    ).scalar()
+    if existing:
+        return existing
+    now_utc = datetime.now(UTC).isoformat()
+    result = connection.execute(
+        text(
+            """
+            INSERT INTO EssayJobQueue (JourneyID, Granularity, Status, Attempts, CreatedUTC, UpdatedUTC)
+            VALUES (:jid, :gran, 'pending', 0, :ts, :ts)
+        """
+        ),
+        {"jid": journey_id, "gran": granularity, "ts": now_utc},
+    )
+    return result.lastrowid
+
+
+def claim_pending_jobs(connection, limit, worker_id=None):
+    """
+    Marks up to `limit` pending jobs as running for `worker_id` and returns them
+    oldest first, each with the hash of the journey's steps at claim time.
+    """
+    rows = connection.execute(
+        text(
+            """
+            SELECT JobID, JourneyID, Granularity FROM EssayJobQueue
+            WHERE Status = 'pending' ORDER BY JobID LIMIT :limit
+        """
+        ),
+        {"limit": limit},
+    ).fetchall()
+    if not rows:
+        return []
+    hashes = journey_step_hashes(connection, {row[1] for row in rows})
+    jobs = [
+        {
+            "job_id": job_id,
+            "journey_id": journey_id,
+            "granularity": granularity,
+            "steps_hash": hashes.get(journey_id, (None, None))[1],
+        }
+        for job_id, journey_id, granularity in rows
+    ]
+    now_utc = datetime.now(UTC).isoformat()
+    connection.execute(
+        text(
+            """
+            UPDATE EssayJobQueue
+            SET Status = 'running', StepsHash = :hash, WorkerID = :worker, UpdatedUTC = :ts
+            WHERE JobID = :id
+        """
+        ),
+        [
+            {
+                "hash": job["steps_hash"],
+                "worker": worker_id,
+                "ts": now_utc,
+                "id": job["job_id"],
+            }
+            for job in jobs
+        ],
+    )
+    return jobs
+
+
+def renew_job_leases(connection, worker_id):
+    """Heartbeat: moves the lease of every job `worker_id` is running to now."""
+    connection.execute(
+        text(
+            "UPDATE EssayJobQueue SET UpdatedUTC = :ts "
+            "WHERE Status = 'running' AND WorkerID = :worker"
+        ),
+        {"ts": datetime.now(UTC).isoformat(), "worker": worker_id},
+    )
+
+
+def release_expired_jobs(connection, lease_seconds=JOB_LEASE_SECONDS):
+    """
+    Puts running jobs whose lease expired (their worker died) back to 'pending'.
+    Jobs of live workers keep renewing their lease and are left alone.
+    """
+    expired = datetime.now(UTC) - timedelta(seconds=lease_seconds)
+    return connection.execute(
+        text(
+            "UPDATE EssayJobQueue SET Status = 'pending', WorkerID = NULL "
+            "WHERE Status = 'running' AND (UpdatedUTC IS NULL OR UpdatedUTC < :expired)"
+        ),
+        {"expired": expired.isoformat()},
+    ).rowcount
+
+
+def finish_job(connection, job_id, attempts, error=None):
+    """Records the outcome of a job: 'done' on success, 'failed' otherwise."""
+    connection.execute(
+        text(
+            """
+            UPDATE EssayJobQueue
+            SET Status = :status, Attempts = Attempts + :attempts, LastError = :error, UpdatedUTC = :ts
+            WHERE JobID = :id
+        """
+        ),
+        {
+            "status": "failed" if error else "done",
+            "attempts": attempts,
+            "error": error,
+            "ts": datetime.now(UTC).isoformat(),
+            "id": job_id,
+        },
+    )
+
+
+# --- Essay State ---
+
+
+def ensure_essay_state(connection):
+    """Creates the JourneyEssayState table, which remembers the step hash behind each essay."""
+    connection.execute(
+        text(
+            """
+        CREATE TABLE IF NOT EXISTS JourneyEssayState (
+            JourneyID TEXT PRIMARY KEY,
+            StepsHash TEXT,
+            GeneratedUTC TEXT
+        );
+    """
+        )
+    )
+
+
+def journey_step_hashes(connection, journey_ids=None):
+    """
+    Returns {JourneyID: (Granularity, StepsHash)} from a single ordered scan of FactJourneyStep.
+    The hash covers the granularity and each step's order and IDs; the act and
+    curation fields are left out because the essay sync writes them back.
+    """
+    query = """
+        SELECT dj.JourneyID, dj.Granularity, fs.StepOrder, fs.RecordingID, fs.AlbumID
+        FROM DimJourney dj
+        LEFT JOIN FactJourneyStep fs ON fs.JourneyID = dj.JourneyID
+    """
+    params = {}
+    if journey_ids:
+        query += " WHERE dj.JourneyID IN :jids"
+        params["jids"] = list(journey_ids)
+    statement = text(query + " ORDER BY dj.JourneyID, fs.StepOrder")
+    if journey_ids:
+        statement = statement.bindparams(bindparam("jids", expanding=True))
+
+    digests = {}
+    granularities = {}
+    for journey_id, granularity, *step in connection.execute(statement, params):
+        if journey_id not in digests:
+            digests[journey_id] = hashlib.sha256(str(granularity).encode("utf-8"))
+            granularities[journey_id] = granularity
+        digests[journey_id].update(repr(step).encode("utf-8"))
+    return {
+        journey_id: (granularities[journey_id], digest.hexdigest())
+        for journey_id, digest in digests.items()
+    }
+
+
+def find_stale_journeys(connection, journey_ids=None):
+    """Returns [(JourneyID, Granularity, StepsHash)] for journeys whose steps changed since their last essay."""
+    ensure_essay_state(connection)
+    generated = dict(
+        connection.execute(
+            text("SELECT JourneyID, StepsHash FROM JourneyEssayState")
+        ).fetchall()
+    )
+    return [
+        (journey_id, granularity, steps_hash)
+        for journey_id, (granularity, steps_hash) in journey_step_hashes(
+            connection, journey_ids
+        ).items()
+        if generated.get(journey_id) != steps_hash
+    ]
+
+
+def record_essay_states(connection, journey_hashes):
+    """Stores the step hash each essay was generated from, in one executemany."""
+    ensure_essay_state(connection)
+    now_utc = datetime.now(UTC).isoformat()
+    connection.execute(
+        text(
+            """
+            INSERT INTO JourneyEssayState (JourneyID, StepsHash, GeneratedUTC)
+            VALUES (:jid, :hash, :ts)
+            ON CONFLICT(JourneyID) DO UPDATE SET StepsHash=excluded.StepsHash, GeneratedUTC=excluded.GeneratedUTC
+        """
+        ),
+        [
+            {"jid": journey_id, "hash": steps_hash, "ts": now_utc}
+            for journey_id, steps_hash in journey_hashes.items()
+        ],
+    )
+
+
+# --- Worker ---
+
+
+def run_with_retries(func, args, max_attempts, logger, label):
+    """
+    Calls func(*args), retrying failures with exponential backoff.
+    Returns (result, attempts, error); error is None on success.
+    """
+    error = None
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func(*args), attempt, None
+        # requests' errors are OSErrors; ValueError/KeyError cover malformed responses
+        except (
+            OSError,
+            ValueError,
+            KeyError,
+            TemplateError,
+            SQLAlchemyError,
+        ) as e:
+            error = str(e)
+            logger.warning(
+                "%s attempt %s/%s failed: %s", label, attempt, max_attempts, e
+            )
+            if attempt < max_attempts:
+                time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    return None, max_attempts, error
+
+
+def _run_job(job, max_attempts, logger, stream=False):
+    """Runs one essay job with retries. Returns (attempts, error)."""
+    from src.generate_dwh_journey import generate_dwh_journey
+
+    def generate(journey_id, granularity):
+        return generate_dwh_journey(journey_id, granularity, stream=stream)
+
+    _, attempts, error = run_with_retries(
+        generate,
+        (job["journey_id"], job["granularity"] or "Album"),
+        max_attempts,
+        logger,
+        f"Essay job {job['job_id']} ({job['journey_id']})",
+    )
+    return attempts, error
+
+
+def run_essay_worker(
+    max_workers=DEFAULT_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS, stream=False
+):
+    """
+    Drains the essay job queue, running up to `max_workers` Gemini generations at once.
+    Running jobs are leased to this worker and their lease renewed while they run;
+    jobs whose lease expired (an interrupted worker) are put back to 'pending' first.
+    With `stream`, each essay is written to its markdown file as Gemini generates it.
+    """
+    logger = setup_logger()
+    engine = get_engine()
+    worker_id = uuid.uuid4().hex
+
+    with engine.begin() as connection:
+        ensure_essay_queue(connection)
+        released = release_expired_jobs(connection)
+    if released:
+        logger.warning("Put %s abandoned essay jobs back in the queue.", released)
+
+    done_count = 0
+    failed_count = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = {}
+        while True:
+            free_slots = max_workers - len(in_flight)
+            if free_slots > 0:
+                with engine.begin() as connection:
+                    for job in claim_pending_jobs(connection, free_slots, worker_id):
+                        logger.info(
+                            "Starting essay job %s for journey %s.",
+                            job["job_id"],
+                            job["journey_id"],
+                        )
+                        future = pool.submit(
+                            _run_job, job, max_attempts, logger, stream
+                        )
+                        in_flight[future] = job
+            if not in_flight:
+                break
+
+            finished, _ = wait(
+                in_flight, timeout=JOB_HEARTBEAT_SECONDS, return_when=FIRST_COMPLETED
+            )
+            if not finished:
+                with engine.begin() as connection:
+                    renew_job_leases(connection, worker_id)
+                continue
+            for future in finished:
+                job = in_flight.pop(future)
+                try:
+                    attempts, error = future.result()
+                except Exception as e:
+                    # An unexpected error fails this job, not the whole worker
+                    logger.exception(
+                        "Essay job %s for journey %s crashed.",
+                        job["job_id"],
+                        job["journey_id"],
+                    )
+                    attempts, error = 1, f"{type(e).__name__}: {e}"
+                with engine.begin() as connection:
+                    finish_job(connection, job["job_id"], attempts, error)
+                    if not error:
+                        # The hash the essay was generated from, not the current one
+                        record_essay_states(
+                            connection, {job["journey_id"]: job["steps_hash"]}
+                        )
+                if error:
+                    failed_count += 1
+                    logger.error(
+                        "Essay job %s for journey %s failed after %s attempts: %s",
+                        job["job_id"],
+                        job["journey_id"],
+                        attempts,
+                        error,
+                    )
+                else:
+                    done_count += 1
+                    logger.info(
+                        "Essay job %s for journey %s completed.",
+                        job["job_id"],
+                        job["journey_id"],
+                    )
+
+    logger.info(
+        "Essay queue drained: %s completed, %s failed.", done_count, failed_count
+    )
+
+
+if __name__ == "__main__":
+    run_essay_worker()
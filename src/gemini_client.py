@@ -0,0 +1,259 @@
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import requests
+from src.instrumentation import count, metrics, stage
+from src.logger import setup_logger
+
+# --- Configuration ---
+GEMINI_MODEL = "gemini-2.5-pro"
+# GEMINI_API_BASE_URL points the client at another host (e.g. the local stand-in server)
+GEMINI_API_BASE_URL = os.getenv(
+    "GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com"
+).rstrip("/")
+GEMINI_API_URL = f"{GEMINI_API_BASE_URL}/v1/models"
+
+# Responses are cached on disk, keyed by model name plus a hash of the prompt
+CACHE_DIR = os.path.join(".cache", "gemini")
+CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("GEMINI_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Eviction trims the cache to this fraction of CACHE_MAX_BYTES, so it does not rerun on every put
+CACHE_EVICT_TO = 0.9
+# (connect, read) seconds; long essays can take minutes before the first byte
+REQUEST_TIMEOUT_SECONDS = (10, int(os.getenv("GEMINI_TIMEOUT_SECONDS", "600")))
+
+# Running estimate of the cache size, so a put only scans the directory when it crosses the limit
+_cache_lock = threading.Lock()
+_cache_usage = {"bytes": None}
+
+
+def cache_key(model, prompt_text):
+    """Content address of a prompt: sha256 over the model name and the rendered prompt."""
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt_text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+
+def cache_get(key, ttl_seconds=CACHE_TTL_SECONDS):
+    """Returns the cached response text for `key`, or None if missing or expired."""
+    path = _cache_path(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if ttl_seconds and time.time() - entry.get("created", 0) > ttl_seconds:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+        return None
+    # Touch the entry so size-based eviction drops the least recently used first
+    with contextlib.suppress(OSError):
+        os.utime(path, None)
+    return entry["text"]
+
+
+def write_atomically(path, text):
+    """
+    Writes `text` to a uniquely named temp file next to `path` and renames it
+    over `path`, so readers and concurrent writers never see a partial file.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".",
+        prefix=f"{os.path.basename(path)}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def cache_put(key, model, text, max_bytes=CACHE_MAX_BYTES):
+    """
+    Stores a response atomically. Old entries are evicted only once the cache's
+    running size estimate crosses `max_bytes`.
+    """
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = json.dumps({"model": model, "created": time.time(), "text": text})
+    added = len(data.encode("utf-8"))
+    with contextlib.suppress(OSError):
+        added -= os.path.getsize(path)
+    write_atomically(path, data)
+
+    with _cache_lock:
+        if _cache_usage["bytes"] is None:
+            _cache_usage["bytes"] = sum(size for _, size, _ in _cache_entries())
+        else:
+            _cache_usage["bytes"] += added
+        if _cache_usage["bytes"] > max_bytes:
+            _cache_usage["bytes"] = evict_cache(max_bytes)
+
+
+def _cache_entries():
+    """Returns [(mtime, size, path)] for every cached response."""
+    entries = []
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def evict_cache(max_bytes=CACHE_MAX_BYTES):
+    """
+    If the cache is larger than `max_bytes`, removes least recently used entries
+    until it fits in CACHE_EVICT_TO of it. Returns the remaining size in bytes.
+    """
+    entries = _cache_entries()
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return total
+    target = max_bytes * CACHE_EVICT_TO
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= target:
+            break
+    return total
+
+
+def generate_content(prompt_text, api_key=None, model=GEMINI_MODEL, refresh=False):
+    """
+    Sends a prompt to Gemini generateContent and returns the markdown text.
+    Identical prompts for the same model are answered from the on-disk cache
+    unless `refresh` is set, in which case the API is called and the cache updated.
+    """
+    logger = setup_logger("gemini")
+    key = cache_key(model, prompt_text)
+    if not refresh:
+        cached = cache_get(key)
+        if cached is not None:
+            count("gemini.cache_hits")
+            logger.info("Using cached Gemini response (%s).", key[:12])
+            return cached
+        count("gemini.cache_misses")
+
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    url = f"{GEMINI_API_URL}/{model}:generateContent?key={api_key}"
+    headers = {"Content-Type": "application/json"}
+    payload = {"contents": [{"parts": [{"text": prompt_text}]}]}
+    count("gemini.calls")
+    with stage("gemini.generate"):
+        response = requests.post(
+            url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT_SECONDS
+        )
+    response.raise_for_status()
+    result = response.json()
+    markdown = result["candidates"][0]["content"]["parts"][0]["text"]
+    cache_put(key, model, markdown)
+    return markdown
+
+
+def stream_content(
+    prompt_text, output_path, api_key=None, model=GEMINI_MODEL, prefix="", refresh=False
+):
+    """
+    Streams a Gemini response into `output_path` as it is generated and returns its text.
+
+    Chunks are appended to `<output_path>.partial` and the file is renamed over
+    `output_path` only once the stream completes. If the connection drops, the
+    partial file is kept so the text generated so far is not lost. `prefix` is
+    written ahead of the response (e.g. a title) but is not part of the return value.
+    Time to first token is recorded as stage "gemini.first_token" and the whole
+    stream as "gemini.stream", so both land in the run summary.
+    """
+    logger = setup_logger("gemini")
+    partial_path = f"{output_path}.partial"
+    key = cache_key(model, prompt_text)
+    if not refresh:
+        cached = cache_get(key)
+        if cached is not None:
+            count("gemini.cache_hits")
+            logger.info("Using cached Gemini response (%s).", key[:12])
+            with open(partial_path, "w", encoding="utf-8") as f:
+                f.write(prefix + cached)
+            os.replace(partial_path, output_path)
+            return cached
+        count("gemini.cache_misses")
+
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    url = f"{GEMINI_API_URL}/{model}:streamGenerateContent?alt=sse&key={api_key}"
+    headers = {"Content-Type": "application/json"}
+    payload = {"contents": [{"parts": [{"text": prompt_text}]}]}
+
+    count("gemini.calls")
+    started = time.monotonic()
+    first_token_at = None
+    parts = []
+    with stage("gemini.stream"), open(partial_path, "w", encoding="utf-8") as f:
+        f.write(prefix)
+        try:
+            with requests.post(
+                url,
+                headers=headers,
+                json=payload,
+                stream=True,
+                timeout=REQUEST_TIMEOUT_SECONDS,
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[len("data:") :])
+                    for candidate in event.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            chunk = part.get("text", "")
+                            if not chunk:
+                                continue
+                            if first_token_at is None:
+                                first_token_at = time.monotonic()
+                                ttft = first_token_at - started
+                                metrics.add_time("gemini.first_token", ttft * 1000)
+                                logger.info(
+                                    "Gemini stream: first token after %.2fs.", ttft
+                                )
+                            parts.append(chunk)
+                            f.write(chunk)
+                            f.flush()
+        except Exception:
+            logger.warning(
+                "Gemini stream interrupted after %.2fs; %s characters kept in %s.",
+                time.monotonic() - started,
+                sum(len(chunk) for chunk in parts),
+                partial_path,
+            )
+            raise
+
+    markdown = "".join(parts)
+    os.replace(partial_path, output_path)
+    logger.info(
+        "Gemini stream: %s characters in %.2fs total.",
+        len(markdown),
+        time.monotonic() - started,
+    )
+    cache_put(key, model, markdown)
+    return markdown
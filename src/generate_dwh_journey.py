@@ -1,46 +1,49 @@
-import sqlite3
-import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from jinja2 import Template
+from sqlalchemy import text
+from src.db import get_engine
+from src.gemini_client import generate_content, stream_content
+from src.journey_step_wide import ensure_fresh_journey
+
+# --- Chunked generation settings ---
+CHUNK_TOKEN_BUDGET = 4000
+CHUNK_WORKERS = 4
+SECTION_INSTRUCTION = (
+    "This is part {part} of {parts} of the journey \"{journey}\" ({acts}). "
+    "Write the essay sections for these steps only; do not write an overall "
+    "introduction or conclusion, a final pass will merge all parts.\n\n"
+)
+MERGE_INSTRUCTION = (
+    "Below are {parts} consecutive section essays for the journey \"{journey}\". "
+    "Merge them into one coherent markdown essay: keep every step, its details and "
+    "its order, keep the act headings, remove repeated introductions, and add a "
+    "short overall introduction and conclusion."
+)
+
+# --- Queries, compiled once and reused on every call ---
+ALBUM_STEPS_QUERY = text("""
+    SELECT StepOrder, AlbumTitle, AlbumPerformerName, AlbumLabel, AlbumReleaseDate,
+           AlbumSpotifyURL, ActNumber, ActTitle
+    FROM JourneyStepWide
+    WHERE JourneyID = :jid AND HasAlbum
+    ORDER BY StepOrder
+""")
+TRACK_STEPS_QUERY = text("""
+    SELECT StepOrder, TrackTitle, TrackPerformerName, TrackLabel, TrackReleaseDate,
+           TrackSpotifyURL, ActNumber, ActTitle
+    FROM JourneyStepWide
+    WHERE JourneyID = :jid AND HasTrack
+    ORDER BY StepOrder
+""")
+JOURNEY_NAME_QUERY = text("SELECT JourneyName FROM DimJourney WHERE JourneyID = :jid")
 
 def extract_journey_steps(journey_id, granularity="Album"):
-    db_path = os.path.join("output", "music_journeys.db")
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    if granularity == "Album":
-        query = """
-        SELECT
-            fs.StepOrder,
-            da.AlbumTitle,
-            dp.PerformerName,
-            da.RecordingLabel,
-            da.SpotifyReleaseDate,
-            da.SpotifyURL
-        FROM FactJourneyStep fs
-        JOIN DimAlbum da ON fs.AlbumID = da.AlbumID
-        JOIN DimPerformer dp ON da.PerformerID = dp.PerformerID
-        WHERE fs.JourneyID = ?
-        ORDER BY fs.StepOrder
-        """
-    else:
-        query = """
-        SELECT
-            fs.StepOrder,
-            dr.SpotifyTitle,
-            dp.PerformerName,
-            da.RecordingLabel,
-            da.SpotifyReleaseDate,
-            dr.SpotifyURL
-        FROM FactJourneyStep fs
-        JOIN DimRecording dr ON fs.RecordingID = dr.RecordingID
-        JOIN DimAlbum da ON dr.AlbumID = da.AlbumID
-        JOIN DimPerformer dp ON dr.PerformerID = dp.PerformerID
-        WHERE fs.JourneyID = ?
-        ORDER BY fs.StepOrder
-        """
-    cursor.execute(query, (journey_id,))
+    query = ALBUM_STEPS_QUERY if granularity == "Album" else TRACK_STEPS_QUERY
+    with get_engine().begin() as connection:
+        ensure_fresh_journey(connection, journey_id)
+        rows = connection.execute(query, {"jid": journey_id}).fetchall()
     steps = []
-    for row in cursor.fetchall():
+    for row in rows:
         steps.append({
             "step_order": row[0],
             "album": row[1],
@@ -49,40 +52,116 @@ def extract_journey_steps(journey_id, granularity="Album"):
             "release_date": row[4],
             "spotify_url": row[5],
             "apple_music_url": "",
+            "act_number": row[6],
+            "act_title": row[7],
         })
-    conn.close()
     return steps
 
-def prepare_gemini_prompt(template_path, journey_steps):
+def format_step_md(step):
+    return (
+        f"* **Concerto:** {step['album']}\n"
+        f"* **Performer:** {step['performer']}\n"
+        f"* **Album:** {step['album']}\n"
+        f"* **Label:** {step['label']}\n"
+        f"* **Release Date:** {step['release_date']}\n"
+        f"* **Spotify:** {step['spotify_url']}\n"
+        f"* **Apple Music:** {step['apple_music_url']}\n"
+    )
+
+def render_playlist_md(journey_steps):
+    # One join over per-step strings instead of repeated += on a growing string
+    return "".join(format_step_md(step) for step in journey_steps)
+
+def load_template(template_path):
     with open(template_path, 'r', encoding='utf-8') as f:
-        template_str = f.read()
-    template = Template(template_str)
-    playlist_md = ""
-    for step in journey_steps:
-        playlist_md += (
-            f"* **Concerto:** {step['album']}\n"
-            f"* **Performer:** {step['performer']}\n"
-            f"* **Album:** {step['album']}\n"
-            f"* **Label:** {step['label']}\n"
-            f"* **Release Date:** {step['release_date']}\n"
-            f"* **Spotify:** {step['spotify_url']}\n"
-            f"* **Apple Music:** {step['apple_music_url']}\n"
-        )
-    prompt = template.render(playlist=playlist_md)
+        return Template(f.read())
+
+def prepare_gemini_prompt(template_path, journey_steps):
+    template = load_template(template_path)
+    prompt = template.render(playlist=render_playlist_md(journey_steps))
     return prompt
 
-def send_to_gemini(prompt_text):
-    api_key = os.getenv("GEMINI_API_KEY")
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.5-pro:generateContent?key={api_key}"
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt_text}]}]
-    }
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-    result = response.json()
-    markdown = result["candidates"][0]["content"]["parts"][0]["text"]
-    return markdown
+# --- Chunked (map-reduce) generation for long journeys ---
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English prose and markdown
+    return len(text) // 4 + 1
+
+def _act_key(step):
+    return (step.get("act_number"), step.get("act_title"))
+
+def chunk_steps_by_act(journey_steps, token_budget=CHUNK_TOKEN_BUDGET):
+    """
+    Packs consecutive acts (ActNumber/ActTitle) into chunks of at most `token_budget`
+    playlist tokens. An act that is too large on its own is split between steps.
+    """
+    acts = []
+    for step in journey_steps:
+        if acts and _act_key(acts[-1][-1]) == _act_key(step):
+            acts[-1].append(step)
+        else:
+            acts.append([step])
+
+    chunks = []
+    current, current_tokens = [], 0
+    for act in acts:
+        act_tokens = sum(estimate_tokens(format_step_md(step)) for step in act)
+        if current and current_tokens + act_tokens > token_budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        if act_tokens <= token_budget:
+            current.extend(act)
+            current_tokens += act_tokens
+            continue
+        for step in act:
+            step_tokens = estimate_tokens(format_step_md(step))
+            if current and current_tokens + step_tokens > token_budget:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(step)
+            current_tokens += step_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _describe_acts(chunk):
+    acts = []
+    for step in chunk:
+        number, title = _act_key(step)
+        label = ": ".join(str(part) for part in (f"Act {number}" if number else None, title) if part)
+        if label and label not in acts:
+            acts.append(label)
+    return ", ".join(acts) if acts else f"steps {chunk[0]['step_order']}-{chunk[-1]['step_order']}"
+
+def generate_chunked_essay(journey_name, journey_steps, template_path, token_budget=CHUNK_TOKEN_BUDGET, max_workers=CHUNK_WORKERS, refresh=False, stream_to=None, prefix=""):
+    """
+    Map: renders one section essay per act-aligned chunk, in parallel.
+    Reduce: asks Gemini to merge the sections into a single essay (streamed when `stream_to` is set).
+    """
+    template = load_template(template_path)
+    chunks = chunk_steps_by_act(journey_steps, token_budget)
+    if len(chunks) == 1:
+        return send_to_gemini(template.render(playlist=render_playlist_md(journey_steps)), refresh=refresh, stream_to=stream_to, prefix=prefix)
+
+    section_prompts = [
+        SECTION_INSTRUCTION.format(part=i, parts=len(chunks), journey=journey_name, acts=_describe_acts(chunk))
+        + template.render(playlist=render_playlist_md(chunk))
+        for i, chunk in enumerate(chunks, 1)
+    ]
+    print(f"Generating {len(chunks)} essay sections in parallel for '{journey_name}'.")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        sections = list(pool.map(lambda prompt: send_to_gemini(prompt, refresh=refresh), section_prompts))
+
+    merge_prompt = MERGE_INSTRUCTION.format(parts=len(sections), journey=journey_name) + "".join(
+        f"\n\n--- SECTION {i} ---\n\n{section}" for i, section in enumerate(sections, 1)
+    )
+    return send_to_gemini(merge_prompt, refresh=refresh, stream_to=stream_to, prefix=prefix)
+
+def send_to_gemini(prompt_text, refresh=False, stream_to=None, prefix=""):
+    # With stream_to, the response is written to that file as it arrives
+    if stream_to:
+        return stream_content(prompt_text, stream_to, prefix=prefix, refresh=refresh)
+    return generate_content(prompt_text, refresh=refresh)
 
 def save_markdown(journey_id, markdown):
     output_path = f"journeys/{journey_id}.md"
@@ -90,21 +169,31 @@ def save_markdown(journey_id, markdown):
         f.write(markdown)
     print(f"Journey markdown saved to {output_path}")
 
-def generate_dwh_journey(journey_id, granularity="Album", template_path="journeys/joruney_import_prompt.md"):
+def render_journey_essay(journey_id, granularity="Album", template_path="journeys/joruney_import_prompt.md", refresh=False, mode="auto", chunk_token_budget=CHUNK_TOKEN_BUDGET, stream_to=None):
+    """
+    Builds the prompt for a journey and returns Gemini's markdown, titled with the JourneyName.
+    `mode` is "single", "chunked", or "auto" (chunked once the playlist exceeds the token budget).
+    With `stream_to`, the final response is also streamed into that file as it is generated.
+    """
     steps = extract_journey_steps(journey_id, granularity)
     # Fetch JourneyName from DimJourney
-    db_path = os.path.join("output", "music_journeys.db")
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT JourneyName FROM DimJourney WHERE JourneyID = ?", (journey_id,))
-        result = cursor.fetchone()
-        journey_name = result[0] if result else journey_id
-    prompt = prepare_gemini_prompt(template_path, steps)
-    markdown = send_to_gemini(prompt)
+    with get_engine().connect() as connection:
+        result = connection.execute(JOURNEY_NAME_QUERY, {"jid": journey_id}).fetchone()
+    journey_name = result[0] if result else journey_id
+    if mode == "auto":
+        playlist_tokens = sum(estimate_tokens(format_step_md(step)) for step in steps)
+        mode = "chunked" if playlist_tokens > chunk_token_budget else "single"
+    title = f"# {journey_name}\n\n"
+    if mode == "chunked":
+        markdown = generate_chunked_essay(journey_name, steps, template_path, chunk_token_budget, refresh=refresh, stream_to=stream_to, prefix=title)
+    else:
+        prompt = prepare_gemini_prompt(template_path, steps)
+        markdown = send_to_gemini(prompt, refresh=refresh, stream_to=stream_to, prefix=title)
     # Prepend markdown with title
-    markdown = f"# {journey_name}\n\n" + markdown
-    save_markdown(journey_id, markdown)
-    # Sync markdown to DB and verify
+    return title + markdown
+
+def sync_journey_markdown(journey_id):
+    """Upserts journeys/<journey_id>.md into the DWH and reports whether both match."""
     from src.sync_journey_md_to_db import upsert_journey_to_db, verify_md_db_match, parse_journey_md
     md_path = f"journeys/{journey_id}.md"
     journey_title, steps = parse_journey_md(md_path)
@@ -114,3 +203,15 @@ def generate_dwh_journey(journey_id, granularity="Album", template_path="journey
         print(f"Journey markdown and database are in sync for {journey_id}.")
     else:
         print(f"WARNING: Journey markdown and database do not match for {journey_id}.")
+    return match
+
+def generate_dwh_journey(journey_id, granularity="Album", template_path="journeys/joruney_import_prompt.md", refresh=False, mode="auto", stream=False):
+    if stream:
+        # The markdown file is written incrementally and renamed into place on completion
+        render_journey_essay(journey_id, granularity, template_path, refresh=refresh, mode=mode, stream_to=f"journeys/{journey_id}.md")
+        print(f"Journey markdown saved to journeys/{journey_id}.md")
+    else:
+        markdown = render_journey_essay(journey_id, granularity, template_path, refresh=refresh, mode=mode)
+        save_markdown(journey_id, markdown)
+    # Sync markdown to DB and verify
+    sync_journey_markdown(journey_id)
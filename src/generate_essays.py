@@ -0,0 +1,157 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.change_log import (
+    advance_consumer,
+    filter_journey_ids,
+    record_journey_changes,
+    select_changed_journeys,
+)
+from src.db import get_engine
+from src.essay_queue import (
+    DEFAULT_MAX_ATTEMPTS,
+    find_stale_journeys,
+    journey_step_hashes,
+    record_essay_states,
+    run_with_retries,
+)
+from src.logger import setup_logger
+
+# --- Configuration ---
+JOURNEYS_DIR = "journeys"
+
+DEFAULT_WORKERS = 4
+
+# Change-log cursor of `generate-essays --dirty-only`
+ESSAYS_CONSUMER = "essays"
+
+
+def generate_essays(
+    max_workers=DEFAULT_WORKERS,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    journey_ids=None,
+    force=False,
+    refresh=False,
+    mode="auto",
+    changed_since=None,
+    dirty_only=False,
+):
+    """
+    Regenerates the Gemini essay of every journey whose steps changed since its last essay.
+
+    Essays are rendered concurrently on a worker pool with retry and backoff. Once
+    all workers finish, the markdown files are written together, synced back to the
+    DWH, and the new step hashes are recorded in a single statement. `mode` selects
+    single-prompt, chunked, or automatic generation for each essay.
+    `dirty_only` and `changed_since` restrict the scan to journeys in the change log.
+    """
+    from src.generate_dwh_journey import render_journey_essay
+    from src.sync_journey_md_to_db import sync_journey_files
+
+    logger = setup_logger()
+    engine = get_engine()
+
+    with engine.begin() as connection:
+        changed, high_seq = select_changed_journeys(
+            connection, ESSAYS_CONSUMER, changed_since, dirty_only
+        )
+        journey_ids = filter_journey_ids(journey_ids, changed)
+        if journey_ids is not None and not journey_ids:
+            logger.info("No journeys changed since the last essay run.")
+            if dirty_only and changed_since is None:
+                advance_consumer(connection, ESSAYS_CONSUMER, high_seq)
+            return
+        if force:
+            candidates = [
+                (journey_id, granularity, steps_hash)
+                for journey_id, (granularity, steps_hash) in journey_step_hashes(
+                    connection, journey_ids
+                ).items()
+            ]
+        else:
+            candidates = find_stale_journeys(connection, journey_ids)
+
+    if not candidates:
+        logger.info("All journey essays are up to date.")
+        if dirty_only and changed_since is None:
+            with engine.begin() as connection:
+                advance_consumer(connection, ESSAYS_CONSUMER, high_seq)
+        return
+    logger.info(
+        "Generating %s journey essays with %s workers.", len(candidates), max_workers
+    )
+
+    def render(journey_id, granularity):
+        return render_journey_essay(journey_id, granularity, refresh=refresh, mode=mode)
+
+    # --- Render essays concurrently ---
+    rendered = {}
+    failed = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(
+                run_with_retries,
+                render,
+                (journey_id, granularity or "Album"),
+                max_attempts,
+                logger,
+                f"Essay for {journey_id}",
+            ): (journey_id, steps_hash)
+            for journey_id, granularity, steps_hash in candidates
+        }
+        for future in as_completed(futures):
+            journey_id, steps_hash = futures[future]
+            markdown, attempts, error = future.result()
+            if error:
+                failed[journey_id] = error
+                logger.error(
+                    "Essay for %s failed after %s attempts: %s",
+                    journey_id,
+                    attempts,
+                    error,
+                )
+            else:
+                rendered[journey_id] = (markdown, steps_hash)
+
+    # --- Write markdown files ---
+    os.makedirs(JOURNEYS_DIR, exist_ok=True)
+    for journey_id, (markdown, _) in rendered.items():
+        with open(
+            os.path.join(JOURNEYS_DIR, f"{journey_id}.md"), "w", encoding="utf-8"
+        ) as f:
+            f.write(markdown)
+    logger.info("Wrote %s journey markdown files to %s/.", len(rendered), JOURNEYS_DIR)
+
+    # --- Sync to the DWH and record the step hashes ---
+    out_of_sync = []
+    try:
+        # One connection and one transaction for every rewritten file
+        matches = sync_journey_files(
+            [os.path.join(JOURNEYS_DIR, f"{journey_id}.md") for journey_id in rendered],
+            incremental=False,
+        )
+        out_of_sync = [journey_id for journey_id, match in matches.items() if not match]
+    except (sqlite3.Error, OSError, ValueError) as e:
+        out_of_sync = list(rendered)
+        logger.error("Failed to sync journey markdown to the database: %s", e)
+    with engine.begin() as connection:
+        if dirty_only and changed_since is None:
+            # Failed journeys are logged again so the next dirty-only run retries them
+            advance_consumer(connection, ESSAYS_CONSUMER, high_seq)
+            record_journey_changes(connection, failed, source="retry")
+        if rendered:
+            record_essay_states(
+                connection,
+                {
+                    journey_id: steps_hash
+                    for journey_id, (_, steps_hash) in rendered.items()
+                },
+            )
+
+    logger.info(
+        "Essay generation finished: %s generated, %s failed, %s not in sync with the database.",
+        len(rendered),
+        len(failed),
+        len(out_of_sync),
+    )
+    return {"generated": sorted(rendered), "failed": failed, "out_of_sync": out_of_sync}
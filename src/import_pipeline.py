@@ -0,0 +1,554 @@
+"""
+Asyncio import pipeline: page fetch -> album batch resolve -> row shaping -> batched DB writer.
+
+Stages are connected by bounded queues, so a slow stage applies backpressure to
+the ones before it while Spotify fetches keep overlapping with DB writes. The
+writer never holds a transaction across a fetch: each batch upserts its
+performers and albums in a short transaction of its own, and the journey's
+steps are swapped in by one final transaction once the last page is in.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+from sqlalchemy import bindparam, text
+from src.logger import log_sample
+
+# --- Configuration ---
+ALBUM_BATCH_SIZE = 20  # Spotify's limit for GET /albums
+WRITE_BATCH_SIZE = 200
+QUEUE_SIZE = 4
+STATS_INTERVAL_SECONDS = 5
+
+_DONE = object()
+
+PERFORMER_UPSERT = text(
+    """
+    INSERT INTO DimPerformer (PerformerName, InstrumentOrRole)
+    VALUES (:name, :role)
+    ON CONFLICT(PerformerName) DO UPDATE SET InstrumentOrRole=excluded.InstrumentOrRole
+"""
+)
+PERFORMER_IDS = text(
+    "SELECT PerformerName, PerformerID FROM DimPerformer WHERE PerformerName IN :names"
+).bindparams(bindparam("names", expanding=True))
+ALBUM_UPSERT = text(
+    """
+    INSERT INTO DimAlbum (AlbumTitle, PerformerID, SpotifyReleaseDate, RecordingLabel, SpotifyGenre, SpotifyURL, SpotifyTitle)
+    VALUES (:title, :pid, :reldate, :label, :spotify_genre, :spotify_url, :spotify_title)
+    ON CONFLICT(AlbumTitle, PerformerID) DO UPDATE SET
+        SpotifyReleaseDate=excluded.SpotifyReleaseDate,
+        RecordingLabel=excluded.RecordingLabel,
+        SpotifyGenre=excluded.SpotifyGenre,
+        SpotifyURL=excluded.SpotifyURL,
+        SpotifyTitle=excluded.SpotifyTitle
+"""
+)
+ALBUM_IDS = text(
+    "SELECT AlbumTitle, PerformerID, AlbumID FROM DimAlbum WHERE AlbumTitle IN :titles"
+).bindparams(bindparam("titles", expanding=True))
+ALBUM_STEP_INSERT = text(
+    """
+    INSERT INTO FactJourneyStep (JourneyID, StepOrder, AlbumID)
+    VALUES (:jid, :order, :aid)
+    ON CONFLICT(JourneyID, StepOrder) DO UPDATE SET AlbumID=-999
+"""
+)
+TRACK_STEP_INSERT = text(
+    """
+    INSERT INTO FactJourneyStep (JourneyID, StepOrder, RecordingID)
+    VALUES (:jid, :order, :rid)
+    ON CONFLICT(JourneyID, StepOrder) DO UPDATE SET RecordingID=excluded.RecordingID
+"""
+)
+
+
+# --- Row Shaping Helpers ---
+
+
+def performer_role(artist):
+    """Maps a Spotify artist 'type' onto the InstrumentOrRole vocabulary."""
+    role = artist.get("type", None)
+    if not role:
+        return None
+    if role.lower() == "artist":
+        return "Artist"
+    if role.lower() == "band":
+        return "Band"
+    return role.capitalize()
+
+
+def album_params(album, performer_id=None):
+    """Builds the DimAlbum upsert parameters for a full Spotify album object."""
+    release_date = album.get("release_date", None)
+    release_year = None
+    if release_date:
+        # release_date can be 'YYYY', 'YYYY-MM', or 'YYYY-MM-DD'
+        try:
+            release_year = int(release_date[:4])
+        except (ValueError, TypeError):
+            release_year = None
+    return {
+        "title": album["name"],
+        "pid": performer_id,
+        "reldate": release_year,
+        "label": album.get("label", None),
+        "spotify_genre": (
+            ",".join(album.get("genres", [])) if album.get("genres") else None
+        ),
+        "spotify_url": album.get("external_urls", {}).get("spotify"),
+        "spotify_title": album.get("name", None),
+    }
+
+
+# --- Stage Statistics ---
+
+
+class StageStats:
+    """Throughput and queue depth for a single pipeline stage."""
+
+    def __init__(self, name, inbox=None):
+        self.name = name
+        self.inbox = inbox
+        self.items = 0
+        self.dropped = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    def record(self, count=1):
+        self.items += count
+
+    def close(self):
+        self.finished = time.monotonic()
+
+    @property
+    def queue_depth(self):
+        return self.inbox.qsize() if self.inbox is not None else 0
+
+    @property
+    def throughput(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.items / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        dropped = f", {self.dropped} dropped" if self.dropped else ""
+        return f"{self.name}: {self.items} items{dropped}, {self.throughput:.1f}/s, queue depth {self.queue_depth}"
+
+
+# --- Stages ---
+
+
+async def _call(sp_call, rate_limiter, *args, **kwargs):
+    """Runs a blocking Spotify call on a worker thread after taking a rate-limit slot."""
+
+    def run():
+        if rate_limiter:
+            rate_limiter.acquire()
+        return sp_call(*args, **kwargs)
+
+    return await asyncio.to_thread(run)
+
+
+async def fetch_pages(sp, playlist_id, outbox, meta, stats, rate_limiter):
+    """Stage 1: fetches playlist metadata and every page of playlist items."""
+    playlist = await _call(sp.playlist, rate_limiter, playlist_id)
+    meta.set_result(
+        {
+            "name": playlist["name"],
+            "description": playlist.get("description", ""),
+            "url": playlist["external_urls"]["spotify"],
+        }
+    )
+    page = playlist["tracks"]
+    while page:
+        items = [item for item in page["items"] if item.get("track")]
+        stats.record(len(items))
+        await outbox.put(items)
+        page = await _call(sp.next, rate_limiter, page) if page.get("next") else None
+    await outbox.put(_DONE)
+    stats.close()
+
+
+def pair_tracks_with_albums(items, albums):
+    """
+    Pairs playlist items with their full album from `albums` (keyed by Spotify ID).
+    Returns (pairs, dropped): tracks whose album Spotify did not return have no
+    DimAlbum row to hang a step on, so they are left out and only counted.
+    """
+    pairs = [
+        (item["track"], albums[item["track"]["album"]["id"]])
+        for item in items
+        if item["track"]["album"]["id"] in albums
+    ]
+    return pairs, len(items) - len(pairs)
+
+
+def log_dropped_tracks(logger, dropped, journey_id):
+    if dropped:
+        logger.warning(
+            "Skipped %s tracks of journey %s: Spotify did not return their album.",
+            dropped,
+            journey_id,
+        )
+
+
+async def resolve_albums(sp, inbox, outbox, stats, rate_limiter):
+    """Stage 2: resolves full album objects in batches of ALBUM_BATCH_SIZE, once per album."""
+    albums = {}
+    while True:
+        items = await inbox.get()
+        if items is _DONE:
+            break
+        missing = []
+        for item in items:
+            album_id = item["track"]["album"]["id"]
+            if album_id not in albums and album_id not in missing:
+                missing.append(album_id)
+        for i in range(0, len(missing), ALBUM_BATCH_SIZE):
+            batch = missing[i : i + ALBUM_BATCH_SIZE]
+            result = await _call(sp.albums, rate_limiter, batch)
+            for album in result["albums"]:
+                if album:
+                    albums[album["id"]] = album
+        resolved, dropped = pair_tracks_with_albums(items, albums)
+        stats.record(len(resolved))
+        stats.dropped += dropped
+        await outbox.put(resolved)
+    await outbox.put(_DONE)
+    stats.close()
+
+
+def shape_step_rows(pairs, granularity, album_keys, step_order):
+    """
+    Turns (track, album) pairs into step rows numbered from `step_order`.
+    `album_keys` carries the albums already used, so Album journeys skip repeats.
+    """
+    rows = []
+    for track, album in pairs:
+        main_artist = track["artists"][0] if track["artists"] else {"name": "Unknown"}
+        if granularity == "Album":
+            # DimAlbum is unique on (AlbumTitle, PerformerID), and performers on name
+            album_key = (album["name"], main_artist["name"])
+            if album_key in album_keys:
+                continue
+            album_keys.add(album_key)
+        rows.append(
+            {
+                "order": step_order,
+                "performer_name": main_artist["name"],
+                "performer_role": performer_role(main_artist),
+                "album": album_params(album),
+                "recording_id": track["id"],
+            }
+        )
+        step_order += 1
+    return rows
+
+
+async def shape_rows(inbox, outbox, granularity, stats):
+    """Stage 3: turns (track, album) pairs into ordered step rows."""
+    album_keys = set()
+    step_order = 1
+    while True:
+        pairs = await inbox.get()
+        if pairs is _DONE:
+            break
+        rows = shape_step_rows(pairs, granularity, album_keys, step_order)
+        step_order += len(rows)
+        stats.record(len(rows))
+        await outbox.put(rows)
+    await outbox.put(_DONE)
+    stats.close()
+
+
+def resolve_step_batch(connection, rows, journey_id, granularity):
+    """
+    Upserts the performers and albums of one batch of shaped rows with executemany.
+    Returns (step insert parameters, expected steps) without writing the steps.
+    """
+    performers = {row["performer_name"]: row["performer_role"] for row in rows}
+    connection.execute(
+        PERFORMER_UPSERT,
+        [{"name": name, "role": role} for name, role in performers.items()],
+    )
+    performer_ids = dict(
+        connection.execute(PERFORMER_IDS, {"names": list(performers)}).fetchall()
+    )
+
+    albums = {}
+    for row in rows:
+        params = dict(row["album"], pid=performer_ids[row["performer_name"]])
+        albums[(params["title"], params["pid"])] = params
+    connection.execute(ALBUM_UPSERT, list(albums.values()))
+    album_ids = {
+        (title, pid): album_id
+        for title, pid, album_id in connection.execute(
+            ALBUM_IDS, {"titles": sorted({title for title, _ in albums})}
+        ).fetchall()
+    }
+
+    expected = []
+    step_params = []
+    for row in rows:
+        if granularity == "Album":
+            album_key = (row["album"]["title"], performer_ids[row["performer_name"]])
+            album_id = album_ids[album_key]
+            step_params.append(
+                {"jid": journey_id, "order": row["order"], "aid": album_id}
+            )
+            expected.append((row["order"], album_id))
+        else:
+            step_params.append(
+                {"jid": journey_id, "order": row["order"], "rid": row["recording_id"]}
+            )
+            expected.append((row["order"], row["recording_id"]))
+    return step_params, expected
+
+
+def insert_steps(connection, step_params, granularity):
+    """Inserts resolved journey steps in executemany batches of WRITE_BATCH_SIZE."""
+    statement = ALBUM_STEP_INSERT if granularity == "Album" else TRACK_STEP_INSERT
+    for i in range(0, len(step_params), WRITE_BATCH_SIZE):
+        connection.execute(statement, step_params[i : i + WRITE_BATCH_SIZE])
+
+
+def write_journey_header(connection, meta, journey_id, granularity, creator_name):
+    """Upserts DimJourney and DimPlaylist for a playlist and clears the journey's old steps."""
+    connection.execute(
+        text(
+            """
+            INSERT INTO DimJourney (JourneyID, JourneyName, JourneyDescription, CreatorName, Granularity)
+            VALUES (:jid, :jname, :jdesc, :creator, :gran)
+            ON CONFLICT(JourneyID) DO UPDATE SET JourneyName=excluded.JourneyName, JourneyDescription=excluded.JourneyDescription, CreatorName=excluded.CreatorName, Granularity=excluded.Granularity;
+        """
+        ),
+        {
+            "jid": journey_id,
+            "jname": meta["name"],
+            "jdesc": meta["description"],
+            "creator": creator_name,
+            "gran": granularity,
+        },
+    )
+    connection.execute(
+        text(
+            """
+            INSERT INTO DimPlaylist (JourneyID, ServiceID, SpotifyPlaylistURL, SpotifyPlaylistTitle, LastUpdatedUTC)
+            VALUES (:jid, 'Spotify', :url, :title, :updated)
+            ON CONFLICT(JourneyID, ServiceID) DO UPDATE SET SpotifyPlaylistURL=excluded.SpotifyPlaylistURL, SpotifyPlaylistTitle=excluded.SpotifyPlaylistTitle, LastUpdatedUTC=excluded.LastUpdatedUTC;
+        """
+        ),
+        {
+            "jid": journey_id,
+            "url": meta["url"],
+            "title": meta["name"],
+            "updated": datetime.now(UTC).isoformat(),
+        },
+    )
+    connection.execute(
+        text("DELETE FROM FactJourneyStep WHERE JourneyID = :jid"), {"jid": journey_id}
+    )
+
+
+def verify_steps(connection, journey_id, granularity, expected, logger):
+    """Compares the stored steps against the ones the pipeline produced."""
+    id_column = "AlbumID" if granularity == "Album" else "RecordingID"
+    db_steps = [
+        tuple(row)
+        for row in connection.execute(
+            text(
+                f"SELECT StepOrder, {id_column} FROM FactJourneyStep WHERE JourneyID = :jid ORDER BY StepOrder"
+            ),
+            {"jid": journey_id},
+        ).fetchall()
+    ]
+    logger.debug(
+        "Verification: DB steps=%s, Playlist %ss=%s",
+        len(db_steps),
+        granularity.lower(),
+        len(expected),
+    )
+    if db_steps == expected:
+        logger.debug(
+            "Import verification PASSED: %s steps match playlist order and count.",
+            granularity,
+        )
+        return True
+    logger.warning(
+        "Import verification FAILED: %s steps do not match playlist.", granularity
+    )
+    log_sample(
+        logger,
+        logging.WARNING,
+        [
+            f"Step {i + 1}: DB={db}, Playlist={exp}"
+            for i, (db, exp) in enumerate(zip(db_steps, expected))
+            if db != exp
+        ],
+    )
+    return False
+
+
+class JourneyWriter:
+    """
+    Writes one journey from shaped rows. Every WRITE_BATCH_SIZE rows, the batch's
+    performers and albums are committed and its steps are staged in memory;
+    `finish` writes the journey header and all steps in one transaction and
+    verifies them. Shared by the pipeline and the bulk importer.
+    """
+
+    def __init__(self, connection, journey_id, granularity, creator_name, logger):
+        self.connection = connection
+        self.journey_id = journey_id
+        self.granularity = granularity
+        self.creator_name = creator_name
+        self.logger = logger
+        self.pending = []
+        self.step_params = []
+        self.expected = []
+
+    def add(self, rows):
+        """Queues shaped rows; returns how many rows were staged by this call."""
+        self.pending.extend(rows)
+        return self.flush() if len(self.pending) >= WRITE_BATCH_SIZE else 0
+
+    def flush(self):
+        """Commits the dimension upserts of the queued rows and stages their steps."""
+        if not self.pending:
+            return 0
+        with self.connection.begin():
+            step_params, expected = resolve_step_batch(
+                self.connection, self.pending, self.journey_id, self.granularity
+            )
+        self.step_params.extend(step_params)
+        self.expected.extend(expected)
+        staged, self.pending = len(self.pending), []
+        return staged
+
+    def finish(self, meta):
+        """Replaces the journey and its steps in one transaction; returns the step count."""
+        self.flush()
+        with self.connection.begin():
+            write_journey_header(
+                self.connection,
+                meta,
+                self.journey_id,
+                self.granularity,
+                self.creator_name,
+            )
+            insert_steps(self.connection, self.step_params, self.granularity)
+            verify_steps(
+                self.connection,
+                self.journey_id,
+                self.granularity,
+                self.expected,
+                self.logger,
+            )
+        return len(self.expected)
+
+
+async def write_rows(
+    engine, inbox, meta, journey_id, granularity, creator_name, stats, logger
+):
+    """
+    Stage 4: the single DB writer. All DB work runs on one dedicated thread,
+    through a JourneyWriter, so the write lock is never held across a Spotify call.
+    """
+    loop = asyncio.get_running_loop()
+    db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="import-writer")
+
+    def on_db_thread(func, *args):
+        return loop.run_in_executor(db_thread, func, *args)
+
+    connection = await on_db_thread(engine.connect)
+    try:
+        writer = JourneyWriter(
+            connection, journey_id, granularity, creator_name, logger
+        )
+        while True:
+            rows = await inbox.get()
+            if rows is _DONE:
+                stats.record(await on_db_thread(writer.flush))
+                break
+            stats.record(await on_db_thread(writer.add, rows))
+        meta = await meta
+        step_count = await on_db_thread(writer.finish, meta)
+        logger.info("Imported %s steps for journey %s.", step_count, journey_id)
+        logger.info("All upserts committed successfully.")
+        stats.close()
+        return meta, step_count
+    finally:
+        await on_db_thread(connection.close)
+        db_thread.shutdown(wait=False)
+
+
+async def _log_stats(all_stats, logger):
+    while True:
+        await asyncio.sleep(STATS_INTERVAL_SECONDS)
+        logger.info("Pipeline: %s", " | ".join(s.summary() for s in all_stats))
+
+
+async def run_import_pipeline(
+    sp,
+    engine,
+    playlist_id,
+    journey_id,
+    granularity,
+    creator_name,
+    logger,
+    rate_limiter=None,
+):
+    """
+    Imports one playlist through the staged pipeline.
+    Returns (playlist metadata, number of steps, list of StageStats).
+    """
+    pages = asyncio.Queue(maxsize=QUEUE_SIZE)
+    pairs = asyncio.Queue(maxsize=QUEUE_SIZE)
+    rows = asyncio.Queue(maxsize=QUEUE_SIZE)
+    meta = asyncio.get_running_loop().create_future()
+
+    fetch_stats = StageStats("fetch")
+    resolve_stats = StageStats("resolve", pages)
+    shape_stats = StageStats("shape", pairs)
+    write_stats = StageStats("write", rows)
+    all_stats = [fetch_stats, resolve_stats, shape_stats, write_stats]
+
+    tasks = [
+        asyncio.ensure_future(
+            fetch_pages(sp, playlist_id, pages, meta, fetch_stats, rate_limiter)
+        ),
+        asyncio.ensure_future(
+            resolve_albums(sp, pages, pairs, resolve_stats, rate_limiter)
+        ),
+        asyncio.ensure_future(shape_rows(pairs, rows, granularity, shape_stats)),
+        asyncio.ensure_future(
+            write_rows(
+                engine,
+                rows,
+                meta,
+                journey_id,
+                granularity,
+                creator_name,
+                write_stats,
+                logger,
+            )
+        ),
+    ]
+    monitor = asyncio.ensure_future(_log_stats(all_stats, logger))
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        failed = [task for task in done if task.exception()]
+        if failed:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise failed[0].exception()
+    finally:
+        monitor.cancel()
+
+    playlist_meta, step_count = tasks[-1].result()
+    log_dropped_tracks(logger, resolve_stats.dropped, journey_id)
+    logger.info("Pipeline finished: %s", " | ".join(s.summary() for s in all_stats))
+    return playlist_meta, step_count, all_stats
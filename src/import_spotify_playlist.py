@@ -1,390 +1,397 @@
 import os
+import sys
+import asyncio
+import queue
+import threading
+import time
 from dotenv import load_dotenv
-import logging
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from sqlalchemy import create_engine, text
-from datetime import datetime, timezone
-from src.generate_dwh_journey import generate_dwh_journey
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from concurrent.futures import ThreadPoolExecutor
+from src.catalog_index import refresh_catalog_index
+from src.db import DB_PATH, get_engine
+from src.essay_queue import enqueue_essay_job
+from src.instrumentation import count, stage
+from src.import_pipeline import (
+    ALBUM_BATCH_SIZE,
+    JourneyWriter,
+    log_dropped_tracks,
+    pair_tracks_with_albums,
+    run_import_pipeline,
+    shape_step_rows,
+)
+from src.logger import ProgressLog, setup_logger
+from src.spotify_client import (
+    PLAYLIST_SCOPE,
+    SPOTIFY_ERRORS,
+    get_spotify_client,
+    log_call_metrics,
+)
 
 load_dotenv()
 
 # --- Configuration ---
-OUTPUT_DIR = "output"
-DB_NAME = "music_journeys.db"
-DB_PATH = os.path.join(OUTPUT_DIR, DB_NAME)
+# Bulk import defaults
+DEFAULT_FETCH_WORKERS = 4
+DEFAULT_REQUESTS_PER_SECOND = 8.0
+DEFAULT_QUEUE_SIZE = 8
+GRANULARITIES = ("Track", "Album")
 
-# --- Main Import Function ---
 
+class RateLimiter:
+    """A thread-safe token bucket shared by every fetch worker."""
 
-def import_spotify_playlist(playlist_url, journey_id=None, granularity="Track"):
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
 
-    logger = logging.getLogger("import_spotify_playlist")
-    logger.setLevel(logging.INFO)
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    # Console handler
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.INFO)
-    ch.setFormatter(formatter)
-    # File handler
-    fh = logging.FileHandler("output/import_spotify_playlist.log", mode="a")
-    fh.setLevel(logging.INFO)
-    fh.setFormatter(formatter)
-    # Avoid duplicate handlers
-    if not logger.hasHandlers():
-        logger.addHandler(ch)
-        logger.addHandler(fh)
-    else:
-        logger.handlers.clear()
-        logger.addHandler(ch)
-        logger.addHandler(fh)
-    logger.info(f"Starting import for playlist: {playlist_url}")
-    logger.info(f"Using database file: {os.path.abspath(DB_PATH)}")
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_for = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+def get_import_logger():
+    """Returns the import logger (a child of the shared, queue-based project logger)."""
+    return setup_logger("import")
+
+
+def playlist_id_from_url(playlist_url):
+    """Extracts the Spotify playlist ID from a URL, URI or bare ID."""
+    return playlist_url.split("/")[-1].split(":")[-1].split("?")[0]
+
+
+# --- Spotify Fetch ---
+
+
+def fetch_playlist(sp, playlist_url, rate_limiter=None):
+    """
+    Fetches a playlist, following its pages, and the full album object of every
+    track on it. Albums are requested in batches, once per distinct album.
+    """
+
+    def call(sp_call, *args):
+        if rate_limiter:
+            rate_limiter.acquire()
+        return sp_call(*args)
+
+    playlist = call(sp.playlist, playlist_id_from_url(playlist_url))
+    tracks = []
+    page = playlist["tracks"]
+    while page:
+        tracks.extend(item for item in page["items"] if item.get("track"))
+        page = call(sp.next, page) if page.get("next") else None
+
+    album_ids = list(dict.fromkeys(item["track"]["album"]["id"] for item in tracks))
+    albums = {}
+    for i in range(0, len(album_ids), ALBUM_BATCH_SIZE):
+        for album in call(sp.albums, album_ids[i : i + ALBUM_BATCH_SIZE])["albums"]:
+            if album:
+                albums[album["id"]] = album
+
+    return {
+        "name": playlist["name"],
+        "description": playlist.get("description", ""),
+        "url": playlist["external_urls"]["spotify"],
+        "tracks": tracks,
+        "albums": albums,
+    }
+
+
+# --- Database Writes ---
+
+
+def write_playlist_journey(
+    connection, snapshot, journey_id, granularity, creator_name, logger
+):
+    """
+    Writes a fetched playlist snapshot as a journey through the pipeline's
+    JourneyWriter and verifies the stored steps. Makes no network calls.
+    """
+    pairs, dropped = pair_tracks_with_albums(snapshot["tracks"], snapshot["albums"])
+    log_dropped_tracks(logger, dropped, journey_id)
+    if dropped:
+        count("import.resolve.dropped", dropped)
+    writer = JourneyWriter(connection, journey_id, granularity, creator_name, logger)
+    writer.add(shape_step_rows(pairs, granularity, set(), 1))
+    step_count = writer.finish(snapshot)
+    logger.debug(
+        "Journey '%s' (%s) imported with granularity '%s', creator '%s' and %s steps.",
+        snapshot["name"],
+        journey_id,
+        granularity,
+        creator_name,
+        step_count,
+    )
+    return step_count
+
+
+def queue_essay(connection, journey_id, granularity, logger):
+    """Queues the Gemini essay for a committed journey in a short transaction of its own."""
+    try:
+        with connection.begin():
+            job_id = enqueue_essay_job(connection, journey_id, granularity)
+        logger.info(
+            "Queued Gemini essay job %s for %s. Run `python main.py essays` to generate it.",
+            job_id,
+            journey_id,
+        )
+    except SQLAlchemyError as e:
+        logger.error("Failed to queue Gemini journey essay: %s", e)
 
-    # Authenticate with Spotify
+
+def commit_journey(connection, snapshot, journey_id, granularity, creator_name, logger):
+    """
+    Writes one snapshot (its steps swapped in by one transaction), then queues its essay job.
+    Returns True when the journey was committed.
+    """
+    try:
+        write_playlist_journey(
+            connection, snapshot, journey_id, granularity, creator_name, logger
+        )
+        logger.debug("All upserts committed successfully.")
+    except SQLAlchemyError as e:
+        logger.error("Transaction rolled back due to error: %s", e)
+        return False
+
+    queue_essay(connection, journey_id, granularity, logger)
+    return True
+
+
+def authenticate(logger):
+    """Returns an authenticated Spotify client and the creator name, or (None, None)."""
     try:
-        scope = "playlist-modify-public playlist-modify-private"
-        sp = spotipy.Spotify(auth_manager=SpotifyOAuth(scope=scope))
+        sp = get_spotify_client(PLAYLIST_SCOPE)
         user = sp.current_user()
         user_id = user["id"]
         creator_name = user.get("display_name", user_id)
-        logger.info(f"Authenticated with Spotify for user {creator_name}.")
-    except Exception as e:
-        logger.error(f"Could not authenticate with Spotify. Details: {e}")
+        logger.info("Authenticated with Spotify for user %s.", creator_name)
+        return sp, creator_name
+    except SPOTIFY_ERRORS as e:
+        logger.error("Could not authenticate with Spotify. Details: %s", e)
+        return None, None
+
+
+# --- Main Import Function ---
+
+
+def import_spotify_playlist(playlist_url, journey_id=None, granularity="Track"):
+    logger = get_import_logger()
+    logger.info("Starting import for playlist: %s", playlist_url)
+    logger.info("Using database file: %s", os.path.abspath(DB_PATH))
+
+    sp, creator_name = authenticate(logger)
+    if not sp:
         return
 
-    # Connect to database
-    engine = create_engine(f"sqlite:///{DB_PATH}")
-    with engine.connect() as connection:
-        trans = connection.begin()
-        try:
-            # Fetch playlist details
-            try:
-                playlist = sp.playlist(playlist_url.split("/")[-1].split("?")[0])
-                playlist_name = playlist["name"]
-                playlist_desc = playlist.get("description", "")
-                playlist_url_actual = playlist["external_urls"]["spotify"]
-                tracks = playlist["tracks"]["items"]
-                logger.info(
-                    f"Fetched playlist '{playlist_name}' with {len(tracks)} tracks."
+    if not journey_id:
+        journey_id = playlist_id_from_url(playlist_url)
+
+    # Fetch pages and albums while earlier batches are already being written
+    engine = get_engine()
+    try:
+        with stage("import.pipeline"):
+            playlist_meta, step_count, all_stats = asyncio.run(
+                run_import_pipeline(
+                    sp,
+                    engine,
+                    playlist_id_from_url(playlist_url),
+                    journey_id,
+                    granularity,
+                    creator_name,
+                    logger,
                 )
-            except Exception as e:
-                logger.error(f"Failed to fetch playlist details: {e}")
-                trans.rollback()
-                return
-
-            # Insert or update journey
-            if not journey_id:
-                journey_id = playlist_url.split("/")[-1].split("?")[0]
-            journey_query = text(
-                """
-                INSERT INTO DimJourney (JourneyID, JourneyName, JourneyDescription, CreatorName, Granularity)
-                VALUES (:jid, :jname, :jdesc, :creator, :gran)
-                ON CONFLICT(JourneyID) DO UPDATE SET JourneyName=excluded.JourneyName, JourneyDescription=excluded.JourneyDescription, CreatorName=excluded.CreatorName, Granularity=excluded.Granularity;
-            """
-            )
-            connection.execute(
-                journey_query,
-                {
-                    "jid": journey_id,
-                    "jname": playlist_name,
-                    "jdesc": playlist_desc,
-                    "creator": creator_name,
-                    "gran": granularity,
-                },
-            )
-            logger.info(
-                f"Journey '{playlist_name}' ({journey_id}) imported with granularity '{granularity}' and creator '{creator_name}'."
             )
+        for stats in all_stats:
+            count(f"import.{stats.name}.items", stats.items)
+            if stats.dropped:
+                count(f"import.{stats.name}.dropped", stats.dropped)
+        logger.info(
+            "Imported playlist '%s' with %s steps.", playlist_meta["name"], step_count
+        )
+    except (*SPOTIFY_ERRORS, SQLAlchemyError) as e:
+        logger.error(
+            "Import of %s failed; the journey was left unchanged: %s", playlist_url, e
+        )
+        return
+
+    with stage("import.catalog_index"):
+        refresh_catalog_index(engine, logger)
+    with engine.connect() as connection:
+        queue_essay(connection, journey_id, granularity, logger)
+    log_call_metrics(logger)
+
+
+# --- Bulk Import ---
 
-            # Insert or update DimPlaylist
-            playlist_query = text(
-                """
-                INSERT INTO DimPlaylist (JourneyID, ServiceID, SpotifyPlaylistURL, SpotifyPlaylistTitle, LastUpdatedUTC)
-                VALUES (:jid, 'Spotify', :url, :title, :updated)
-                ON CONFLICT(JourneyID, ServiceID) DO UPDATE SET SpotifyPlaylistURL=excluded.SpotifyPlaylistURL, SpotifyPlaylistTitle=excluded.SpotifyPlaylistTitle, LastUpdatedUTC=excluded.LastUpdatedUTC;
-            """
+
+def parse_import_entry(line):
+    """
+    Parses one import line into an entry dict.
+    A line holds a playlist URL (optionally followed by a JourneyID) or just the
+    JourneyID of a journey already linked to a Spotify playlist, and may end with
+    a granularity (Track or Album) that overrides the command's default.
+    """
+    parts = line.split()
+    granularity = None
+    if len(parts) > 1 and parts[-1].capitalize() in GRANULARITIES:
+        granularity = parts.pop().capitalize()
+    if "spotify" in parts[0]:
+        url = parts[0]
+        journey_id = parts[1] if len(parts) > 1 else playlist_id_from_url(url)
+    else:
+        url = None
+        journey_id = parts[0]
+    return {"url": url, "journey_id": journey_id, "granularity": granularity}
+
+
+def read_import_entries(source):
+    """
+    Reads import entries from a file path, or from stdin when `source` is "-".
+    Each non-empty line is parsed by `parse_import_entry`; lines starting with
+    '#' are ignored.
+    """
+    if source == "-":
+        return _parse_import_lines(sys.stdin)
+    with open(source, encoding="utf-8") as f:
+        return _parse_import_lines(f)
+
+
+def _parse_import_lines(lines):
+    entries = []
+    for raw_line in lines:
+        line = raw_line.strip()
+        if line and not line.startswith("#"):
+            entries.append(parse_import_entry(line))
+    return entries
+
+
+def resolve_entry_urls(connection, entries, logger):
+    """Fills in the stored playlist URL for entries given only as JourneyIDs."""
+    stored = dict(
+        connection.execute(
+            text(
+                "SELECT JourneyID, SpotifyPlaylistURL FROM DimPlaylist WHERE ServiceID = 'Spotify'"
             )
-            connection.execute(
-                playlist_query,
-                {
-                    "jid": journey_id,
-                    "url": playlist_url_actual,
-                    "title": playlist_name,
-                    "updated": datetime.now(timezone.utc).isoformat(),
-                },
+        ).fetchall()
+    )
+    resolved = []
+    for entry in entries:
+        if entry["url"]:
+            resolved.append(entry)
+            continue
+        url = stored.get(entry["journey_id"])
+        if not url:
+            logger.error(
+                "No Spotify playlist is linked to journey '%s'. Skipping.",
+                entry["journey_id"],
             )
-            logger.info(f"DimPlaylist updated for journey {journey_id}.")
-            # Remove existing steps for this journey
-            del_steps_query = text("DELETE FROM FactJourneyStep WHERE JourneyID = :jid")
-            connection.execute(del_steps_query, {"jid": journey_id})
-            logger.info(f"Removed existing steps for journey {journey_id}.")
-
-            # Helper: get next integer ID for a table
-            def get_next_id(table, id_col):
-                result = connection.execute(text(f"SELECT MAX({id_col}) FROM {table}"))
-                max_id = result.scalar()
-                return (max_id or 0) + 1
-
-            # Helper: get or insert performer
-            def get_or_create_performer(artist):
-                name = artist["name"]
-                role = artist.get("type", None)
-                if role:
-                    if role.lower() == "artist":
-                        role_val = "Artist"
-                    elif role.lower() == "band":
-                        role_val = "Band"
-                    else:
-                        role_val = role.capitalize()
-                else:
-                    role_val = None
-                upsert = text(
-                    """
-                    INSERT INTO DimPerformer (PerformerName, InstrumentOrRole)
-                    VALUES (:name, :role)
-                    ON CONFLICT(PerformerName) DO UPDATE SET InstrumentOrRole=excluded.InstrumentOrRole
-                """
-                )
-                connection.execute(upsert, {"name": name, "role": role_val})
-                logger.info(f"Upserted performer: {name} with role {role_val}")
-                sel = text(
-                    "SELECT PerformerID FROM DimPerformer WHERE PerformerName = :name"
-                )
-                res = connection.execute(sel, {"name": name}).fetchone()
-                logger.info(
-                    f"Upserted performer: {name} (ID: {res[0]}) with role {role_val}"
-                )
-                return res[0]
-
-            # Helper: get or insert album
-            def get_or_create_album(album, performer_id):
-                title = album["name"]
-                spotify_url = (
-                    album["external_urls"]["spotify"]
-                    if "external_urls" in album and "spotify" in album["external_urls"]
-                    else None
-                )
-                spotify_title = album.get("name", None)
-                release_date = album.get("release_date", None)
-                release_year = None
-                if release_date:
-                    # release_date can be 'YYYY', 'YYYY-MM', or 'YYYY-MM-DD'
-                    try:
-                        release_year = int(release_date[:4])
-                    except (ValueError, TypeError):
-                        release_year = None
-                label = album.get("label", None)
-                spotify_genre = (
-                    ",".join(album.get("genres", [])) if album.get("genres") else None
-                )
-                upsert = text(
-                    """
-                    INSERT INTO DimAlbum (AlbumTitle, PerformerID, SpotifyReleaseDate, RecordingLabel, SpotifyGenre, SpotifyURL, SpotifyTitle)
-                    VALUES (:title, :pid, :reldate, :label, :spotify_genre, :spotify_url, :spotify_title)
-                    ON CONFLICT(AlbumTitle, PerformerID) DO UPDATE SET
-                        SpotifyReleaseDate=excluded.SpotifyReleaseDate,
-                        RecordingLabel=excluded.RecordingLabel,
-                        SpotifyGenre=excluded.SpotifyGenre,
-                        SpotifyURL=excluded.SpotifyURL,
-                        SpotifyTitle=excluded.SpotifyTitle
-                    """
-                )
-                album_params = {
-                    "title": title,
-                    "pid": performer_id,
-                    "reldate": release_year,
-                    "label": label,
-                    "spotify_genre": spotify_genre,
-                    "spotify_url": spotify_url,
-                    "spotify_title": spotify_title,
-                }
-                connection.execute(upsert, album_params)
-                logger.info(f"Upserted album: {title} performer {performer_id}")
-                sel = text(
-                    "SELECT AlbumID FROM DimAlbum WHERE AlbumTitle = :title AND PerformerID = :pid"
-                )
-                res = connection.execute(
-                    sel, {"title": title, "pid": performer_id}
-                ).fetchone()
-                logger.info(
-                    f"Upserted album: {title} (ID: {res[0]}) performer {performer_id}"
-                )
-                return res[0]
-
-            # Track unique albums for album-level journeys
-            album_keys = set()
-            step_order = 1
-            # Removed unused max_id assignment
-            for item in tracks:
-                track = item["track"]
-                logger.info(
-                    f"Processing track: {track.get('name', 'Unknown')} | Artists: {[a['name'] for a in track.get('artists', [])]}"
-                )
-                main_artist = (
-                    track["artists"][0] if track["artists"] else {"name": "Unknown"}
-                )
-                logger.info(f"Main artist: {main_artist['name']}")
-                performer_id = get_or_create_performer(main_artist)
-                logger.info(f"Performer ID: {performer_id}")
-                album_id_spotify = track["album"]["id"]
-                album_api = sp.album(album_id_spotify)
-                logger.info(
-                    f"Album API: {album_api.get('name', 'Unknown')} | Spotify ID: {album_id_spotify}"
-                )
-                album_id = get_or_create_album(album_api, performer_id)
-                logger.info(f"Album ID: {album_id}")
-                if granularity == "Album":
-                    album_key = (album_id, performer_id)
-                    if album_key in album_keys:
-                        logger.info(
-                            f"Skipping duplicate album step: {album_api['name']} (ID: {album_id}) performer {performer_id}"
-                        )
-                        continue
-                    album_keys.add(album_key)
-                    step_params = {
-                        "jid": journey_id,
-                        "order": step_order,
-                        "aid": album_id,
-                    }
-                    logger.info(f"Attempting to upsert album step: {step_params}")
-                    step_query = text(
-                        """
-                        INSERT INTO FactJourneyStep (JourneyID, StepOrder, AlbumID)
-                        VALUES (:jid, :order, :aid)
-                        ON CONFLICT(JourneyID, StepOrder) DO UPDATE SET AlbumID=-999
-                    """
-                    )
-                    try:
-                        result = connection.execute(step_query, step_params)
-                        if getattr(result, "rowcount", None) == 0:
-                            logger.info(
-                                f"CONFLICT: Dummy record inserted for params={step_params}"
-                            )
-                        else:
-                            logger.info(
-                                f"Upserted album step: params={step_params}, rowcount={getattr(result, 'rowcount', 'N/A')}"
-                            )
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to upsert album step: params={step_params}, error={e}"
-                        )
-                else:
-                    step_params = {
-                        "jid": journey_id,
-                        "order": step_order,
-                        "rid": track["id"],
-                    }
-                    logger.info(f"Attempting to upsert track step: {step_params}")
-                    step_query = text(
-                        """
-                        INSERT INTO FactJourneyStep (JourneyID, StepOrder, RecordingID)
-                        VALUES (:jid, :order, :rid)
-                        ON CONFLICT(JourneyID, StepOrder) DO UPDATE SET RecordingID=excluded.RecordingID
-                    """
-                    )
-                    try:
-                        result = connection.execute(step_query, step_params)
-                        logger.info(
-                            f"Upserted track step: params={step_params}, rowcount={getattr(result, 'rowcount', 'N/A')}"
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to upsert track step: params={step_params}, error={e}"
-                        )
-                step_order += 1
-            logger.info(f"Imported {step_order-1} steps for journey {journey_id}.")
-            # --- Import Verification Step ---
-            logger.info("Starting import verification...")
-            # Fetch journey steps from DB
-            if granularity == "Album":
-                db_steps = connection.execute(
-                    text(
-                        "SELECT StepOrder, AlbumID FROM FactJourneyStep WHERE JourneyID = :jid ORDER BY StepOrder"
-                    ),
-                    {"jid": journey_id},
-                ).fetchall()
-                # Build expected steps from playlist
-                expected_steps = []
-                album_keys = set()
-                order = 1
-                for item in tracks:
-                    track = item["track"]
-                    main_artist = (
-                        track["artists"][0] if track["artists"] else {"name": "Unknown"}
-                    )
-                    performer_id = get_or_create_performer(main_artist)
-                    album_id_spotify = track["album"]["id"]
-                    album_api = sp.album(album_id_spotify)
-                    album_id = get_or_create_album(album_api, performer_id)
-                    album_key = (album_id, performer_id)
-                    if album_key in album_keys:
-                        continue
-                    album_keys.add(album_key)
-                    expected_steps.append((order, album_id))
-                    order += 1
-                # Compare
-                match_count = len(db_steps) == len(expected_steps)
-                match_order = all(
-                    db == exp for db, exp in zip(db_steps, expected_steps)
-                )
-                logger.info(
-                    f"Verification: DB steps={len(db_steps)}, Playlist albums={len(expected_steps)}"
-                )
-                if match_count and match_order:
-                    logger.info(
-                        "Import verification PASSED: Album steps match playlist order and count."
-                    )
-                else:
-                    logger.warning(
-                        "Import verification FAILED: Album steps do not match playlist."
-                    )
-                    # Log mismatches
-                    for i, (db, exp) in enumerate(zip(db_steps, expected_steps)):
-                        if db != exp:
-                            logger.warning(f"Step {i+1}: DB={db}, Playlist={exp}")
-            else:
-                db_steps = connection.execute(
-                    text(
-                        "SELECT StepOrder, RecordingID FROM FactJourneyStep WHERE JourneyID = :jid ORDER BY StepOrder"
-                    ),
-                    {"jid": journey_id},
-                ).fetchall()
-                expected_steps = []
-                order = 1
-                for item in tracks:
-                    track = item["track"]
-                    expected_steps.append((order, track["id"]))
-                    order += 1
-                match_count = len(db_steps) == len(expected_steps)
-                match_order = all(
-                    db == exp for db, exp in zip(db_steps, expected_steps)
-                )
-                logger.info(
-                    f"Verification: DB steps={len(db_steps)}, Playlist tracks={len(expected_steps)}"
+            continue
+        resolved.append(dict(entry, url=url))
+    return resolved
+
+
+def import_spotify_playlists(
+    source="-",
+    granularity="Track",
+    workers=DEFAULT_FETCH_WORKERS,
+    requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+    queue_size=DEFAULT_QUEUE_SIZE,
+):
+    """
+    Imports many playlists in one process.
+    `granularity` applies to every entry that does not name its own.
+    Playlists are fetched concurrently under a shared rate limiter and handed to
+    a single DB writer through a bounded queue, so fetching never outruns the
+    writer by more than `queue_size` playlists.
+    """
+    logger = get_import_logger()
+    entries = read_import_entries(source)
+    if not entries:
+        logger.warning("No playlists to import.")
+        return
+
+    sp, creator_name = authenticate(logger)
+    if not sp:
+        return
+
+    engine = get_engine()
+    with engine.connect() as connection:
+        entries = resolve_entry_urls(connection, entries, logger)
+    logger.info(
+        "Importing %s playlists with %s fetch workers at up to %s requests/s.",
+        len(entries),
+        workers,
+        requests_per_second,
+    )
+
+    limiter = RateLimiter(requests_per_second)
+    results = queue.Queue(maxsize=queue_size)
+
+    def fetch_into_queue(index):
+        snapshot, error = None, None
+        try:
+            snapshot = fetch_playlist(sp, entries[index]["url"], limiter)
+        except SPOTIFY_ERRORS as e:
+            error = e
+        finally:
+            # Always answer, so the writer never waits on a fetch that crashed
+            results.put((index, snapshot, error))
+
+    imported = 0
+    failed = 0
+    progress = ProgressLog(logger, "Bulk import", total=len(entries))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fetches = [pool.submit(fetch_into_queue, i) for i in range(len(entries))]
+
+        # The calling thread is the only DB writer
+        with engine.connect() as connection:
+            for _ in range(len(entries)):
+                index, snapshot, error = results.get()
+                entry = entries[index]
+                if snapshot is None and error is None:
+                    # Re-raises the unexpected error of that fetch
+                    fetches[index].result()
+                if error:
+                    failed += 1
+                    progress.update("failed")
+                    logger.error("Failed to fetch playlist %s: %s", entry["url"], error)
+                    continue
+                logger.debug(
+                    "Fetched playlist '%s' with %s tracks.",
+                    snapshot["name"],
+                    len(snapshot["tracks"]),
                 )
-                if match_count and match_order:
-                    logger.info(
-                        "Import verification PASSED: Track steps match playlist order and count."
+                with stage("import.write"):
+                    committed = commit_journey(
+                        connection,
+                        snapshot,
+                        entry["journey_id"],
+                        entry["granularity"] or granularity,
+                        creator_name,
+                        logger,
                     )
+                if committed:
+                    imported += 1
+                    progress.update("imported")
                 else:
-                    logger.warning(
-                        "Import verification FAILED: Track steps do not match."
-                    )
-                    for i, (db, exp) in enumerate(zip(db_steps, expected_steps)):
-                        if db != exp:
-                            logger.warning(f"Step {i+1}: DB={db}, Playlist={exp}")
-            # Call Gemini essay generation
-            try:
-                generate_dwh_journey(journey_id, granularity)
-                logger.info(f"Generated Gemini journey essay for {journey_id}.")
-            except Exception as e:
-                logger.error(f"Failed to generate Gemini journey essay: {e}")
-            trans.commit()
-            logger.info("All upserts committed successfully.")
-        except Exception as e:
-            trans.rollback()
-            logger.error(f"Transaction rolled back due to error: {e}")
+                    failed += 1
+                    progress.update("failed")
+    progress.finish()
+
+    if imported:
+        with stage("import.catalog_index"):
+            refresh_catalog_index(engine, logger)
+    count("import.playlists_imported", imported)
+    count("import.playlists_failed", failed)
+    logger.info("Bulk import finished: %s imported, %s failed.", imported, failed)
+    log_call_metrics(logger)
 
 
 # --- CLI Entrypoint ---
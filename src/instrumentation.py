@@ -0,0 +1,297 @@
+"""
+Run instrumentation for the CLI.
+
+`stage(name)` times a block and accumulates its wall time per stage, and
+`count(name)` bumps a named counter (rows loaded, cache hits, ...). Database
+statements are timed by hooks on the shared engines (`src/db.py`), log
+records by the handlers from `src/logger.py`, and Spotify calls are taken from
+the shared client's per-endpoint metrics. `run_command` wraps one CLI command:
+it can profile it with cProfile, and writes the totals as a JSON run summary
+and as a Prometheus textfile (for node_exporter's textfile collector).
+"""
+
+import contextlib
+import io
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from datetime import UTC, datetime
+
+# --- Configuration ---
+METRIC_PREFIX = "music_journey"
+PROFILE_TOP_FUNCTIONS = 25
+
+
+class RunMetrics:
+    """Accumulated wall time per stage and named counters for the current run."""
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def add_time(self, name, elapsed_ms):
+        with self.lock:
+            stats = self.stages.setdefault(
+                name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            stats["calls"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self.lock:
+            return (
+                {name: dict(stats) for name, stats in self.stages.items()},
+                dict(self.counters),
+            )
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.counters.clear()
+
+
+metrics = RunMetrics()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Times the block as one call of stage `name`, also when it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_time(name, (time.perf_counter() - started) * 1000)
+
+
+def count(name, value=1):
+    """Adds `value` to counter `name`."""
+    metrics.count(name, value)
+
+
+class TimedHandlerMixin:
+    """Counts log records and times their formatting and output as stage "logging"."""
+
+    def emit(self, record):
+        metrics.count("log.records")
+        with stage("logging"):
+            super().emit(record)
+
+
+class TimedStreamHandler(TimedHandlerMixin, logging.StreamHandler):
+    pass
+
+
+class TimedRotatingFileHandler(TimedHandlerMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+def _spotify_calls():
+    # Only a run that loaded the Spotify client can have made calls
+    spotify_client = sys.modules.get("src.spotify_client")
+    if spotify_client is None:
+        return {}
+    return {
+        endpoint: {
+            "calls": stats["calls"],
+            "retries": stats["retries"],
+            "statuses": {str(status): n for status, n in stats["statuses"].items()},
+            "total_ms": round(stats["total_ms"], 3),
+            "max_ms": round(stats["max_ms"], 3),
+        }
+        for endpoint, stats in spotify_client.call_metrics().items()
+    }
+
+
+def run_summary(command, status, started_utc, elapsed_ms):
+    """Returns the JSON-ready summary of the run so far."""
+    stages, counters = metrics.snapshot()
+    return {
+        "command": command,
+        "status": status,
+        "started_utc": started_utc,
+        "elapsed_ms": round(elapsed_ms, 3),
+        "stages": {
+            name: {
+                "calls": stats["calls"],
+                "total_ms": round(stats["total_ms"], 3),
+                "max_ms": round(stats["max_ms"], 3),
+            }
+            for name, stats in sorted(stages.items())
+        },
+        "counters": dict(sorted(counters.items())),
+        "spotify_calls": _spotify_calls(),
+    }
+
+
+def write_run_summary(summary, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+def prometheus_text(summary):
+    """Renders a run summary in the Prometheus text exposition format."""
+    command = summary["command"]
+    lines = []
+
+    def metric(name, metric_type, help_text, samples):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+        for labels, value in samples:
+            shown = round(value, 6) if isinstance(value, float) else value
+            lines.append(f"{METRIC_PREFIX}_{name}{{{_labels(**labels)}}} {shown}")
+
+    metric(
+        "run_duration_seconds",
+        "gauge",
+        "Wall time of the last run.",
+        [({"command": command}, summary["elapsed_ms"] / 1000)],
+    )
+    metric(
+        "run_success",
+        "gauge",
+        "1 if the last run completed without an error.",
+        [({"command": command}, int(summary["status"] == "ok"))],
+    )
+    metric(
+        "run_timestamp_seconds",
+        "gauge",
+        "Unix time the last run finished.",
+        [({"command": command}, round(time.time(), 3))],
+    )
+    metric(
+        "stage_seconds",
+        "gauge",
+        "Wall time spent in each stage during the last run.",
+        [
+            ({"command": command, "stage": name}, stats["total_ms"] / 1000)
+            for name, stats in summary["stages"].items()
+        ],
+    )
+    metric(
+        "stage_calls",
+        "gauge",
+        "Times each stage ran during the last run.",
+        [
+            ({"command": command, "stage": name}, stats["calls"])
+            for name, stats in summary["stages"].items()
+        ],
+    )
+    metric(
+        "counter",
+        "gauge",
+        "Named counters (rows loaded, cache hits, statements, ...) of the last run.",
+        [
+            ({"command": command, "name": name}, value)
+            for name, value in summary["counters"].items()
+        ],
+    )
+    metric(
+        "spotify_calls",
+        "gauge",
+        "Spotify API calls by endpoint and final status during the last run.",
+        [
+            ({"command": command, "endpoint": endpoint, "status": status}, n)
+            for endpoint, stats in summary["spotify_calls"].items()
+            for status, n in stats["statuses"].items()
+        ],
+    )
+    metric(
+        "spotify_retries",
+        "gauge",
+        "Spotify API retries by endpoint during the last run.",
+        [
+            ({"command": command, "endpoint": endpoint}, stats["retries"])
+            for endpoint, stats in summary["spotify_calls"].items()
+        ],
+    )
+    metric(
+        "spotify_call_seconds",
+        "gauge",
+        "Time spent in Spotify API calls by endpoint during the last run.",
+        [
+            ({"command": command, "endpoint": endpoint}, stats["total_ms"] / 1000)
+            for endpoint, stats in summary["spotify_calls"].items()
+        ],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(summary, path):
+    """Writes the textfile atomically so the collector never reads half a file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial_path = f"{path}.{os.getpid()}.tmp"
+    with open(partial_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(summary))
+    os.replace(partial_path, path)
+
+
+def _print_profile(profiler, path):
+    import pstats
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    profiler.dump_stats(path)
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+    print(report.getvalue())
+    print(f"Profile written to {path} (open it with `python -m pstats {path}`).")
+
+
+def run_command(
+    command, func, profile_path=None, summary_path=None, textfile_path=None
+):
+    """
+    Runs `func` as CLI command `command` under stage "command", optionally under
+    cProfile, then writes the profile, the JSON run summary and the Prometheus
+    textfile for the paths given. Errors are recorded and re-raised.
+    """
+    started_utc = datetime.now(UTC).isoformat()
+    started = time.perf_counter()
+    profiler = None
+    if profile_path:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    status = "error"
+    try:
+        if profiler:
+            profiler.enable()
+        with stage("command"):
+            result = func()
+        status = "ok"
+        return result
+    except SystemExit as e:
+        status = "ok" if not e.code else "error"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+            _print_profile(profiler, profile_path)
+        if summary_path or textfile_path:
+            summary = run_summary(
+                command, status, started_utc, (time.perf_counter() - started) * 1000
+            )
+            if summary_path:
+                write_run_summary(summary, summary_path)
+                print(f"Run summary written to {summary_path}")
+            if textfile_path:
+                write_prometheus_textfile(summary, textfile_path)
@@ -0,0 +1,178 @@
+"""
+JourneyStepWide: a materialized, denormalized row per journey step.
+
+The table joins FactJourneyStep with its album, recording, performers and
+movement once, so playlist sync and essay generation read a single table by
+(JourneyID, StepOrder). Journeys recorded in the change log since the last
+refresh are re-materialized before the next read.
+"""
+
+from sqlalchemy import bindparam, text
+from src.change_log import (
+    advance_consumer,
+    current_seq,
+    ensure_change_log,
+    pending_journeys,
+)
+
+# Resolved attributes of each step. Has* flags record which joins matched, so
+# readers keep the inner-join semantics of the queries they replace. A step has
+# one row even when its recording is bridged to several movements: it takes the
+# movement with the lowest MovementID, where the bridge join it replaces
+# repeated the step (and its track URI) once per movement.
+WIDE_SELECT = """
+    SELECT
+        fs.JourneyID,
+        fs.StepOrder,
+        fs.ActNumber,
+        fs.ActTitle,
+        fs.AlbumID,
+        fs.RecordingID,
+        da.AlbumTitle,
+        dpa.PerformerName,
+        da.RecordingLabel,
+        da.SpotifyReleaseDate,
+        da.SpotifyURL,
+        da.AlbumID IS NOT NULL AND dpa.PerformerID IS NOT NULL,
+        dr.SpotifyTitle,
+        dpr.PerformerName,
+        dra.RecordingLabel,
+        dra.SpotifyReleaseDate,
+        dr.SpotifyURL,
+        dr.RecordingID IS NOT NULL AND dra.AlbumID IS NOT NULL AND dpr.PerformerID IS NOT NULL,
+        mv.MovementTitle,
+        mv.MovementID IS NOT NULL
+    FROM FactJourneyStep fs
+    LEFT JOIN DimAlbum da ON fs.AlbumID = da.AlbumID
+    LEFT JOIN DimPerformer dpa ON da.PerformerID = dpa.PerformerID
+    LEFT JOIN DimRecording dr ON fs.RecordingID = dr.RecordingID
+    LEFT JOIN DimAlbum dra ON dr.AlbumID = dra.AlbumID
+    LEFT JOIN DimPerformer dpr ON dr.PerformerID = dpr.PerformerID
+    LEFT JOIN DimMovement mv ON mv.MovementID = (
+        SELECT bam.movement_id FROM BridgeAlbumMovement bam
+        JOIN DimMovement dm ON bam.movement_id = dm.MovementID
+        WHERE CAST(bam.recording_id AS INTEGER) = dr.RecordingID
+        ORDER BY dm.MovementID
+        LIMIT 1
+    )
+"""
+
+WIDE_COLUMNS = """
+    JourneyID, StepOrder, ActNumber, ActTitle, AlbumID, RecordingID,
+    AlbumTitle, AlbumPerformerName, AlbumLabel, AlbumReleaseDate, AlbumSpotifyURL, HasAlbum,
+    TrackTitle, TrackPerformerName, TrackLabel, TrackReleaseDate, TrackSpotifyURL, HasTrack,
+    MovementTitle, HasMovement
+"""
+
+WIDE_CONSUMER = "journey_step_wide"
+
+
+def create_journey_step_wide(connection):
+    """Creates JourneyStepWide and makes sure journey changes are being captured."""
+    connection.execute(
+        text(
+            """
+        CREATE TABLE IF NOT EXISTS JourneyStepWide (
+            JourneyID TEXT NOT NULL,
+            StepOrder INTEGER NOT NULL,
+            ActNumber TEXT,
+            ActTitle TEXT,
+            AlbumID INTEGER,
+            RecordingID INTEGER,
+            AlbumTitle TEXT,
+            AlbumPerformerName TEXT,
+            AlbumLabel TEXT,
+            AlbumReleaseDate INTEGER,
+            AlbumSpotifyURL TEXT,
+            HasAlbum BOOLEAN,
+            TrackTitle TEXT,
+            TrackPerformerName TEXT,
+            TrackLabel TEXT,
+            TrackReleaseDate INTEGER,
+            TrackSpotifyURL TEXT,
+            HasTrack BOOLEAN,
+            MovementTitle TEXT,
+            HasMovement BOOLEAN,
+            PRIMARY KEY (JourneyID, StepOrder)
+        ) WITHOUT ROWID
+    """
+        )
+    )
+    # Keep the change-capture triggers' lookups into the fact table indexed
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_fact_step_album ON FactJourneyStep (AlbumID)"
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_fact_step_recording ON FactJourneyStep (RecordingID)"
+        )
+    )
+    # The bridge stores IDs as TEXT; without this index the movement lookup
+    # above scans the whole bridge for every step
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_bridge_recording "
+            "ON BridgeAlbumMovement (CAST(recording_id AS INTEGER))"
+        )
+    )
+    ensure_change_log(connection)
+
+
+def rebuild_journey_step_wide(connection):
+    """Re-materializes every journey and moves its change cursor to the latest change."""
+    create_journey_step_wide(connection)
+    connection.execute(text("DELETE FROM JourneyStepWide"))
+    connection.execute(
+        text(f"INSERT INTO JourneyStepWide ({WIDE_COLUMNS}) {WIDE_SELECT}")
+    )
+    advance_consumer(connection, WIDE_CONSUMER, current_seq(connection))
+    return connection.execute(text("SELECT COUNT(*) FROM JourneyStepWide")).scalar()
+
+
+def refresh_journeys(connection, journey_ids):
+    """Re-materializes the given journeys."""
+    journey_ids = list(journey_ids)
+    if not journey_ids:
+        return
+    params = {"journey_ids": journey_ids}
+    connection.execute(
+        text("DELETE FROM JourneyStepWide WHERE JourneyID IN :journey_ids").bindparams(
+            bindparam("journey_ids", expanding=True)
+        ),
+        params,
+    )
+    connection.execute(
+        text(
+            f"INSERT INTO JourneyStepWide ({WIDE_COLUMNS}) {WIDE_SELECT} "
+            "WHERE fs.JourneyID IN :journey_ids"
+        ).bindparams(bindparam("journey_ids", expanding=True)),
+        params,
+    )
+
+
+def refresh_changed_journeys(connection):
+    """Re-materializes every journey changed since the last refresh; returns their IDs."""
+    changed, high_seq = pending_journeys(connection, WIDE_CONSUMER)
+    if changed is None:
+        rebuild_journey_step_wide(connection)
+        return None
+    refresh_journeys(connection, changed)
+    advance_consumer(connection, WIDE_CONSUMER, high_seq)
+    return changed
+
+
+def ensure_fresh_journey(connection, journey_id):
+    """
+    Makes sure JourneyStepWide is current before a journey is read. Pending
+    changes are applied for every journey at once, so the cost follows the
+    size of the change. Creates and fills the table on older databases.
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'JourneyStepWide'")
+    ).scalar()
+    if not exists:
+        rebuild_journey_step_wide(connection)
+        return
+    refresh_changed_journeys(connection)
@@ -1,29 +1,160 @@
+"""
+Central logging setup.
+
+Every logger under "music_journey" hands its records to an in-memory queue.
+One QueueListener thread formats them and writes them to the console (text)
+and to a rotating JSON-lines file, so worker threads never wait on I/O.
+Records are formatted only on the listener thread, and only if their level is
+enabled, so log with %-style arguments (`logger.info("Synced %s", name)`)
+rather than f-strings. The level comes from LOG_LEVEL (default INFO).
+
+Hot loops should not log per item: `ProgressLog` collapses them into one
+progress line every few seconds, and `log_sample` lists only the first few
+items of a long list.
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
+import time
+from datetime import UTC, datetime
+
+from src.db import OUTPUT_DIR
+from src.instrumentation import TimedRotatingFileHandler, TimedStreamHandler
+
+# --- Configuration ---
+LOGGER_NAME = "music_journey"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", os.path.join(OUTPUT_DIR, "music_journey.log.jsonl"))
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+CONSOLE_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+CONSOLE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Seconds between two ProgressLog lines, and items listed by log_sample
+PROGRESS_INTERVAL_SECONDS = 5.0
+LOG_SAMPLE_SIZE = 10
 
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
 
-def setup_logger():
-    """Sets up a configured logger instance."""
-    logger = logging.getLogger("MusicJourneyLogger")
+_queue = {"listener": None}
+_listener_lock = threading.Lock()
 
-    # Prevent adding multiple handlers if the function is called more than once
-    if logger.hasHandlers():
-        return logger
 
-    # Set to DEBUG to capture all levels of messages for troubleshooting
-    logger.setLevel(logging.DEBUG)
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; `extra=` fields become keys of their own."""
 
-    # Create a handler to print to the console (stdout)
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.DEBUG)
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
 
-    # Create a formatter and set it for the handler
-    formatter = logging.Formatter(
-        "%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are; the listener thread does all the formatting."""
+
+    def prepare(self, record):
+        # The queue never leaves the process, so the record needs no pickling
+        # and its message is left unformatted for the listener
+        return record
+
+
+def _start_listener():
+    console = TimedStreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT, CONSOLE_DATE_FORMAT))
+    os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
+    log_file = TimedRotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
     )
-    handler.setFormatter(formatter)
+    log_file.setFormatter(JsonFormatter())
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, console, log_file)
+    listener.start()
+    _queue["listener"] = listener
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(LazyQueueHandler(records))
+    logger.propagate = False
+
+
+def setup_logger(name=None):
+    """
+    Returns the project logger, or its child `name` (e.g. "import"), starting
+    the shared queue listener on first use.
+    """
+    with _listener_lock:
+        if _queue["listener"] is None:
+            _start_listener()
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+class ProgressLog:
+    """
+    Counts items of a long loop by outcome and logs one progress line at most
+    every `interval` seconds, plus a final line from `finish()`.
+    """
+
+    def __init__(self, logger, label, total=None, interval=PROGRESS_INTERVAL_SECONDS):
+        self.logger = logger
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.items = 0
+        self.outcomes = {}
+        self.started = time.monotonic()
+        self.last_logged = self.started
+
+    def update(self, outcome=None, count=1):
+        self.items += count
+        if outcome:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+        now = time.monotonic()
+        if now - self.last_logged >= self.interval:
+            self.last_logged = now
+            self._log("in progress")
+
+    def finish(self):
+        self._log("done")
+
+    def _log(self, state):
+        elapsed = time.monotonic() - self.started
+        self.logger.info(
+            "%s %s: %d%s items in %.1fs (%.1f/s)%s",
+            self.label,
+            state,
+            self.items,
+            f"/{self.total}" if self.total is not None else "",
+            elapsed,
+            self.items / elapsed if elapsed > 0 else 0.0,
+            "".join(
+                f", {count} {outcome}"
+                for outcome, count in sorted(self.outcomes.items())
+            ),
+        )
 
-    # Add the handler to the logger
-    logger.addHandler(handler)
 
-    return logger
+def log_sample(logger, level, items, limit=LOG_SAMPLE_SIZE):
+    """Logs the first `limit` of `items` (preformatted strings) and how many were left out."""
+    for item in items[:limit]:
+        logger.log(level, "     %s", item)
+    if len(items) > limit:
+        logger.log(level, "     ... and %d more", len(items) - limit)
@@ -0,0 +1,190 @@
+"""
+Full-text search over the DWH's curated text.
+
+SearchIndex is an FTS5 table holding journeys, works, movements and journey
+steps. Triggers on the source tables keep it in sync, so the build populates
+it while loading the CSVs and later edits are indexed as they happen.
+"""
+
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from src.db import get_engine
+
+# --- Configuration ---
+DEFAULT_LIMIT = 20
+
+# Kind -> (code, source table, RefID, JourneyID, Title, Body) as SQL over the row.
+# A document's rowid is the source rowid * 4 + code, so triggers update in place.
+SOURCES = {
+    "journey": (
+        0,
+        "DimJourney",
+        "{r}.JourneyID",
+        "{r}.JourneyID",
+        "{r}.JourneyName",
+        "COALESCE({r}.JourneyDescription, '') || ' ' || COALESCE({r}.JourneyTheme, '')",
+    ),
+    "work": (
+        1,
+        "DimMusicalWork",
+        "{r}.WorkID",
+        "NULL",
+        "{r}.Title",
+        "COALESCE({r}.PrimaryArtist, '') || ' ' || COALESCE({r}.WorkDescription, '')",
+    ),
+    "movement": (
+        2,
+        "DimMovement",
+        "{r}.MovementID",
+        "NULL",
+        "{r}.MovementTitle",
+        "{r}.MovementDescription",
+    ),
+    "step": (
+        3,
+        "FactJourneyStep",
+        "{r}.JourneyID || ':' || {r}.StepOrder",
+        "{r}.JourneyID",
+        "{r}.ActTitle",
+        "COALESCE({r}.CurationNotes, '') || ' ' || COALESCE({r}.WhyThisRecording, '')",
+    ),
+}
+
+
+def _document_sql(kind, row):
+    code, _, ref_id, journey_id, title, body = SOURCES[kind]
+    return f"{row}.rowid * 4 + {code}, '{kind}', " + ", ".join(
+        expr.format(r=row) for expr in (ref_id, journey_id, title, body)
+    )
+
+
+def _existing_tables(connection):
+    return {
+        row[0]
+        for row in connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table'")
+        )
+    }
+
+
+def create_search_index(connection):
+    """Creates an empty SearchIndex and the triggers that keep it in sync."""
+    tables = _existing_tables(connection)
+    connection.execute(text("DROP TABLE IF EXISTS SearchIndex"))
+    connection.execute(
+        text(
+            """
+        CREATE VIRTUAL TABLE SearchIndex USING fts5(
+            Kind UNINDEXED, RefID UNINDEXED, JourneyID UNINDEXED, Title, Body,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """
+        )
+    )
+    for kind, (code, table, *_) in SOURCES.items():
+        if table not in tables:
+            continue
+        insert = (
+            "INSERT INTO SearchIndex (rowid, Kind, RefID, JourneyID, Title, Body) "
+            f"VALUES ({_document_sql(kind, 'new')});"
+        )
+        delete = f"DELETE FROM SearchIndex WHERE rowid = old.rowid * 4 + {code};"
+        for event, body in (
+            ("INSERT", insert),
+            ("UPDATE", delete + " " + insert),
+            ("DELETE", delete),
+        ):
+            trigger = f"{table}_search_{event.lower()}"
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            connection.execute(
+                text(
+                    f"CREATE TRIGGER {trigger} AFTER {event} ON {table} BEGIN {body} END"
+                )
+            )
+
+
+def reindex(connection):
+    """Recreates SearchIndex and its triggers, then indexes every existing row."""
+    create_search_index(connection)
+    tables = _existing_tables(connection)
+    for kind, (_, table, *_) in SOURCES.items():
+        if table not in tables:
+            continue
+        connection.execute(
+            text(
+                "INSERT INTO SearchIndex (rowid, Kind, RefID, JourneyID, Title, Body) "
+                f"SELECT {_document_sql(kind, table)} FROM {table}"
+            )
+        )
+    return connection.execute(text("SELECT COUNT(*) FROM SearchIndex")).scalar()
+
+
+def _quote_terms(query):
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def search(connection, query, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Returns BM25-ranked matches as dicts with kind, ref_id, journey_id, title and
+    a highlighted snippet. The query uses FTS5 syntax; if it does not parse, its
+    words are searched as plain terms.
+    """
+    kind_filter = ""
+    params = {"limit": limit}
+    if kinds:
+        kind_filter = "AND Kind IN ({})".format(
+            ", ".join(f":kind_{i}" for i in range(len(kinds)))
+        )
+        params.update({f"kind_{i}": kind for i, kind in enumerate(kinds)})
+    statement = text(
+        f"""
+        SELECT Kind, RefID, JourneyID, Title,
+               snippet(SearchIndex, 4, '[', ']', '…', 16) AS Snippet,
+               bm25(SearchIndex, 0, 0, 0, 5.0, 1.0) AS Score
+        FROM SearchIndex
+        WHERE SearchIndex MATCH :query {kind_filter}
+        ORDER BY Score
+        LIMIT :limit
+    """
+    )
+    try:
+        rows = connection.execute(statement, dict(params, query=query)).fetchall()
+    except OperationalError:
+        rows = connection.execute(
+            statement, dict(params, query=_quote_terms(query))
+        ).fetchall()
+    return [
+        {
+            "kind": kind,
+            "ref_id": ref_id,
+            "journey_id": journey_id,
+            "title": title,
+            "snippet": snippet,
+            "score": score,
+        }
+        for kind, ref_id, journey_id, title, snippet, score in rows
+    ]
+
+
+def search_dwh(query, kinds=None, limit=DEFAULT_LIMIT, rebuild=False):
+    """CLI entrypoint: prints ranked matches, building the index first if needed."""
+    engine = get_engine()
+    with engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'SearchIndex'")
+        ).scalar()
+        if rebuild or not exists:
+            count = reindex(connection)
+            print(f"Search index rebuilt with {count} documents.")
+    if not query:
+        return []
+    with engine.connect() as connection:
+        results = search(connection, query, kinds=kinds, limit=limit)
+    if not results:
+        print(f"No matches for '{query}'.")
+    for result in results:
+        print(f"[{result['kind']}] {result['ref_id']} — {result['title'] or ''}")
+        print(f"    {result['snippet']}")
+    return results
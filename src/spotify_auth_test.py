@@ -1,6 +1,5 @@
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
 from dotenv import load_dotenv
+from src.spotify_client import PLAYLIST_SCOPE, get_spotify_client
 
 
 def test_spotify_auth():
@@ -11,11 +10,8 @@ def test_spotify_auth():
     load_dotenv()
 
     try:
-        # Define the necessary scopes for playlist modification
-        scope = "playlist-modify-public playlist-modify-private"
-
-        # Initialize the Spotify client with OAuth 2.0
-        sp = spotipy.Spotify(auth_manager=SpotifyOAuth(scope=scope))
+        # Get the shared Spotify client with the playlist modification scopes
+        sp = get_spotify_client(PLAYLIST_SCOPE)
 
         # Fetch the current user's information to confirm authentication
         user = sp.current_user()
@@ -0,0 +1,354 @@
+"""
+Shared Spotify client.
+
+Every module gets its spotipy client from `get_spotify_client`, which keeps one
+client per auth scope for the whole process. All clients share one pooled
+keep-alive HTTP session whose adapter retries with exponential backoff, honoring
+Retry-After: 429 responses for every method, 5xx responses and read errors only
+for idempotent methods, so a POST that may have been applied is not sent twice.
+A circuit breaker fails fast while Spotify is down, and every call is counted
+and timed per endpoint.
+"""
+
+import bisect
+import os
+import re
+import threading
+import time
+
+import requests
+import spotipy
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from spotipy.exceptions import SpotifyBaseException, SpotifyException
+from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
+from urllib3.util.retry import Retry
+
+# --- Configuration ---
+DEFAULT_API_BASE_URL = "https://api.spotify.com"
+PLAYLIST_SCOPE = "playlist-modify-public playlist-modify-private"
+
+REQUEST_TIMEOUT_SECONDS = 10
+POOL_MAXSIZE = 16
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5
+BACKOFF_MAX_SECONDS = 30
+# Longest Retry-After we are willing to sleep through on a single retry
+MAX_RETRY_AFTER_SECONDS = 60
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Consecutive failed calls that open the breaker, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+
+# Latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Path segments that identify a resource, collapsed so metrics group by endpoint
+_ID_SEGMENT = re.compile(r"^[0-9A-Za-z]{22}$")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Spotify while the circuit breaker is open."""
+
+
+# Failures of a Spotify call that callers report and move past: API and OAuth
+# errors, network errors and an open circuit breaker
+SPOTIFY_ERRORS = (SpotifyBaseException, requests.RequestException, CircuitOpenError)
+
+
+class _SpotifyRetry(Retry):
+    """
+    Retries 429 for every method (the request was not processed) and caps
+    Retry-After. Everything else follows urllib3's idempotent `allowed_methods`.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, MAX_RETRY_AFTER_SECONDS)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; after a cool-down, lets one trial call through."""
+
+    def __init__(
+        self, threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS
+    ):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if (
+                time.monotonic() - self.opened_at < self.reset_seconds
+                or self.trial_in_flight
+            ):
+                raise CircuitOpenError(
+                    f"Spotify circuit open after {self.failures} consecutive failures."
+                )
+            self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class CallMetrics:
+    """Per-endpoint call counts, status counts, retries and latency histograms."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, status, elapsed_ms, retries=0):
+        with self.lock:
+            stats = self.endpoints.setdefault(
+                endpoint,
+                {
+                    "calls": 0,
+                    "retries": 0,
+                    "statuses": {},
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                },
+            )
+            stats["calls"] += 1
+            stats["retries"] += retries
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["buckets"][bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                endpoint: dict(
+                    stats,
+                    statuses=dict(stats["statuses"]),
+                    buckets=list(stats["buckets"]),
+                )
+                for endpoint, stats in self.endpoints.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+def endpoint_name(method, url):
+    """Returns e.g. "GET /v1/albums/{id}/tracks" for metrics grouping."""
+    path = requests.utils.urlparse(url).path.rstrip("/")
+    segments = path.split("/")
+    for i, segment in enumerate(segments):
+        if _ID_SEGMENT.match(segment) or (i and segments[i - 1] == "users"):
+            segments[i] = "{id}"
+    return f"{method.upper()} {'/'.join(segments)}"
+
+
+breaker = CircuitBreaker()
+metrics = CallMetrics()
+
+
+class SpotifySession(requests.Session):
+    """A keep-alive session that retries, feeds the circuit breaker and records metrics."""
+
+    def __init__(self):
+        super().__init__()
+        retry = _SpotifyRetry(
+            total=MAX_RETRIES,
+            backoff_factor=BACKOFF_FACTOR,
+            backoff_max=BACKOFF_MAX_SECONDS,
+            backoff_jitter=BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
+            respect_retry_after_header=True,
+            # Hand the last response to spotipy so it reports the real status
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE, max_retries=retry
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        endpoint = endpoint_name(method, url)
+        breaker.before_call()
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            metrics.record(endpoint, "error", (time.perf_counter() - started) * 1000)
+            breaker.record_failure()
+            raise
+        retry_state = getattr(response.raw, "retries", None)
+        metrics.record(
+            endpoint,
+            response.status_code,
+            (time.perf_counter() - started) * 1000,
+            len(retry_state.history) if retry_state else 0,
+        )
+        if response.status_code in RETRY_STATUSES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+
+_sessions = {}
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the process-wide Spotify HTTP session."""
+    with _clients_lock:
+        if "session" not in _sessions:
+            _sessions["session"] = SpotifySession()
+        return _sessions["session"]
+
+
+def get_spotify_client(scope=None):
+    """
+    Returns the process-wide spotipy client for `scope`: user OAuth with that
+    scope, or client credentials (catalog reads only) when `scope` is None.
+    Credentials are read from the environment / .env on first use.
+
+    SPOTIFY_API_BASE_URL points the client at another host (e.g. the local
+    stand-in server), and SPOTIFY_ACCESS_TOKEN uses a fixed bearer token
+    instead of the OAuth flow.
+    """
+    session = get_session()
+    with _clients_lock:
+        client = _clients.get(scope)
+        if client is None:
+            load_dotenv()
+            access_token = os.getenv("SPOTIFY_ACCESS_TOKEN")
+            if access_token:
+                client = spotipy.Spotify(
+                    auth=access_token,
+                    requests_session=session,
+                    requests_timeout=REQUEST_TIMEOUT_SECONDS,
+                )
+            else:
+                client = spotipy.Spotify(
+                    auth_manager=(
+                        SpotifyOAuth(scope=scope)
+                        if scope
+                        else SpotifyClientCredentials()
+                    ),
+                    requests_session=session,
+                    requests_timeout=REQUEST_TIMEOUT_SECONDS,
+                )
+            base_url = os.getenv("SPOTIFY_API_BASE_URL", DEFAULT_API_BASE_URL)
+            client.prefix = f"{base_url.rstrip('/')}/v1/"
+            _clients[scope] = client
+        return client
+
+
+def is_not_found(exc):
+    """
+    True when Spotify answered that the resource does not exist or the ID is
+    malformed. Rate limits, outages and network errors are not "not found":
+    the URL may be fine, and callers should not record it as invalid.
+    """
+    return isinstance(exc, SpotifyException) and exc.http_status in (400, 404)
+
+
+def _fetch_batch(sp, kind, fetch, key, batch):
+    try:
+        return fetch(batch)[key]
+    except SpotifyException as e:
+        if not is_not_found(e):
+            raise
+    # A malformed ID fails the whole batch; look the IDs up one by one
+    items = []
+    for item_id in batch:
+        try:
+            items.append(getattr(sp, kind)(item_id))
+        except SpotifyException as e:
+            if not is_not_found(e):
+                raise
+            items.append(None)
+    return items
+
+
+def spotify_id(url, kind):
+    """Returns the ID of an https://open.spotify.com/<kind>/<ID> URL, or None."""
+    prefix = f"https://open.spotify.com/{kind}/"
+    if isinstance(url, str) and url.startswith(prefix):
+        item_id = url[len(prefix) :]
+        if _ID_SEGMENT.match(item_id):
+            return item_id
+    return None
+
+
+def fetch_items(sp, kind, ids):
+    """
+    Fetches albums or tracks in batches (the API's `albums`/`tracks` endpoints).
+    Returns {id: item}, with None for IDs Spotify does not know. IDs whose batch
+    failed for another reason (rate limit, outage) are left out, so callers can
+    tell "not found" from "unknown".
+    """
+    fetch, key, batch_size = {
+        "album": (sp.albums, "albums", 20),
+        "track": (sp.tracks, "tracks", 50),
+    }[kind]
+    ids = list(dict.fromkeys(ids))
+    found = {}
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i : i + batch_size]
+        try:
+            items = _fetch_batch(sp, kind, fetch, key, batch)
+        except CircuitOpenError:
+            break
+        except (SpotifyException, requests.RequestException):
+            continue
+        found.update(zip(batch, items))
+    return found
+
+
+def call_metrics():
+    """Returns a snapshot of the per-endpoint call metrics."""
+    return metrics.snapshot()
+
+
+def log_call_metrics(logger):
+    """Logs one summary line per Spotify endpoint called so far."""
+    for endpoint, stats in sorted(call_metrics().items()):
+        average = stats["total_ms"] / stats["calls"] if stats["calls"] else 0.0
+        statuses = ", ".join(
+            f"{status}: {count}"
+            for status, count in sorted(stats["statuses"].items(), key=str)
+        )
+        logger.info(
+            "Spotify %s: %s calls, %s retries, avg %.0f ms, max %.0f ms (%s)",
+            endpoint,
+            stats["calls"],
+            stats["retries"],
+            average,
+            stats["max_ms"],
+            statuses,
+        )
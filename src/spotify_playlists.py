@@ -1,30 +1,90 @@
-import os
-from sqlalchemy import create_engine, text
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from datetime import datetime, timezone
-from src.logger import setup_logger
+import logging
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import UTC, datetime
+from src.change_log import (
+    advance_consumer,
+    record_journey_changes,
+    select_changed_journeys,
+)
+from src.db import get_engine
+from src.instrumentation import count, stage
+from src.journey_step_wide import ensure_fresh_journey
+from src.logger import ProgressLog, log_sample, setup_logger
+from src.spotify_client import (
+    PLAYLIST_SCOPE,
+    SPOTIFY_ERRORS,
+    fetch_items,
+    get_spotify_client,
+    log_call_metrics,
+    spotify_id,
+)
 
 # --- Configuration ---
-OUTPUT_DIR = "output"
-DB_NAME = "music_journeys.db"
-DB_PATH = os.path.join(OUTPUT_DIR, DB_NAME)
+# Change-log cursor of `playlist --dirty-only`
+PLAYLIST_CONSUMER = "playlist"
+# Most items Spotify accepts in one add/replace request
+PLAYLIST_ITEMS_PER_REQUEST = 100
+# Run-summary counter of each sync_journey_playlist result
+SYNC_OUTCOMES = {True: "synced", False: "failed", None: "skipped"}
 
+# --- Queries, compiled once and reused for every journey ---
+TRACK_URIS_QUERY = text(
+    """
+    SELECT TrackSpotifyURL, MovementTitle AS TrackTitle
+    FROM JourneyStepWide
+    WHERE JourneyID = :jid AND HasMovement
+    ORDER BY StepOrder;
+"""
+)
+ALBUM_URIS_QUERY = text(
+    """
+    SELECT AlbumID, AlbumSpotifyURL, AlbumTitle
+    FROM JourneyStepWide
+    WHERE JourneyID = :jid AND AlbumID IS NOT NULL AND AlbumID != '' AND AlbumSpotifyURL IS NOT NULL AND AlbumSpotifyURL != ''
+    ORDER BY StepOrder;
+"""
+)
+PLAYLIST_ID_QUERY = text(
+    "SELECT SpotifyPlaylistURL FROM DimPlaylist WHERE JourneyID = :jid AND ServiceID = :sid"
+)
+PLAYLIST_ID_UPSERT = text(
+    """INSERT INTO DimPlaylist (JourneyID, ServiceID, SpotifyPlaylistURL, SpotifyPlaylistTitle, LastUpdatedUTC) VALUES (:jid, :sid, :pid, :ptitle, :ts) ON CONFLICT(JourneyID, ServiceID) DO UPDATE SET SpotifyPlaylistURL = excluded.SpotifyPlaylistURL, SpotifyPlaylistTitle = excluded.SpotifyPlaylistTitle, LastUpdatedUTC = excluded.LastUpdatedUTC;"""
+)
+PLAYLIST_ID_DELETE = text(
+    "DELETE FROM DimPlaylist WHERE JourneyID = :jid AND ServiceID = :sid"
+)
 
-# --- Main Playlist Creation Function ---
-def spotify_playlists(journey_name_filter=None, recreate=False):
-    logger = setup_logger()
-    engine = create_engine(f"sqlite:///{DB_PATH}")
 
+def connect_spotify(logger):
+    """Returns an authenticated Spotify client and the user ID, or (None, None)."""
     try:
-        scope = "playlist-modify-public playlist-modify-private"
-        sp = spotipy.Spotify(auth_manager=SpotifyOAuth(scope=scope))
-        user_id = sp.current_user()["id"]
+        sp = get_spotify_client(PLAYLIST_SCOPE)
+        user = sp.current_user()
         logger.info(
-            f"Successfully authenticated with Spotify for user {sp.current_user()['display_name']}."
+            "Successfully authenticated with Spotify for user %s.", user["display_name"]
         )
-    except Exception as e:
-        logger.error(f"Could not authenticate with Spotify. Details: {e}")
+        return sp, user["id"]
+    except SPOTIFY_ERRORS as e:
+        logger.error("Could not authenticate with Spotify. Details: %s", e)
+        return None, None
+
+
+# --- Main Playlist Creation Function ---
+def spotify_playlists(
+    journey_name_filter=None, recreate=False, changed_since=None, dirty_only=False
+):
+    """
+    Creates or updates the Spotify playlist of every journey.
+    With `dirty_only`, only journeys changed since the last dirty-only run are
+    synced; `changed_since` (a ChangeSeq or ISO timestamp) selects journeys
+    changed after that point instead.
+    """
+    logger = setup_logger()
+    engine = get_engine()
+
+    sp, user_id = connect_spotify(logger)
+    if not sp:
         return
 
     journey_query_str = (
@@ -34,193 +94,251 @@ def spotify_playlists(journey_name_filter=None, recreate=False):
         journey_query_str += " WHERE JourneyName = :jname"
     journey_query = text(journey_query_str)
 
-    with engine.connect() as connection:
+    with engine.begin() as connection:
+        changed, high_seq = select_changed_journeys(
+            connection, PLAYLIST_CONSUMER, changed_since, dirty_only
+        )
         journeys = connection.execute(
             journey_query, {"jname": journey_name_filter} if journey_name_filter else {}
         ).fetchall()
+    if changed is not None:
+        changed = set(changed)
+        journeys = [journey for journey in journeys if journey[0] in changed]
+        logger.info("%s journeys changed since the last sync.", len(journeys))
 
     if not journeys:
         logger.warning("No journeys found.")
+        if dirty_only and changed_since is None:
+            with engine.begin() as connection:
+                advance_consumer(connection, PLAYLIST_CONSUMER, high_seq)
         return
 
+    failed_journeys = []
+    progress = ProgressLog(logger, "Playlist sync", total=len(journeys))
+
     for journey in journeys:
-        j_id, j_name, j_desc, granularity = journey
-        logger.info(f"Processing journey: '{j_name}' (Granularity: {granularity})")
-        existing_playlist_id = get_existing_playlist_id(engine, j_id, "Spotify")
-
-        if recreate and existing_playlist_id:
-            logger.warning(f" -> --recreate flag is set. Deleting playlist '{j_name}'.")
-            try:
-                sp.current_user_unfollow_playlist(existing_playlist_id)
-                clear_playlist_id(engine, j_id, "Spotify")
-                logger.info(" -> Deleted playlist and cleared local state.")
-                existing_playlist_id = None
-            except Exception as e:
-                logger.error(f" -> Failed to delete playlist: {e}")
+        with stage("playlist.journey"):
+            synced = sync_journey_playlist(
+                engine, sp, user_id, journey, logger, recreate
+            )
+        count(f"playlist.{SYNC_OUTCOMES[synced]}")
+        progress.update(SYNC_OUTCOMES[synced])
+        if synced is False:
+            failed_journeys.append(journey[0])
+    progress.finish()
+
+    if dirty_only and changed_since is None:
+        # Failed journeys are logged again so the next dirty-only run retries them
+        with engine.begin() as connection:
+            advance_consumer(connection, PLAYLIST_CONSUMER, high_seq)
+            record_journey_changes(connection, failed_journeys, source="retry")
+    log_call_metrics(logger)
+
+
+def sync_journey_playlist(engine, sp, user_id, journey, logger, recreate=False):
+    """
+    Creates or updates the Spotify playlist of one journey and records its ID.
+    Returns True when synced, False on failure and None when the journey has
+    no valid URIs. The Spotify client and engine are reused across journeys.
+    """
+    j_id, j_name, j_desc, granularity = journey
+    logger.debug("Processing journey: '%s' (Granularity: %s)", j_name, granularity)
+    existing_playlist_id = get_existing_playlist_id(engine, j_id, "Spotify")
 
+    if recreate and existing_playlist_id:
+        logger.warning(" -> --recreate flag is set. Deleting playlist '%s'.", j_name)
+        try:
+            sp.current_user_unfollow_playlist(existing_playlist_id)
+            clear_playlist_id(engine, j_id, "Spotify")
+            logger.info(" -> Deleted playlist and cleared local state.")
+            existing_playlist_id = None
+        except (*SPOTIFY_ERRORS, SQLAlchemyError) as e:
+            logger.error(" -> Failed to delete playlist: %s", e)
+
+    with stage("playlist.item_uris"):
         item_uris = (
             get_album_uris(engine, j_id, sp, logger)
             if granularity == "Album"
-            else get_track_uris(engine, j_id, logger)
+            else get_track_uris(engine, j_id, logger, sp)
         )
-        valid_item_uris = [uri for uri in item_uris if uri]
+    valid_item_uris = [uri for uri in item_uris if uri]
 
-        if not valid_item_uris:
-            logger.warning(f" -> No valid URIs found for '{j_name}'. Skipping.")
-            continue
+    if not valid_item_uris:
+        logger.warning(" -> No valid URIs found for '%s'. Skipping.", j_name)
+        return None
+
+    if existing_playlist_id:
+        logger.debug(" -> Attempting to update existing playlist: '%s'", j_name)
+        try:
+            playlist_info = sp.playlist(existing_playlist_id)
+            playlist_title = playlist_info.get("name", "")
+            playlist_desc = playlist_info.get("description", "")
+            playlist_tracks = [
+                item["track"]["uri"]
+                for item in playlist_info["tracks"]["items"]
+                if item.get("track")
+            ]
+
+            plan = plan_playlist_update(
+                playlist_title,
+                playlist_desc,
+                playlist_tracks,
+                j_name,
+                j_desc,
+                valid_item_uris,
+            )
+
+            # Update name only if different
+            if plan["name_changed"]:
+                sp.playlist_change_details(existing_playlist_id, name=j_name)
+                logger.info(" -> Playlist name updated to match journey: '%s'.", j_name)
+            else:
+                logger.debug(
+                    "   - Playlist name already matches journey: '%s'. No update needed.",
+                    j_name,
+                )
+
+            # Update description only if different
+            if plan["description_changed"]:
+                sp.playlist_change_details(existing_playlist_id, description=j_desc)
+                logger.info(
+                    " -> Playlist description updated to match journey '%s'.", j_name
+                )
+            else:
+                logger.debug(
+                    "   - Playlist description already matches journey. No update needed."
+                )
+
+            # Update tracks only if different
+            if plan["item_chunks"]:
+                first_chunk, *other_chunks = plan["item_chunks"]
+                sp.playlist_replace_items(existing_playlist_id, first_chunk)
+                for chunk in other_chunks:
+                    sp.playlist_add_items(existing_playlist_id, chunk)
+                logger.info(
+                    " -> Playlist tracks of '%s' updated: %s tracks now in playlist.",
+                    j_name,
+                    len(valid_item_uris),
+                )
+            else:
+                logger.debug(
+                    "   - Playlist tracks already match journey steps. No update needed."
+                )
 
-        if existing_playlist_id:
-            logger.info(f" -> Attempting to update existing playlist: '{j_name}'")
-            try:
-                playlist_info = sp.playlist(existing_playlist_id)
-                playlist_title = playlist_info.get("name", "")
-                playlist_desc = playlist_info.get("description", "")
-                playlist_tracks = [
-                    item["track"]["uri"]
-                    for item in playlist_info["tracks"]["items"]
-                    if item.get("track")
-                ]
-
-                # Update name only if different
-                if playlist_title != j_name:
-                    sp.playlist_change_details(existing_playlist_id, name=j_name)
-                    logger.info(
-                        f"   - Playlist name updated to match journey: '{j_name}'."
-                    )
-                else:
-                    logger.info(
-                        f"   - Playlist name already matches journey: '{j_name}'. No update needed."
-                    )
-
-                # Update description only if different
-                if playlist_desc != j_desc:
-                    sp.playlist_change_details(existing_playlist_id, description=j_desc)
-                    logger.info("   - Playlist description updated to match journey.")
-                else:
-                    logger.info(
-                        "   - Playlist description already matches journey. No update needed."
-                    )
-
-                # Update tracks only if different
-                if set(playlist_tracks) != set(valid_item_uris):
-                    sp.playlist_replace_items(
-                        existing_playlist_id, valid_item_uris[:100]
-                    )
-                    for i in range(100, len(valid_item_uris), 100):
-                        sp.playlist_add_items(
-                            existing_playlist_id, valid_item_uris[i : i + 100]
-                        )
-                    logger.info(
-                        f"   - Playlist tracks updated: {len(valid_item_uris)} tracks now in playlist."
-                    )
-                else:
-                    logger.info(
-                        "   - Playlist tracks already match journey steps. No update needed."
-                    )
-
-                playlist_id = existing_playlist_id
-            except Exception as e:
-                logger.error(f"   - Playlist update failed: {e}")
-                continue
-        else:
-            logger.info(f" -> Creating new playlist: '{j_name}'")
-            try:
-                playlist = sp.user_playlist_create(
-                    user=user_id, name=j_name, public=False, description=j_desc
+            playlist_id = existing_playlist_id
+        except SPOTIFY_ERRORS as e:
+            logger.error(" -> Playlist update failed for '%s': %s", j_name, e)
+            return False
+    else:
+        logger.info(" -> Creating new playlist: '%s'", j_name)
+        try:
+            playlist = sp.user_playlist_create(
+                user=user_id, name=j_name, public=False, description=j_desc
+            )
+            playlist_id = playlist["id"]
+            for i in range(0, len(valid_item_uris), PLAYLIST_ITEMS_PER_REQUEST):
+                sp.playlist_add_items(
+                    playlist_id, valid_item_uris[i : i + PLAYLIST_ITEMS_PER_REQUEST]
                 )
-                playlist_id = playlist["id"]
-                for i in range(0, len(valid_item_uris), 100):
-                    sp.playlist_add_items(playlist_id, valid_item_uris[i : i + 100])
-            except Exception as e:
-                logger.error(f"   - Failed to create playlist: {e}")
-                continue
+        except SPOTIFY_ERRORS as e:
+            logger.error(" -> Failed to create playlist '%s': %s", j_name, e)
+            return False
 
+    playlist_url = f"https://open.spotify.com/playlist/{playlist_id}"
     try:
-        playlist_url = f"https://open.spotify.com/playlist/{playlist_id}"
         # Fetch actual playlist title from Spotify API
         playlist_info = sp.playlist(playlist_id)
         playlist_title = playlist_info.get("name", None)
-    except UnboundLocalError as e:
-        logger.error(f"playlist_id is not set: {e}")
-        playlist_url = None
-        playlist_title = None
-    except Exception as e:
-        logger.error(f"Failed to fetch playlist info for title: {e}")
+    except SPOTIFY_ERRORS as e:
+        logger.error("Failed to fetch playlist info for title: %s", e)
         playlist_title = None
-    try:
-        logger.info(
-            f" -> Successfully synced playlist. Spotify ID: {playlist_id} | {playlist_url}"
-        )
-        save_playlist_id(engine, j_id, "Spotify", playlist_id, playlist_title)
-    except UnboundLocalError as e:
-        logger.error(f"playlist_id is not set for logger/save: {e}")
-
-
-def get_track_uris(engine, journey_id, logger):
-    """Fetches pre-curated track URIs for a track-level journey directly from the DWH."""
-    # --- THIS QUERY IS NOW CORRECTED AND ROBUST ---
-    query = text(
-        """
-        SELECT
-            dr.SpotifyURL,
-            dm.MovementTitle AS TrackTitle
-        FROM FactJourneyStep fs
-        JOIN DimRecording dr ON fs.RecordingID = dr.RecordingID
-        JOIN BridgeAlbumMovement bam ON dr.RecordingID = bam.recording_id
-        JOIN DimMovement dm ON bam.movement_id = dm.MovementID
-        WHERE fs.JourneyID = :jid ORDER BY fs.StepOrder;
-    """
+    logger.debug(
+        " -> Successfully synced playlist. Spotify ID: %s | %s",
+        playlist_id,
+        playlist_url,
     )
-    with engine.connect() as connection:
-        results = connection.execute(query, {"jid": journey_id}).fetchall()
+    save_playlist_id(engine, j_id, "Spotify", playlist_id, playlist_title)
+    return True
 
-    logger.info(f" -> Found {len(results)} steps in DWH.")
-    from spotipy.exceptions import SpotifyException
-    import spotipy
 
-    # Get a Spotipy client (reuse from main function if possible)
-    try:
-        sp = spotipy.Spotify(
-            auth_manager=SpotifyOAuth(
-                scope="playlist-modify-public playlist-modify-private"
+def plan_playlist_update(
+    playlist_title, playlist_desc, playlist_tracks, j_name, j_desc, item_uris
+):
+    """
+    Diffs a playlist's current name, description and track URIs against its
+    journey. `item_chunks` holds the URIs to write in API-sized chunks (the
+    first replaces the playlist's items, the rest are appended), or is empty
+    when the tracks already match.
+    """
+    return {
+        "name_changed": playlist_title != j_name,
+        "description_changed": playlist_desc != j_desc,
+        "item_chunks": (
+            [
+                item_uris[i : i + PLAYLIST_ITEMS_PER_REQUEST]
+                for i in range(0, len(item_uris), PLAYLIST_ITEMS_PER_REQUEST)
+            ]
+            if set(playlist_tracks) != set(item_uris)
+            else []
+        ),
+    }
+
+
+def get_track_uris(engine, journey_id, logger, sp=None):
+    """
+    Fetches pre-curated track URIs for a track-level journey directly from the DWH.
+    Pass `sp` to validate the URIs with an existing Spotify client.
+    """
+    with engine.begin() as connection:
+        ensure_fresh_journey(connection, journey_id)
+        results = connection.execute(TRACK_URIS_QUERY, {"jid": journey_id}).fetchall()
+
+    logger.debug(" -> Found %s steps in DWH.", len(results))
+
+    # Get the shared Spotipy client unless the caller's is reused
+    if sp is None:
+        try:
+            sp = get_spotify_client(PLAYLIST_SCOPE)
+        except SPOTIFY_ERRORS as e:
+            logger.error(
+                "Could not authenticate with Spotify for URI validation: %s", e
             )
-        )
-    except Exception as e:
-        logger.error(f"Could not authenticate with Spotify for URI validation: {e}")
-        return []
+            return []
+
+    # Only well-formed track URLs are looked up (see also `main.py validate`)
+    track_ids = {}
+    for row in results:
+        track_id = spotify_id(row[0], "track")
+        if track_id:
+            track_ids[row[0]] = track_id
+    # Check existence on Spotify in batches; IDs missing from `found` could
+    # not be checked (rate limit or outage) and are kept rather than dropped
+    found = fetch_items(sp, "track", track_ids.values())
 
     valid_uris = []
     invalid_uris = []
+    unverified = 0
     for row in results:
         url = row[0]
-        valid = False
-        if (
-            url
-            and isinstance(url, str)
-            and url.startswith("https://open.spotify.com/track/")
-        ):
-            track_id = url.split("/")[-1]
-            if len(track_id) == 22 and track_id.isalnum():
-                # Check existence on Spotify
-                try:
-                    sp.track(track_id)
-                    valid = True
-                except SpotifyException:
-                    valid = False
-                except Exception:
-                    valid = False
-        if valid:
-            valid_uris.append(url)
-        else:
+        track_id = track_ids.get(url)
+        if track_id is None or (track_id in found and found[track_id] is None):
             invalid_uris.append(url)
+            continue
+        if track_id not in found:
+            unverified += 1
+        valid_uris.append(url)
+    if unverified:
+        logger.warning(
+            "   - Could not verify %s tracks on Spotify (rate limited or unavailable); keeping them.",
+            unverified,
+        )
     if invalid_uris:
         logger.error(
-            f"   - Found {len(invalid_uris)} invalid, missing, or not found URLs. Listing them:"
+            "   - Found %s invalid, missing, or not found URLs in journey %s:",
+            len(invalid_uris),
+            journey_id,
         )
-        for idx, url in enumerate(invalid_uris, 1):
-            logger.error(
-                f"     {idx}: '{url}' (invalid format or not found on Spotify)"
-            )
+        log_sample(logger, logging.ERROR, [f"'{url}'" for url in invalid_uris])
     return valid_uris
 
 
@@ -228,18 +346,10 @@ def get_album_uris(engine, journey_id, sp, logger):
     """
     For album-level journeys, fetch all tracks for each album in FactJourneyStep using AlbumID.
     """
-    query = text(
-        """
-        SELECT fs.AlbumID, da.SpotifyURL, da.AlbumTitle
-        FROM FactJourneyStep fs
-        JOIN DimAlbum da ON fs.AlbumID = da.AlbumID
-        WHERE fs.JourneyID = :jid AND fs.AlbumID IS NOT NULL AND fs.AlbumID != '' AND da.SpotifyURL IS NOT NULL AND da.SpotifyURL != ''
-        ORDER BY fs.StepOrder;
-    """
-    )
-    with engine.connect() as connection:
-        albums = connection.execute(query, {"jid": journey_id}).fetchall()
-    logger.info(f" -> Found {len(albums)} album steps. Retrieving album tracks...")
+    with engine.begin() as connection:
+        ensure_fresh_journey(connection, journey_id)
+        albums = connection.execute(ALBUM_URIS_QUERY, {"jid": journey_id}).fetchall()
+    logger.debug(" -> Found %s album steps. Retrieving album tracks...", len(albums))
     all_uris = []
     for album_id, url, title in albums:
         try:
@@ -247,36 +357,36 @@ def get_album_uris(engine, journey_id, sp, logger):
                 spotify_album_id = url.split("/")[-1]
                 tracks = sp.album_tracks(spotify_album_id, market="US")
                 all_uris.extend([track["uri"] for track in tracks["items"]])
-                logger.info(
-                    f"   - Found {len(tracks['items'])} tracks for album: '{title}' (AlbumID: {album_id})"
+                logger.debug(
+                    "   - Found %s tracks for album: '%s' (AlbumID: %s)",
+                    len(tracks["items"]),
+                    title,
+                    album_id,
                 )
             else:
-                logger.error(f"   - Invalid Spotify album URL: {url}")
-        except Exception as e:
+                logger.error("   - Invalid Spotify album URL: %s", url)
+        except SPOTIFY_ERRORS as e:
             logger.error(
-                f"   - Could not fetch tracks for album '{title}'. URL: {url}. Error: {e}"
+                "   - Could not fetch tracks for album '%s'. URL: %s. Error: %s",
+                title,
+                url,
+                e,
             )
     return all_uris
 
 
 def get_existing_playlist_id(engine, journey_id, service_id):
-    query = text(
-        "SELECT SpotifyPlaylistURL FROM DimPlaylist WHERE JourneyID = :jid AND ServiceID = :sid"
-    )
     with engine.connect() as connection:
         return connection.execute(
-            query, {"jid": journey_id, "sid": service_id}
+            PLAYLIST_ID_QUERY, {"jid": journey_id, "sid": service_id}
         ).scalar_one_or_none()
 
 
 def save_playlist_id(engine, journey_id, service_id, playlist_id, playlist_title):
-    now_utc = datetime.now(timezone.utc).isoformat()
-    query = text(
-        """INSERT INTO DimPlaylist (JourneyID, ServiceID, SpotifyPlaylistURL, SpotifyPlaylistTitle, LastUpdatedUTC) VALUES (:jid, :sid, :pid, :ptitle, :ts) ON CONFLICT(JourneyID, ServiceID) DO UPDATE SET SpotifyPlaylistURL = excluded.SpotifyPlaylistURL, SpotifyPlaylistTitle = excluded.SpotifyPlaylistTitle, LastUpdatedUTC = excluded.LastUpdatedUTC;"""
-    )
+    now_utc = datetime.now(UTC).isoformat()
     with engine.connect() as connection:
         connection.execute(
-            query,
+            PLAYLIST_ID_UPSERT,
             {
                 "jid": journey_id,
                 "sid": service_id,
@@ -289,7 +399,6 @@ def save_playlist_id(engine, journey_id, service_id, playlist_id, playlist_title
 
 
 def clear_playlist_id(engine, journey_id, service_id):
-    query = text("DELETE FROM DimPlaylist WHERE JourneyID = :jid AND ServiceID = :sid")
     with engine.connect() as connection:
-        connection.execute(query, {"jid": journey_id, "sid": service_id})
+        connection.execute(PLAYLIST_ID_DELETE, {"jid": journey_id, "sid": service_id})
         connection.commit()
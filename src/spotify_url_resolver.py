@@ -0,0 +1,157 @@
+"""
+Resolves the Spotify album URL of every Performer/Album entry in a generated
+journey markdown and writes the URLs back into the document.
+
+Entries are parsed once and answered from the local catalog index where
+possible; the rest are searched concurrently against a process-wide
+(artist, album, market) cache, and the markdown is rewritten in one linear pass.
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from spotipy.exceptions import SpotifyException
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.catalog_index import lookup_album_urls
+from src.logger import setup_logger
+from src.spotify_client import get_spotify_client
+
+# --- Configuration ---
+DEFAULT_SEARCH_WORKERS = 8
+
+ENTRY_PATTERN = re.compile(
+    r"\d+\.\s+\*\*Performer:\*\*\s*(.*?)\n\d+\.\s+\*\*Album:\*\*\s*(.*?)\n",
+    re.MULTILINE,
+)
+URL_LINE_PATTERN = re.compile(r"Spotify URL:.*?(?:\n|$)")
+
+# (artist, album, market) -> album URL, or None when the search found nothing
+_url_cache = {}
+_url_cache_lock = threading.Lock()
+
+
+def parse_entries(markdown):
+    """Returns (artist, album, start, end) for every entry, in document order."""
+    return [
+        (match.group(1), match.group(2), match.start(), match.end())
+        for match in ENTRY_PATTERN.finditer(markdown)
+    ]
+
+
+def _cache_key(artist, album, market):
+    return (artist.strip().lower(), album.strip().lower(), market)
+
+
+def search_album_url(sp, artist, album, market="MX"):
+    """Looks up one album on Spotify, answering repeated lookups from the cache."""
+    key = _cache_key(artist, album, market)
+    with _url_cache_lock:
+        if key in _url_cache:
+            return _url_cache[key]
+    results = sp.search(
+        q=f"album:{album} artist:{artist}", type="album", market=market, limit=1
+    )
+    items = results.get("albums", {}).get("items", [])
+    url = items[0]["external_urls"]["spotify"] if items else None
+    with _url_cache_lock:
+        _url_cache[key] = url
+    return url
+
+
+def resolve_album_urls(sp, pairs, market="MX", max_workers=DEFAULT_SEARCH_WORKERS):
+    """Searches the distinct (artist, album) pairs concurrently; returns {pair: url}."""
+    logger = setup_logger()
+    distinct = list(dict.fromkeys(pairs))
+
+    def resolve(pair):
+        artist, album = pair
+        try:
+            return pair, search_album_url(sp, artist, album, market)
+        # requests' errors are OSErrors; KeyError covers a malformed response
+        except (SpotifyException, OSError, KeyError) as e:
+            logger.warning("Spotify search failed for %s - %s: %s", artist, album, e)
+            return pair, None
+
+    if not distinct:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(distinct))) as pool:
+        return dict(pool.map(resolve, distinct))
+
+
+def rewrite_spotify_urls(markdown, entries, urls):
+    """
+    Writes each resolved URL into its entry in a single pass over the document.
+    The first `Spotify URL:` line between an entry and the next one is replaced;
+    when there is none, the line is added right after the entry's Album line.
+    """
+    logger = setup_logger()
+    pieces = []
+    position = 0
+    for i, (artist, album, _, end) in enumerate(entries):
+        url = urls.get((artist, album))
+        if not url:
+            continue
+        block_end = entries[i + 1][2] if i + 1 < len(entries) else len(markdown)
+        existing = URL_LINE_PATTERN.search(markdown, end, block_end)
+        logger.debug(
+            "Updating block for Performer='%s', Album='%s' with Spotify URL: %s",
+            artist,
+            album,
+            url,
+        )
+        if existing:
+            pieces.append(markdown[position : existing.start()])
+            position = existing.end()
+        else:
+            pieces.append(markdown[position:end])
+            position = end
+        pieces.append(f"Spotify URL: {url}\n")
+    pieces.append(markdown[position:])
+    return "".join(pieces)
+
+
+def update_spotify_urls(markdown, market="MX", max_workers=DEFAULT_SEARCH_WORKERS):
+    """
+    Fills in the Spotify album URL of every Performer/Album entry in the markdown.
+    Pairs found in the local catalog index are answered from the DWH; only the
+    misses are searched on Spotify.
+    """
+    logger = setup_logger()
+    entries = parse_entries(markdown)
+    pairs = list(dict.fromkeys((artist, album) for artist, album, _, _ in entries))
+    try:
+        urls = lookup_album_urls(pairs)
+    except SQLAlchemyError as e:
+        logger.warning("Local catalog lookup failed, using Spotify search: %s", e)
+        urls = {}
+    misses = [pair for pair in pairs if pair not in urls]
+    logger.info(
+        "Resolved %s of %s albums from the local catalog index.", len(urls), len(pairs)
+    )
+    if misses:
+        load_dotenv()
+        client_id = os.getenv("SPOTIFY_CLIENT_ID")
+        client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+        logger.debug(
+            "Loaded SPOTIFY_CLIENT_ID: %s, SPOTIFY_CLIENT_SECRET: %s",
+            client_id,
+            "set" if client_secret else "unset",
+        )
+        if client_id and client_secret:
+            sp = get_spotify_client()
+            searched = resolve_album_urls(sp, misses, market, max_workers)
+            logger.info(
+                "Resolved %s of %s remaining albums on Spotify.",
+                sum(1 for url in searched.values() if url),
+                len(misses),
+            )
+            urls.update(searched)
+        else:
+            logger.warning(
+                "Spotify client credentials not set. Skipping Spotify search for albums missing from the catalog."
+            )
+    return rewrite_spotify_urls(markdown, entries, urls)
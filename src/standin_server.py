@@ -0,0 +1,597 @@
+"""
+Local stand-in for the Spotify Web API and Gemini generateContent.
+
+Point the project at it with SPOTIFY_API_BASE_URL / GEMINI_API_BASE_URL (and a
+placeholder SPOTIFY_ACCESS_TOKEN) to run playlist sync, imports, the build's
+Spotify enrichment and essay generation offline. Three modes:
+
+- simulate: answers from a deterministic synthetic catalog, with configurable
+  latency, injected 429s and pagination;
+- record:   proxies to the real APIs and appends every exchange to a cassette;
+- replay:   answers from a cassette, in recorded order per request.
+
+Only the endpoints the project calls are implemented.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+
+# --- Configuration ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CASSETTE = "recordings/session.jsonl"
+
+SPOTIFY_UPSTREAM = "https://api.spotify.com"
+GEMINI_UPSTREAM = "https://generativelanguage.googleapis.com"
+
+# Spotify's own page limits
+PLAYLIST_PAGE_LIMIT = 100
+ALBUM_TRACKS_PAGE_LIMIT = 50
+
+# Synthetic catalog shape
+TRACKS_PER_ALBUM = 8
+STANDIN_USER_ID = "standin-user"
+
+# Query parameters and headers that never reach a cassette
+SECRET_PARAMS = {"key"}
+FORWARDED_HEADERS = ("Authorization", "Content-Type", "Accept-Language")
+
+GEMINI_PATH = re.compile(
+    r"^/v1(?:beta)?/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$"
+)
+FIELD_LINE = re.compile(r"^\s*(?:\d+\.|[*+\-])?\s*\*\*[^*]+:?\*\*.*$")
+_BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def spotify_id(seed):
+    """A deterministic 22-character base62 Spotify ID derived from `seed`."""
+    number = int.from_bytes(hashlib.sha256(seed.encode("utf-8")).digest(), "big")
+    chars = []
+    for _ in range(22):
+        number, digit = divmod(number, 62)
+        chars.append(_BASE62[digit])
+    return "".join(chars)
+
+
+def _valid_id(value):
+    return len(value) == 22 and value.isalnum()
+
+
+def request_key(method, path, query, body):
+    """Cassette key of a request: method, path, query without secrets, and a body hash."""
+    params = sorted(
+        (name, value) for name, value in parse_qsl(query) if name not in SECRET_PARAMS
+    )
+    digest = hashlib.sha256(body or b"").hexdigest()[:16]
+    return f"{method} {path}?{urlencode(params)} {digest}"
+
+
+class Cassette:
+    """Recorded exchanges in a JSON-lines file; replays each key's responses in order."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.responses = defaultdict(deque)
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    exchange = json.loads(line)
+                    self.responses[exchange["key"]].append(exchange)
+        return sum(len(queue) for queue in self.responses.values())
+
+    def append(self, exchange):
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(exchange) + "\n")
+
+    def next_response(self, key):
+        """Pops the next recorded response for `key`; the last one is repeated."""
+        with self.lock:
+            queue = self.responses.get(key)
+            if not queue:
+                return None
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+
+class StandinState:
+    """Options, the synthetic catalog and the playlists created during a session."""
+
+    def __init__(
+        self,
+        mode="simulate",
+        cassette=None,
+        latency_ms=0.0,
+        jitter_ms=0.0,
+        gemini_latency_ms=0.0,
+        rate_limit_probability=0.0,
+        retry_after=1,
+        page_size=PLAYLIST_PAGE_LIMIT,
+        playlist_size=120,
+        stream_chunk_chars=400,
+        seed=0,
+    ):
+        self.mode = mode
+        self.cassette = cassette
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.gemini_latency_ms = gemini_latency_ms
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.playlist_size = playlist_size
+        self.stream_chunk_chars = stream_chunk_chars
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.albums = {}
+        self.tracks = {}
+        # Playlist ID -> {"name", "description", "public", "uris"}
+        self.playlists = {}
+        self.requests = 0
+        self.rate_limited = 0
+
+    def delay(self, base_ms):
+        with self.lock:
+            jitter = self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        if base_ms or jitter:
+            time.sleep((base_ms + jitter) / 1000)
+
+    def should_rate_limit(self):
+        with self.lock:
+            self.requests += 1
+            if (
+                self.rate_limit_probability
+                and self.random.random() < self.rate_limit_probability
+            ):
+                self.rate_limited += 1
+                return True
+        return False
+
+    # --- Synthetic catalog ---
+
+    def album(self, album_id):
+        with self.lock:
+            album = self.albums.get(album_id)
+            if album is None:
+                artist_id = spotify_id(f"artist:{album_id}")
+                album = {
+                    "id": album_id,
+                    "type": "album",
+                    "name": f"Album {album_id[:6]}",
+                    "uri": f"spotify:album:{album_id}",
+                    "external_urls": {
+                        "spotify": f"https://open.spotify.com/album/{album_id}"
+                    },
+                    "artists": [
+                        {
+                            "id": artist_id,
+                            "type": "artist",
+                            "name": f"Artist {artist_id[:6]}",
+                        }
+                    ],
+                    "release_date": f"{1950 + int(album_id.encode().hex(), 16) % 70}-01-01",
+                    "label": "Stand-in Records",
+                    "genres": [],
+                    "total_tracks": TRACKS_PER_ALBUM,
+                }
+                self.albums[album_id] = album
+            return album
+
+    def track(self, track_id, album_id=None, number=1):
+        with self.lock:
+            track = self.tracks.get(track_id)
+        if track is not None:
+            return track
+        album = self.album(album_id or spotify_id(f"album-of:{track_id}"))
+        track = {
+            "id": track_id,
+            "type": "track",
+            "name": f"Track {track_id[:6]}",
+            "uri": f"spotify:track:{track_id}",
+            "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+            "artists": album["artists"],
+            "album": {
+                key: album[key]
+                for key in ("id", "name", "uri", "external_urls", "release_date")
+            },
+            "track_number": number,
+            "disc_number": 1,
+            "duration_ms": 180000 + number * 1000,
+        }
+        with self.lock:
+            return self.tracks.setdefault(track_id, track)
+
+    def album_track_ids(self, album_id):
+        return [spotify_id(f"track:{album_id}:{n}") for n in range(TRACKS_PER_ALBUM)]
+
+    def playlist(self, playlist_id):
+        """Returns the stored playlist, generating a synthetic one on first access."""
+        with self.lock:
+            playlist = self.playlists.get(playlist_id)
+        if playlist is not None:
+            return playlist
+        uris = []
+        for i in range(self.playlist_size):
+            album_id = spotify_id(f"album:{playlist_id}:{i // TRACKS_PER_ALBUM}")
+            number = i % TRACKS_PER_ALBUM
+            track = self.track(
+                self.album_track_ids(album_id)[number], album_id, number + 1
+            )
+            uris.append(track["uri"])
+        playlist = {
+            "name": f"Playlist {playlist_id[:6]}",
+            "description": "",
+            "public": True,
+            "uris": uris,
+        }
+        with self.lock:
+            return self.playlists.setdefault(playlist_id, playlist)
+
+    def create_playlist(self, name, description, public):
+        with self.lock:
+            playlist_id = spotify_id(
+                f"playlist:{len(self.playlists)}:{self.random.random()}"
+            )
+            self.playlists[playlist_id] = {
+                "name": name,
+                "description": description,
+                "public": public,
+                "uris": [],
+            }
+        return playlist_id
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- Plumbing ---
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _base_url(self):
+        host = self.headers.get("Host")
+        if not host:
+            address, port = self.server.server_address[:2]
+            host = f"{address}:{port}"
+        return f"http://{host}"
+
+    def _send(self, status, payload=None, headers=None, raw=None, content_type=None):
+        body = raw if raw is not None else json.dumps(payload or {}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type or "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, {"error": {"status": status, "message": message}})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip("/") or "/"
+        query = dict(parse_qsl(parts.query))
+        body = self._body()
+        key = request_key(method, path, parts.query, body)
+        if self.state.mode == "replay":
+            return self._replay(key)
+        if self.state.mode == "record":
+            return self._record(method, path, parts.query, body, key)
+        is_gemini = GEMINI_PATH.match(path)
+        self.state.delay(
+            self.state.gemini_latency_ms if is_gemini else self.state.latency_ms
+        )
+        if self.state.should_rate_limit():
+            return self._send(
+                429,
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                {"Retry-After": str(self.state.retry_after)},
+            )
+        try:
+            if is_gemini:
+                return self._gemini(is_gemini.group("method"), body)
+            return self._spotify(method, path, query, body)
+        except (ValueError, KeyError) as e:
+            return self._error(400, f"Bad request: {e}")
+
+    # --- Record / replay ---
+
+    def _record(self, method, path, query, body, key):
+        upstream = GEMINI_UPSTREAM if GEMINI_PATH.match(path) else SPOTIFY_UPSTREAM
+        headers = {
+            name: self.headers[name] for name in FORWARDED_HEADERS if self.headers[name]
+        }
+        url = f"{upstream}{self.path}"
+        # Only record mode talks to the real APIs; keep `main.py --help` light
+        import requests
+
+        try:
+            response = requests.request(
+                method, url, headers=headers, data=body or None, timeout=300
+            )
+        except requests.RequestException as e:
+            return self._error(502, f"Upstream request failed: {e}")
+        exchange = {
+            "key": key,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", "application/json"),
+            "retry_after": response.headers.get("Retry-After"),
+            "body": response.text,
+        }
+        self.state.cassette.append(exchange)
+        self._serve_exchange(exchange, upstream)
+
+    def _replay(self, key):
+        exchange = self.state.cassette.next_response(key)
+        if exchange is None:
+            # 501 is neither "not found" nor retried, so a miss is reported as such
+            return self._error(501, f"No recorded response for {key}")
+        self._serve_exchange(exchange, SPOTIFY_UPSTREAM)
+
+    def _serve_exchange(self, exchange, upstream):
+        # Paging links must lead back to the stand-in
+        text = exchange["body"].replace(upstream, self._base_url())
+        headers = (
+            {"Retry-After": exchange["retry_after"]} if exchange["retry_after"] else {}
+        )
+        self._send(
+            exchange["status"],
+            headers=headers,
+            raw=text.encode("utf-8"),
+            content_type=exchange["content_type"],
+        )
+
+    # --- Gemini ---
+
+    def _gemini(self, method, body):
+        prompt = "".join(
+            part.get("text", "")
+            for content in json.loads(body or b"{}").get("contents", [])
+            for part in content.get("parts", [])
+        )
+        text = synthetic_essay(prompt)
+        if method == "generateContent":
+            return self._send(200, _gemini_payload(text))
+        size = self.state.stream_chunk_chars
+        events = b"".join(
+            b"data: "
+            + json.dumps(_gemini_payload(text[i : i + size])).encode()
+            + b"\r\n\r\n"
+            for i in range(0, len(text), size)
+        )
+        self._send(200, raw=events, content_type="text/event-stream")
+
+    # --- Spotify ---
+
+    def _page(self, items, path, query, limit_cap):
+        limit = min(int(query.get("limit", limit_cap)), limit_cap, self.state.page_size)
+        offset = int(query.get("offset", 0))
+        page_items = items[offset : offset + limit]
+        next_url = None
+        if offset + limit < len(items):
+            next_url = f"{self._base_url()}{path}?" + urlencode(
+                {"offset": offset + limit, "limit": limit}
+            )
+        return {
+            "href": f"{self._base_url()}{path}",
+            "items": page_items,
+            "limit": limit,
+            "offset": offset,
+            "total": len(items),
+            "next": next_url,
+            "previous": None,
+        }
+
+    def _playlist_items(self, playlist_id, query):
+        playlist = self.state.playlist(playlist_id)
+        with self.state.lock:
+            uris = list(playlist["uris"])
+        items = [{"track": self.state.track(uri.rsplit(":", 1)[-1])} for uri in uris]
+        return self._page(
+            items, f"/v1/playlists/{playlist_id}/tracks", query, PLAYLIST_PAGE_LIMIT
+        )
+
+    def _spotify(self, method, path, query, body):
+        state = self.state
+        segments = path.strip("/").split("/")[1:]  # drop "v1"
+        payload = json.loads(body) if body else {}
+        route = (method, segments[0] if segments else "", len(segments))
+
+        if route == ("GET", "me", 1):
+            return self._send(
+                200, {"id": STANDIN_USER_ID, "display_name": "Stand-in User"}
+            )
+        if route in (("GET", "albums", 1), ("GET", "tracks", 1)):
+            kind = segments[0]
+            ids = [i for i in query.get("ids", "").split(",") if i]
+            if any(not _valid_id(i) for i in ids):
+                return self._error(400, "invalid id")
+            fetch = state.album if kind == "albums" else state.track
+            return self._send(200, {kind: [fetch(i) for i in ids]})
+        if route in (("GET", "albums", 2), ("GET", "tracks", 2)):
+            if not _valid_id(segments[1]):
+                return self._error(400, "invalid id")
+            fetch = state.album if segments[0] == "albums" else state.track
+            return self._send(200, fetch(segments[1]))
+        if route == ("GET", "albums", 3) and segments[2] == "tracks":
+            album_id = segments[1]
+            if not _valid_id(album_id):
+                return self._error(400, "invalid id")
+            tracks = [
+                state.track(track_id, album_id, n + 1)
+                for n, track_id in enumerate(state.album_track_ids(album_id))
+            ]
+            return self._send(
+                200, self._page(tracks, path, query, ALBUM_TRACKS_PAGE_LIMIT)
+            )
+        if route == ("GET", "search", 1):
+            terms = dict(re.findall(r"(\w+):(.*?)(?=\s+\w+:|$)", query.get("q", "")))
+            album = dict(
+                state.album(spotify_id(f"search:{query.get('q', '')}")),
+                name=terms.get("album", query.get("q", "")).strip(),
+            )
+            if terms.get("artist"):
+                album["artists"] = [
+                    dict(album["artists"][0], name=terms["artist"].strip())
+                ]
+            return self._send(
+                200,
+                {"albums": self._page([album], path, query, ALBUM_TRACKS_PAGE_LIMIT)},
+            )
+        if route == ("POST", "users", 3) and segments[2] == "playlists":
+            playlist_id = state.create_playlist(
+                payload.get("name", ""),
+                payload.get("description", ""),
+                payload.get("public", True),
+            )
+            return self._send(201, self._playlist(playlist_id, {}))
+        if segments and segments[0] == "playlists" and len(segments) >= 2:
+            return self._playlist_route(method, segments, query, payload)
+        return self._error(404, f"Stand-in does not implement {method} {path}")
+
+    def _playlist(self, playlist_id, query):
+        playlist = self.state.playlist(playlist_id)
+        return {
+            "id": playlist_id,
+            "name": playlist["name"],
+            "description": playlist["description"],
+            "public": playlist["public"],
+            "uri": f"spotify:playlist:{playlist_id}",
+            "external_urls": {
+                "spotify": f"https://open.spotify.com/playlist/{playlist_id}"
+            },
+            "owner": {"id": STANDIN_USER_ID},
+            "tracks": self._playlist_items(playlist_id, query),
+        }
+
+    def _playlist_route(self, method, segments, query, payload):
+        playlist_id = segments[1]
+        tail = segments[2] if len(segments) > 2 else ""
+        if method == "GET" and not tail:
+            return self._send(200, self._playlist(playlist_id, query))
+        if method == "GET" and tail in ("tracks", "items"):
+            return self._send(200, self._playlist_items(playlist_id, query))
+        if method == "DELETE" and tail == "followers":
+            return self._send(200, {})
+        playlist = self.state.playlist(playlist_id)
+        if method == "PUT" and not tail:
+            with self.state.lock:
+                for field in ("name", "description", "public"):
+                    if field in payload:
+                        playlist[field] = payload[field]
+            return self._send(200, {})
+        if tail in ("tracks", "items") and method in ("POST", "PUT"):
+            # spotipy posts the URIs as a bare JSON array, position in the query
+            if isinstance(payload, list):
+                payload = {"uris": payload, "position": query.get("position")}
+            uris = payload.get("uris") or query.get("uris", "").split(",")
+            uris = [uri for uri in uris if uri]
+            if len(uris) > PLAYLIST_PAGE_LIMIT:
+                return self._error(400, "Too many tracks requested")
+            with self.state.lock:
+                if method == "PUT":
+                    playlist["uris"] = uris
+                else:
+                    position = payload.get("position")
+                    if position is None:
+                        position = len(playlist["uris"])
+                    position = int(position)
+                    playlist["uris"][position:position] = uris
+                snapshot_id = spotify_id(" ".join(playlist["uris"]))
+            return self._send(201, {"snapshot_id": snapshot_id})
+        return self._error(
+            404, f"Stand-in does not implement {method} playlists/{tail}"
+        )
+
+
+def _gemini_payload(text):
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+        "modelVersion": "standin",
+    }
+
+
+def synthetic_essay(prompt):
+    """A deterministic essay that keeps the prompt's `**Field:**` step lines."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    fields = [line.strip() for line in prompt.splitlines() if FIELD_LINE.match(line)]
+    body = "\n".join(fields) if fields else "No steps were found in the prompt."
+    return (
+        f"## Stand-in essay {digest}\n\n{body}\n\n"
+        "This essay was generated by the local stand-in server.\n"
+    )
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, **options):
+    """Builds a stand-in server; `options` are StandinState arguments."""
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.state = StandinState(**options)
+    return server
+
+
+def serve_in_background(host=DEFAULT_HOST, port=0, **options):
+    """Starts a stand-in on a daemon thread; returns (server, base_url). Port 0 picks a free one."""
+    server = make_server(host, port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def run_standin_server(
+    host=DEFAULT_HOST, port=DEFAULT_PORT, mode="simulate", cassette_path=None, **options
+):
+    """CLI entrypoint: serves until interrupted."""
+    cassette = None
+    if mode in ("record", "replay"):
+        cassette = Cassette(cassette_path or DEFAULT_CASSETTE)
+        if mode == "replay":
+            print(f"Loaded {cassette.load()} recorded responses from {cassette.path}.")
+        else:
+            os.makedirs(os.path.dirname(cassette.path) or ".", exist_ok=True)
+    server = make_server(host, port, mode=mode, cassette=cassette, **options)
+    base_url = f"http://{host}:{server.server_address[1]}"
+    print(f"Stand-in server ({mode}) listening on {base_url}")
+    print(
+        f"  export SPOTIFY_API_BASE_URL={base_url} GEMINI_API_BASE_URL={base_url} SPOTIFY_ACCESS_TOKEN=standin"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        state = server.state
+        print(f"Served {state.requests} requests ({state.rate_limited} rate limited).")
+
@@ -0,0 +1,335 @@
+"""
+Pandas-free CSV loader for `build --engine=stream`.
+
+Each CSV is read with the csv module as a generator and inserted with sqlite3
+`executemany` in batches of LOAD_BATCH_SIZE rows, so no table is ever held in
+memory whole. A first pass over the file decides each column's type the way
+`pandas.read_csv` infers it (int, float, bool or str, with pandas' NA
+markers), and values are coerced to that type on the way in; the table's
+column affinity then stores them exactly as the pandas engine's `to_sql`
+does, so both engines build the same database.
+"""
+
+import csv
+import itertools
+import os
+import re
+import sqlite3
+
+from src.build_dwh import (
+    DATA_DIR,
+    LEGACY_SPOTIFY_COLUMNS,
+    SPOTIFY_TITLE_COLUMNS,
+    SPOTIFY_URL_JUNK,
+    TABLES,
+    spotify_title_matches,
+)
+from src.db import DB_PATH, raw_connection
+from src.instrumentation import count, stage
+
+# --- Configuration ---
+LOAD_BATCH_SIZE = 5000
+# Notes and descriptions can be long; pandas has no field size limit either
+csv.field_size_limit(2**31 - 1)
+
+# pandas.read_csv's default NA markers and boolean spellings
+NA_VALUES = frozenset(
+    {
+        "",
+        "#N/A",
+        "#N/A N/A",
+        "#NA",
+        "-1.#IND",
+        "-1.#QNAN",
+        "-NaN",
+        "-nan",
+        "1.#IND",
+        "1.#QNAN",
+        "<NA>",
+        "N/A",
+        "NA",
+        "NULL",
+        "NaN",
+        "None",
+        "n/a",
+        "nan",
+        "null",
+    }
+)
+BOOL_VALUES = {
+    "True": True,
+    "TRUE": True,
+    "true": True,
+    "False": False,
+    "FALSE": False,
+    "false": False,
+}
+INT_PATTERN = re.compile(r"\s*[+-]?\d+\s*")
+FLOAT_PATTERN = re.compile(
+    r"\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|inf|infinity)\s*",
+    re.IGNORECASE,
+)
+NUMERIC_AFFINITY = ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC", "BOOL")
+
+
+def _read_csv_rows(csv_path):
+    """Yields the fields of every non-blank data row, header excluded."""
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        width = len(header)
+        for row in reader:
+            if not row or row == [""]:
+                continue
+            if len(row) > width:
+                raise ValueError(
+                    f"Line {reader.line_num}: expected {width} fields, saw {len(row)}"
+                )
+            # Short rows are padded with NA, as pandas does
+            yield row + [""] * (width - len(row))
+
+
+def read_header(csv_path):
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+
+def _is_int(value):
+    return (value.isdigit() and value.isascii()) or bool(INT_PATTERN.fullmatch(value))
+
+
+def _value_type(value):
+    if _is_int(value):
+        return "int"
+    if FLOAT_PATTERN.fullmatch(value):
+        return "float"
+    if value in BOOL_VALUES:
+        return "bool"
+    return "str"
+
+
+def infer_column_types(csv_path, header):
+    """
+    Returns pandas' inferred type for each column: "int", "float" (ints with
+    NA, or nothing but NA), "bool" (possibly with NA) or "str".
+    """
+    # None until a column's first value; a type only ever widens to "str"
+    types = [None] * len(header)
+    has_na = [False] * len(header)
+    for row in _read_csv_rows(csv_path):
+        for i, value in enumerate(row):
+            column_type = types[i]
+            if column_type == "str":
+                continue
+            if value in NA_VALUES:
+                has_na[i] = True
+            elif column_type is None:
+                types[i] = _value_type(value)
+            elif column_type == "int":
+                if not _is_int(value):
+                    types[i] = "float" if FLOAT_PATTERN.fullmatch(value) else "str"
+            elif column_type == "float":
+                if not FLOAT_PATTERN.fullmatch(value):
+                    types[i] = "str"
+            elif value not in BOOL_VALUES:
+                types[i] = "str"
+    return [
+        "float" if column_type is None or (column_type == "int" and na) else column_type
+        for column_type, na in zip(types, has_na)
+    ]
+
+
+# Column type -> converter of a non-NA CSV value
+CONVERTERS = {
+    "int": int,
+    "float": float,
+    "bool": BOOL_VALUES.__getitem__,
+    "str": str,
+}
+
+
+def read_records(csv_path, header, types):
+    """Yields each row of the CSV as a list of coerced values."""
+    converters = [CONVERTERS[column_type] for column_type in types]
+    for row in _read_csv_rows(csv_path):
+        yield [
+            None if value in NA_VALUES else convert(value)
+            for value, convert in zip(row, converters)
+        ]
+
+
+def _declared_types(cursor, table_name):
+    return {
+        row[1]: (row[2] or "").upper()
+        for row in cursor.execute(f"PRAGMA table_info({table_name})")
+    }
+
+
+def validate_columns(cursor, table_name, header, types):
+    """
+    Checks the CSV header against the table schema and warns about columns
+    declared numeric whose values are text (SQLite keeps those as TEXT).
+    Legacy columns are skipped; the loader drops them.
+    """
+    declared = _declared_types(cursor, table_name)
+    unknown = [
+        column
+        for column in header
+        if column not in declared and column not in LEGACY_SPOTIFY_COLUMNS
+    ]
+    if unknown:
+        raise ValueError(f"table {table_name} has no column named {unknown[0]}")
+    for column, column_type in zip(header, types):
+        if column in LEGACY_SPOTIFY_COLUMNS:
+            continue
+        if column_type == "str" and declared[column].startswith(NUMERIC_AFFINITY):
+            print(
+                f"   -> WARNING: {table_name}.{column} is declared {declared[column]} but has text values."
+            )
+
+
+def _movement_titles(data_dir):
+    movement_path = os.path.join(data_dir, TABLES["DimMovement"])
+    header = read_header(movement_path)
+    types = infer_column_types(movement_path, header)
+    id_index = header.index("MovementID")
+    title_index = header.index("MovementTitle")
+    return {
+        record[id_index]: record[title_index]
+        for record in read_records(movement_path, header, types)
+    }
+
+
+def _spotify_titles(table_name, csv_path, header, types, data_dir):
+    """
+    Returns {row number: (SpotifyTitle, SpotifyTitleKey, SpotifyTitleScore,
+    SpotifyTitleReason)} for the CSV's rows.
+    """
+    url_index = header.index("SpotifyURL")
+    if table_name == "DimAlbum":
+        kind = "album"
+        title_index = header.index("AlbumTitle")
+        titles = None
+    else:
+        kind = "track"
+        title_index = header.index("MovementID")
+        titles = _movement_titles(data_dir)
+    urls, expected = {}, {}
+    for row_number, record in enumerate(read_records(csv_path, header, types)):
+        if record[url_index] is None:
+            continue
+        urls[row_number] = record[url_index]
+        if titles is not None:
+            expected[row_number] = titles.get(record[title_index]) or ""
+        else:
+            # pandas reads a missing title as NaN
+            title = record[title_index]
+            expected[row_number] = "nan" if title is None else title
+    return spotify_title_matches(kind, urls, expected)
+
+
+def load_table_stream(connection, table_name, csv_path, enrich=True, data_dir=DATA_DIR):
+    """Loads one CSV into its (empty) table in batches; returns the rows loaded."""
+    header = read_header(csv_path)
+    with stage("build.read_csv"):
+        types = infer_column_types(csv_path, header)
+    cursor = connection.cursor()
+    validate_columns(cursor, table_name, header, types)
+
+    records = read_records(csv_path, header, types)
+    columns = list(header)
+    if any(column in LEGACY_SPOTIFY_COLUMNS for column in header):
+        legacy_kept = [
+            i for i, column in enumerate(header) if column not in LEGACY_SPOTIFY_COLUMNS
+        ]
+        columns = [header[i] for i in legacy_kept]
+
+        def without_legacy(records):
+            for record in records:
+                yield [record[i] for i in legacy_kept]
+
+        records = without_legacy(records)
+    if table_name == "DimRecording" and "SpotifyURL" in header:
+        print(f"   -> Cleaning SpotifyURL column in {os.path.basename(csv_path)}...")
+        if types[header.index("SpotifyURL")] == "str":
+            url_index = columns.index("SpotifyURL")
+
+            def clean(records):
+                for record in records:
+                    if record[url_index] is not None:
+                        record[url_index] = SPOTIFY_URL_JUNK.sub("", record[url_index])
+                    yield record
+
+            records = clean(records)
+            print("   -> Cleaning complete.")
+        else:
+            print("   -> Skipping cleaning: SpotifyURL column is not string type.")
+
+    # Enrichment replaces any SpotifyTitle columns from the CSV
+    if enrich and table_name in ("DimAlbum", "DimRecording") and "SpotifyURL" in header:
+        matches = _spotify_titles(table_name, csv_path, header, types, data_dir)
+        kept = [
+            i for i, column in enumerate(columns) if column not in SPOTIFY_TITLE_COLUMNS
+        ]
+        columns = [columns[i] for i in kept] + list(SPOTIFY_TITLE_COLUMNS)
+        unmatched = ("",) + (None,) * (len(SPOTIFY_TITLE_COLUMNS) - 1)
+
+        def enriched(records):
+            for row_number, record in enumerate(records):
+                yield [record[i] for i in kept] + list(
+                    matches.get(row_number, unmatched)
+                )
+
+        records = enriched(records)
+
+    statement = (
+        f"INSERT INTO {table_name} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})"
+    )
+    loaded = 0
+    try:
+        while True:
+            with stage("build.read_csv"):
+                batch = list(itertools.islice(records, LOAD_BATCH_SIZE))
+            if not batch:
+                break
+            with stage("build.load"):
+                cursor.executemany(statement, batch)
+            loaded += len(batch)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return loaded
+
+
+def load_tables_stream(data_dir=DATA_DIR, db_path=DB_PATH, enrich=True):
+    """Loads every CSV through `load_table_stream`, one transaction per table."""
+    connection = raw_connection(db_path)
+    try:
+        for table_name, csv_file in TABLES.items():
+            csv_path = os.path.join(data_dir, csv_file)
+            print(f"Processing {csv_file} -> loading into table '{table_name}'...")
+            try:
+                loaded = load_table_stream(
+                    connection, table_name, csv_path, enrich, data_dir
+                )
+            except FileNotFoundError:
+                print(
+                    f"ERROR: CSV file not found at {csv_path}. Skipping table '{table_name}'."
+                )
+                continue
+            except (csv.Error, sqlite3.Error, OSError, ValueError, KeyError) as e:
+                print(f"An error occurred while processing {csv_file}: {e}")
+                continue
+            if loaded:
+                count(f"rows_loaded.{table_name}", loaded)
+                print(f"Successfully loaded {loaded} rows into '{table_name}'.")
+            else:
+                print(f"'{table_name}' CSV is empty, skipping append.")
+    finally:
+        connection.close()
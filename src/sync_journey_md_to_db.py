@@ -0,0 +1,381 @@
+"""
+Sync journeys/*.md essays back into the data warehouse.
+
+The markdown is read in a single streaming pass. Each step is a run of
+`**Field:** value` list items, and act headings (e.g. `## Act II: The Storm`)
+set the act of the steps that follow them. Step fields are upserted into
+FactJourneyStep in batches, and verification compares per-step content hashes.
+"""
+
+import glob
+import hashlib
+import os
+import re
+from datetime import UTC, datetime
+
+from src.db import raw_connection
+
+# --- Configuration ---
+JOURNEYS_DIR = "journeys"
+# Gemini prompt templates kept next to the journey essays; they are not journeys
+TEMPLATE_FILES = ("journey_prompt_template.md", "joruney_import_prompt.md")
+
+TITLE_RE = re.compile(r"^#\s+(?P<title>.+?)\s*#*\s*$")
+ACT_RE = re.compile(
+    r"^#{2,4}\s*(?:Act|Acto|Part|Movement)\s+(?P<number>[IVXLCDM\d]+)\b\s*[:.\-\u2013\u2014]?\s*(?P<title>.*?)\s*#*\s*$",
+    re.IGNORECASE,
+)
+FIELD_RE = re.compile(
+    r"^\s*(?:[*+\-]|\d+\.)?\s*\*\*(?P<key>[^*]+?):?\*\*:?\s*(?P<value>.*?)\s*$"
+)
+PLAIN_URL_RE = re.compile(
+    r"^\s*(?P<key>Spotify URL|Apple Music URL):\s*(?P<value>\S*)\s*$"
+)
+
+# Markdown field labels -> step keys
+FIELD_ALIASES = {
+    "concerto": "work",
+    "work": "work",
+    "piece": "work",
+    "track": "work",
+    "title": "work",
+    "performer": "performer",
+    "artist": "performer",
+    "album": "album",
+    "label": "label",
+    "release date": "release_date",
+    "release year": "release_date",
+    "spotify": "spotify_url",
+    "spotify url": "spotify_url",
+    "apple music": "apple_music_url",
+    "apple music url": "apple_music_url",
+    "why this recording": "why_this_recording",
+    "curation notes": "curation_notes",
+    "notes": "curation_notes",
+}
+
+# Fields written to FactJourneyStep, and therefore covered by the step hash
+SYNCED_FIELDS = ("act_number", "act_title", "curation_notes", "why_this_recording")
+
+
+def _iter_journey_md(md_path):
+    """Yields ("title" | "act" | "field", payload) events while hashing the raw bytes."""
+    digest = hashlib.sha256()
+    with open(md_path, encoding="utf-8") as f:
+        for raw_line in f:
+            digest.update(raw_line.encode("utf-8"))
+            line = raw_line.rstrip("\n")
+            match = TITLE_RE.match(line)
+            if match:
+                yield "title", match.group("title")
+                continue
+            match = ACT_RE.match(line)
+            if match:
+                yield "act", (match.group("number"), match.group("title") or None)
+                continue
+            match = FIELD_RE.match(line) or PLAIN_URL_RE.match(line)
+            if match:
+                key = FIELD_ALIASES.get(match.group("key").strip().lower())
+                if key:
+                    yield "field", (key, match.group("value").strip())
+    yield "hash", digest.hexdigest()
+
+
+def parse_journey_md_with_hash(md_path):
+    """Single pass over the file. Returns (title, steps, content_hash)."""
+    title = None
+    steps = []
+    current = None
+    act = (None, None)
+    content_hash = None
+    for kind, payload in _iter_journey_md(md_path):
+        if kind == "title" and title is None:
+            title = payload
+        elif kind == "act":
+            act = payload
+            current = None
+        elif kind == "field":
+            key, value = payload
+            # A repeated field means the next step has started
+            if current is None or key in current:
+                current = {"act_number": act[0], "act_title": act[1]}
+                steps.append(current)
+            current[key] = value
+        elif kind == "hash":
+            content_hash = payload
+    for order, step in enumerate(steps, 1):
+        step["step_order"] = order
+    return title, steps, content_hash
+
+
+def parse_journey_md(md_path):
+    """Returns (journey_title, steps) parsed from a journey markdown file."""
+    title, steps, _ = parse_journey_md_with_hash(md_path)
+    return title, steps
+
+
+def step_hash(fields):
+    """Content hash of the synced fields of one step; None and "" hash the same."""
+    digest = hashlib.sha256()
+    for value in fields:
+        digest.update(("" if value is None else str(value)).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+def _normalize_url(url):
+    return url.split("?")[0].rstrip("/") if url else None
+
+
+def _resolve_album_ids(cursor, steps):
+    """Maps steps to AlbumIDs by Spotify URL, then by (AlbumTitle, PerformerName)."""
+    by_url = {}
+    by_title = {}
+    for album_id, title, performer, url in cursor.execute(
+        """
+        SELECT da.AlbumID, da.AlbumTitle, dp.PerformerName, da.SpotifyURL
+        FROM DimAlbum da LEFT JOIN DimPerformer dp ON da.PerformerID = dp.PerformerID
+        """
+    ):
+        if url:
+            by_url[_normalize_url(url)] = album_id
+        if title:
+            by_title[
+                (title.strip().lower(), (performer or "").strip().lower())
+            ] = album_id
+    resolved = {}
+    for step in steps:
+        album_id = by_url.get(_normalize_url(step.get("spotify_url")))
+        if album_id is None and step.get("album"):
+            album_id = by_title.get(
+                (
+                    step["album"].strip().lower(),
+                    (step.get("performer") or "").strip().lower(),
+                )
+            )
+        resolved[step["step_order"]] = album_id
+    return resolved
+
+
+def _connect(conn):
+    return (conn, False) if conn is not None else (raw_connection(), True)
+
+
+def upsert_journey_to_db(journey_id, journey_title, steps, conn=None):
+    """
+    Upserts the journey title and the markdown's step fields with executemany.
+    Existing steps keep their Recording/Album IDs; new steps are inserted with the
+    AlbumID matched from DimAlbum. Pass `conn` to batch several journeys in one
+    transaction (the caller then commits).
+    """
+    conn, owned = _connect(conn)
+    try:
+        cursor = conn.cursor()
+        if journey_title:
+            cursor.execute(
+                """
+                INSERT INTO DimJourney (JourneyID, JourneyName) VALUES (?, ?)
+                ON CONFLICT(JourneyID) DO UPDATE SET JourneyName = excluded.JourneyName
+                """,
+                (journey_id, journey_title),
+            )
+        existing = {
+            row[0]
+            for row in cursor.execute(
+                "SELECT StepOrder FROM FactJourneyStep WHERE JourneyID = ?",
+                (journey_id,),
+            )
+        }
+        updates = [
+            (
+                *(step.get(field) for field in SYNCED_FIELDS),
+                journey_id,
+                step["step_order"],
+            )
+            for step in steps
+            if step["step_order"] in existing
+        ]
+        cursor.executemany(
+            """
+            UPDATE FactJourneyStep
+            SET ActNumber = ?, ActTitle = ?, CurationNotes = ?, WhyThisRecording = ?
+            WHERE JourneyID = ? AND StepOrder = ?
+            """,
+            updates,
+        )
+        new_steps = [step for step in steps if step["step_order"] not in existing]
+        if new_steps:
+            album_ids = _resolve_album_ids(cursor, new_steps)
+            cursor.executemany(
+                """
+                INSERT INTO FactJourneyStep
+                    (JourneyID, StepOrder, AlbumID, ActNumber, ActTitle, CurationNotes, WhyThisRecording)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        journey_id,
+                        step["step_order"],
+                        album_ids[step["step_order"]],
+                        *(step.get(field) for field in SYNCED_FIELDS),
+                    )
+                    for step in new_steps
+                ],
+            )
+        if owned:
+            conn.commit()
+        return len(updates), len(new_steps)
+    finally:
+        if owned:
+            conn.close()
+
+
+def verify_steps_match(journey_id, steps, conn=None):
+    """True when FactJourneyStep holds exactly the parsed steps, by per-step content hash."""
+    conn, owned = _connect(conn)
+    try:
+        db_hashes = [
+            (row[0], step_hash(row[1:]))
+            for row in conn.execute(
+                """
+                SELECT StepOrder, ActNumber, ActTitle, CurationNotes, WhyThisRecording
+                FROM FactJourneyStep WHERE JourneyID = ? ORDER BY StepOrder
+                """,
+                (journey_id,),
+            )
+        ]
+    finally:
+        if owned:
+            conn.close()
+    md_hashes = [
+        (step["step_order"], step_hash(step.get(field) for field in SYNCED_FIELDS))
+        for step in steps
+    ]
+    return db_hashes == md_hashes
+
+
+def verify_md_db_match(journey_id, md_path, conn=None):
+    """True when the stored steps are exactly the markdown's steps, by content hash."""
+    _, steps = parse_journey_md(md_path)
+    return verify_steps_match(journey_id, steps, conn)
+
+
+# --- Incremental directory sync ---
+
+
+def is_journey_markdown(md_path):
+    """True for a journey essay, False for the prompt templates in the same directory."""
+    name = os.path.basename(md_path)
+    return name.endswith(".md") and name not in TEMPLATE_FILES
+
+
+def journey_markdown_paths(journeys_dir=JOURNEYS_DIR):
+    """Returns the sorted journey essay paths in `journeys_dir`, templates excluded."""
+    return sorted(
+        md_path
+        for md_path in glob.glob(os.path.join(journeys_dir, "*.md"))
+        if is_journey_markdown(md_path)
+    )
+
+
+def _ensure_sync_state(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS JourneyMarkdownSync (
+            Path TEXT PRIMARY KEY,
+            JourneyID TEXT,
+            MTime REAL,
+            ContentHash TEXT,
+            SyncedUTC TEXT
+        )
+        """
+    )
+
+
+def sync_journey_files(md_paths, incremental=True, conn=None):
+    """
+    Syncs the given markdown files in one transaction and returns {JourneyID: in_sync}.
+    Pass `conn` to run in the caller's transaction (the caller then commits).
+
+    In incremental mode a file is skipped when its mtime is unchanged, and only
+    re-synced when its content hash differs from the last sync. Prompt templates
+    and files without any steps are not journeys and are never synced.
+    """
+    conn, owned = _connect(conn)
+    results = {}
+    try:
+        _ensure_sync_state(conn)
+        state = {
+            path: (mtime, content_hash)
+            for path, mtime, content_hash in conn.execute(
+                "SELECT Path, MTime, ContentHash FROM JourneyMarkdownSync"
+            )
+        }
+        now_utc = datetime.now(UTC).isoformat()
+        state_rows = []
+        for md_path in filter(is_journey_markdown, md_paths):
+            journey_id = os.path.splitext(os.path.basename(md_path))[0]
+            mtime = os.path.getmtime(md_path)
+            previous = state.get(md_path)
+            if incremental and previous and previous[0] == mtime:
+                continue
+            title, steps, content_hash = parse_journey_md_with_hash(md_path)
+            if not steps:
+                continue
+            if incremental and previous and previous[1] == content_hash:
+                state_rows.append((md_path, journey_id, mtime, content_hash, now_utc))
+                continue
+            upsert_journey_to_db(journey_id, title, steps, conn)
+            results[journey_id] = verify_steps_match(journey_id, steps, conn)
+            state_rows.append((md_path, journey_id, mtime, content_hash, now_utc))
+        conn.executemany(
+            """
+            INSERT INTO JourneyMarkdownSync (Path, JourneyID, MTime, ContentHash, SyncedUTC)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(Path) DO UPDATE SET JourneyID = excluded.JourneyID, MTime = excluded.MTime,
+                ContentHash = excluded.ContentHash, SyncedUTC = excluded.SyncedUTC
+            """,
+            state_rows,
+        )
+        if owned:
+            conn.commit()
+    except Exception:
+        if owned:
+            conn.rollback()
+        raise
+    finally:
+        if owned:
+            conn.close()
+    return results
+
+
+def sync_journeys_dir(journeys_dir=JOURNEYS_DIR, incremental=True):
+    """Syncs every journeys/*.md essay (templates excluded); incremental by default."""
+    md_paths = journey_markdown_paths(journeys_dir)
+    results = sync_journey_files(md_paths, incremental=incremental)
+    for journey_id, match in sorted(results.items()):
+        if match:
+            print(f"Journey markdown and database are in sync for {journey_id}.")
+        else:
+            print(
+                f"WARNING: Journey markdown and database do not match for {journey_id}."
+            )
+    print(
+        f"Synced {len(results)} of {len(md_paths)} journey markdown files"
+        f"{' (unchanged files skipped)' if incremental else ''}."
+    )
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Sync journey markdown files into the music journey database."
+    )
+    parser.add_argument("--dir", default=JOURNEYS_DIR, help="Journeys directory")
+    parser.add_argument(
+        "--full", action="store_true", help="Re-sync every file, changed or not"
+    )
+    args = parser.parse_args()
+    sync_journeys_dir(args.dir, incremental=not args.full)
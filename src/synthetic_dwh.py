@@ -0,0 +1,323 @@
+"""
+Synthetic DWH data at configurable scale.
+
+Writes all nine `TABLES` CSVs with the columns `build_data_warehouse` loads and
+full referential integrity: every step points at an existing recording and
+that recording's album, every recording at an album, movement, work and
+performer, and every bridge row at a real album/movement/recording triple.
+Rows are streamed to disk, so even the large preset (10k journeys, 1M steps,
+200k recordings) needs little memory. The same seed gives the same files.
+"""
+
+import csv
+import os
+import random
+import string
+
+from src.build_dwh import TABLES
+from src.title_matching import title_key
+
+# --- Configuration ---
+DEFAULT_SEED = 42
+
+SCALES = {
+    "small": {"journeys": 100, "steps": 10_000, "recordings": 2_000},
+    "medium": {"journeys": 1_000, "steps": 100_000, "recordings": 20_000},
+    "large": {"journeys": 10_000, "steps": 1_000_000, "recordings": 200_000},
+}
+
+# Size of the other dimensions relative to the number of recordings
+RECORDINGS_PER_ALBUM = 10
+RECORDINGS_PER_WORK = 8
+MOVEMENTS_PER_WORK = 4
+RECORDINGS_PER_PERFORMER = 20
+# Share of journeys that already have a playlist, and of album-level journeys
+PLAYLIST_SHARE = 0.5
+ALBUM_JOURNEY_SHARE = 0.1
+STEPS_PER_ACT = 12
+
+COLUMNS = {
+    "DimMusicalWork": [
+        "WorkID",
+        "WorkType",
+        "Genre",
+        "PrimaryArtist",
+        "Title",
+        "WorkDescription",
+    ],
+    "DimPerformer": ["PerformerID", "PerformerName", "InstrumentOrRole"],
+    "DimMovement": [
+        "MovementID",
+        "WorkID",
+        "MovementNumber",
+        "MovementTitle",
+        "MovementDescription",
+    ],
+    "DimAlbum": [
+        "AlbumID",
+        "AlbumTitle",
+        "PerformerID",
+        "RecordingLabel",
+        "SpotifyURL",
+        "SpotifyTitle",
+        "SpotifyTitleKey",
+        "SpotifyTitleScore",
+        "SpotifyTitleReason",
+        "SpotifyReleaseDate",
+        "SpotifyGenre",
+    ],
+    "DimRecording": [
+        "RecordingID",
+        "AlbumID",
+        "MovementID",
+        "WorkID",
+        "PerformerID",
+        "SpotifyURL",
+        "SpotifyTitle",
+        "SpotifyTitleKey",
+        "SpotifyTitleScore",
+        "SpotifyTitleReason",
+    ],
+    "DimJourney": [
+        "JourneyID",
+        "JourneyName",
+        "JourneyDescription",
+        "CreatorName",
+        "Granularity",
+        "JourneyTheme",
+    ],
+    "FactJourneyStep": [
+        "JourneyStepID",
+        "JourneyID",
+        "RecordingID",
+        "AlbumID",
+        "StepOrder",
+        "ActNumber",
+        "ActTitle",
+        "CurationNotes",
+        "WhyThisRecording",
+    ],
+    "DimPlaylist": [
+        "JourneyID",
+        "ServiceID",
+        "SpotifyPlaylistURL",
+        "SpotifyPlaylistTitle",
+        "LastUpdatedUTC",
+    ],
+    "BridgeAlbumMovement": ["album_id", "movement_id", "track_number", "recording_id"],
+}
+
+WORK_TYPES = ("Symphony", "Concerto", "Sonata", "String Quartet", "Suite", "Mass")
+GENRES = ("Baroque", "Classical", "Romantic", "Modern", "Contemporary")
+ROLES = ("Orchestra", "Conductor", "Piano", "Violin", "Cello", "Soprano", "Ensemble")
+LABELS = ("Deutsche Grammophon", "Decca", "Harmonia Mundi", "ECM New Series", "BIS")
+TEMPOS = ("Allegro", "Adagio", "Andante", "Presto", "Largo", "Scherzo", "Finale")
+THEMES = ("Dawn", "Storm", "Night", "Memory", "Journey", "Light", "Silence")
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def _spotify_id(rng):
+    return "".join(rng.choices(_ID_ALPHABET, k=22))
+
+
+def _write(data_dir, table_name, rows):
+    path = os.path.join(data_dir, TABLES[table_name])
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS[table_name])
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def generate_synthetic_dwh(
+    data_dir, journeys=100, steps=10_000, recordings=2_000, seed=DEFAULT_SEED
+):
+    """
+    Writes the nine DWH CSVs into `data_dir` and returns {table name: row count}.
+    Steps are spread evenly over the journeys; the other dimensions are sized
+    from the number of recordings.
+    """
+    if journeys < 1 or recordings < 1 or steps < journeys:
+        raise ValueError(
+            "Need at least one journey, one recording and one step per journey."
+        )
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(seed)
+    works = max(1, recordings // RECORDINGS_PER_WORK)
+    movements = works * MOVEMENTS_PER_WORK
+    albums = max(1, recordings // RECORDINGS_PER_ALBUM)
+    performers = max(1, recordings // RECORDINGS_PER_PERFORMER)
+    counts = {}
+
+    def work_id(n):
+        return f"W{n:07d}"
+
+    def movement_id(n):
+        return f"{work_id(n // MOVEMENTS_PER_WORK + 1)}-M{n % MOVEMENTS_PER_WORK + 1}"
+
+    def movement_title(n):
+        return f"{n % MOVEMENTS_PER_WORK + 1}. {TEMPOS[n % len(TEMPOS)]}"
+
+    # Few distinct movement titles, so their keys are computed once each
+    movement_keys = {}
+
+    def movement_key(n):
+        title = movement_title(n)
+        if title not in movement_keys:
+            movement_keys[title] = title_key(title)
+        return movement_keys[title]
+
+    counts["DimMusicalWork"] = _write(
+        data_dir,
+        "DimMusicalWork",
+        (
+            (
+                work_id(n),
+                WORK_TYPES[n % len(WORK_TYPES)],
+                GENRES[n % len(GENRES)],
+                f"Composer {n % 500 + 1}",
+                f"{WORK_TYPES[n % len(WORK_TYPES)]} No. {n}",
+                f"Synthetic work {n}.",
+            )
+            for n in range(1, works + 1)
+        ),
+    )
+    counts["DimPerformer"] = _write(
+        data_dir,
+        "DimPerformer",
+        (
+            (n, f"Performer {n}", ROLES[n % len(ROLES)])
+            for n in range(1, performers + 1)
+        ),
+    )
+    counts["DimMovement"] = _write(
+        data_dir,
+        "DimMovement",
+        (
+            (
+                movement_id(n),
+                work_id(n // MOVEMENTS_PER_WORK + 1),
+                n % MOVEMENTS_PER_WORK + 1,
+                movement_title(n),
+                f"Synthetic movement {n}.",
+            )
+            for n in range(movements)
+        ),
+    )
+
+    album_performers = [0] + [rng.randint(1, performers) for _ in range(albums)]
+    counts["DimAlbum"] = _write(
+        data_dir,
+        "DimAlbum",
+        (
+            (
+                n,
+                f"Album {n}",
+                album_performers[n],
+                LABELS[n % len(LABELS)],
+                f"https://open.spotify.com/album/{_spotify_id(rng)}",
+                f"Album {n}",
+                title_key(f"Album {n}"),
+                1.0,
+                "exact",
+                rng.randint(1950, 2025),
+                GENRES[n % len(GENRES)],
+            )
+            for n in range(1, albums + 1)
+        ),
+    )
+
+    # Recording n sits on album ((n - 1) % albums) + 1 and plays one movement
+    recording_albums = [0] + [(n - 1) % albums + 1 for n in range(1, recordings + 1)]
+    recording_movements = [0] + [rng.randrange(movements) for _ in range(recordings)]
+    counts["DimRecording"] = _write(
+        data_dir,
+        "DimRecording",
+        (
+            (
+                n,
+                recording_albums[n],
+                movement_id(recording_movements[n]),
+                work_id(recording_movements[n] // MOVEMENTS_PER_WORK + 1),
+                album_performers[recording_albums[n]],
+                f"https://open.spotify.com/track/{_spotify_id(rng)}",
+                movement_title(recording_movements[n]),
+                movement_key(recording_movements[n]),
+                1.0,
+                "exact",
+            )
+            for n in range(1, recordings + 1)
+        ),
+    )
+    counts["BridgeAlbumMovement"] = _write(
+        data_dir,
+        "BridgeAlbumMovement",
+        (
+            (
+                recording_albums[n],
+                movement_id(recording_movements[n]),
+                (n - 1) // albums + 1,
+                n,
+            )
+            for n in range(1, recordings + 1)
+        ),
+    )
+
+    journey_ids = [f"SYN{n:06d}" for n in range(1, journeys + 1)]
+    counts["DimJourney"] = _write(
+        data_dir,
+        "DimJourney",
+        (
+            (
+                journey_id,
+                f"Synthetic Journey {n}",
+                f"A synthetic journey through {THEMES[n % len(THEMES)].lower()}.",
+                "benchmark",
+                "Album" if rng.random() < ALBUM_JOURNEY_SHARE else "Track",
+                THEMES[n % len(THEMES)],
+            )
+            for n, journey_id in enumerate(journey_ids, 1)
+        ),
+    )
+
+    def step_rows():
+        step_id = 0
+        per_journey, extra = divmod(steps, journeys)
+        for n, journey_id in enumerate(journey_ids):
+            for order in range(1, per_journey + (n < extra) + 1):
+                step_id += 1
+                recording = rng.randint(1, recordings)
+                act = (order - 1) // STEPS_PER_ACT + 1
+                yield (
+                    step_id,
+                    journey_id,
+                    recording,
+                    recording_albums[recording],
+                    order,
+                    act,
+                    f"Act {act}",
+                    f"Step {order} of {journey_id}.",
+                    "Synthetic benchmark step.",
+                )
+
+    counts["FactJourneyStep"] = _write(data_dir, "FactJourneyStep", step_rows())
+    counts["DimPlaylist"] = _write(
+        data_dir,
+        "DimPlaylist",
+        (
+            (
+                journey_id,
+                "Spotify",
+                _spotify_id(rng),
+                f"Synthetic Journey {n}",
+                "2024-01-01T00:00:00+00:00",
+            )
+            for n, journey_id in enumerate(journey_ids, 1)
+            if rng.random() < PLAYLIST_SHARE
+        ),
+    )
+    return counts
@@ -0,0 +1,437 @@
+"""
+Data-quality validation of the whole DWH.
+
+Every structural check (referential integrity between the fact, dimension and
+bridge tables, duplicated or missing step orders, journeys without a name or
+with an unknown granularity) and every format check (Spotify album, track and
+playlist URLs) is one set-based SQL query over its table, run in a single read
+transaction. Only album and track URLs that pass the format checks are then
+looked up on Spotify, in batches through `fetch_items`, to find IDs Spotify no
+longer knows.
+
+The result is written as a JSON report: per check its severity, the number of
+offending rows and a sample of them. Errors are structural problems that break
+playlist sync or essay generation; warnings are worth a look but don't.
+"""
+
+import json
+import os
+import time
+from datetime import UTC, datetime
+
+from sqlalchemy import text
+
+from src.db import DB_PATH, OUTPUT_DIR, get_engine
+from src.instrumentation import count, stage
+from src.logger import setup_logger
+
+# --- Configuration ---
+REPORT_PATH = os.path.join(OUTPUT_DIR, "validation-report.json")
+SAMPLE_SIZE = 20
+
+SPOTIFY_ID_GLOB = "[0-9A-Za-z]" * 22
+TRACK_URL_GLOB = f"https://open.spotify.com/track/{SPOTIFY_ID_GLOB}"
+ALBUM_URL_GLOB = f"https://open.spotify.com/album/{SPOTIFY_ID_GLOB}"
+# DimPlaylist holds the playlist ID (sync) or its full URL (import)
+PLAYLIST_URL_GLOBS = (
+    SPOTIFY_ID_GLOB,
+    f"https://open.spotify.com/playlist/{SPOTIFY_ID_GLOB}",
+)
+GRANULARITIES = ("Album", "Track")
+
+
+def _missing(table, column, parent_table, parent_column, key):
+    """Rows of `table` whose non-NULL `column` has no `parent_table` row."""
+    return f"""
+        SELECT t.{key}, t.{column} FROM {table} t
+        WHERE t.{column} IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM {parent_table} p WHERE p.{parent_column} = t.{column}
+          )
+    """
+
+
+# (name, severity, table, description, query returning the offending rows)
+CHECKS = (
+    (
+        "step_orphan_journey",
+        "error",
+        "FactJourneyStep",
+        "Steps whose JourneyID is not in DimJourney.",
+        _missing(
+            "FactJourneyStep", "JourneyID", "DimJourney", "JourneyID", "JourneyStepID"
+        ),
+    ),
+    (
+        "step_missing_recording",
+        "error",
+        "FactJourneyStep",
+        "Steps whose RecordingID is not in DimRecording.",
+        _missing(
+            "FactJourneyStep",
+            "RecordingID",
+            "DimRecording",
+            "RecordingID",
+            "JourneyStepID",
+        ),
+    ),
+    (
+        "step_missing_album",
+        "error",
+        "FactJourneyStep",
+        "Steps whose AlbumID is not in DimAlbum.",
+        _missing("FactJourneyStep", "AlbumID", "DimAlbum", "AlbumID", "JourneyStepID"),
+    ),
+    (
+        "step_without_item",
+        "error",
+        "FactJourneyStep",
+        "Steps with neither a RecordingID nor an AlbumID.",
+        """
+        SELECT JourneyStepID, JourneyID FROM FactJourneyStep
+        WHERE RecordingID IS NULL AND AlbumID IS NULL
+        """,
+    ),
+    (
+        "step_missing_order",
+        "error",
+        "FactJourneyStep",
+        "Steps without a StepOrder.",
+        """
+        SELECT JourneyStepID, JourneyID FROM FactJourneyStep WHERE StepOrder IS NULL
+        """,
+    ),
+    (
+        "step_duplicate_order",
+        "error",
+        "FactJourneyStep",
+        "StepOrder values used by more than one step of a journey.",
+        """
+        SELECT JourneyID, StepOrder, COUNT(*) AS Steps FROM FactJourneyStep
+        WHERE StepOrder IS NOT NULL
+        GROUP BY JourneyID, StepOrder HAVING COUNT(*) > 1
+        """,
+    ),
+    (
+        "journey_without_steps",
+        "warning",
+        "DimJourney",
+        "Journeys with no steps.",
+        """
+        SELECT j.JourneyID, j.JourneyName FROM DimJourney j
+        WHERE NOT EXISTS (SELECT 1 FROM FactJourneyStep f WHERE f.JourneyID = j.JourneyID)
+        """,
+    ),
+    (
+        "journey_missing_name",
+        "error",
+        "DimJourney",
+        "Journeys without a JourneyName.",
+        """
+        SELECT JourneyID, JourneyName FROM DimJourney
+        WHERE JourneyName IS NULL OR TRIM(JourneyName) = ''
+        """,
+    ),
+    (
+        "journey_unknown_granularity",
+        "error",
+        "DimJourney",
+        f"Journeys whose Granularity is not one of {', '.join(GRANULARITIES)}.",
+        f"""
+        SELECT JourneyID, Granularity FROM DimJourney
+        WHERE Granularity IS NULL
+           OR Granularity NOT IN ({', '.join(f"'{g}'" for g in GRANULARITIES)})
+        """,
+    ),
+    (
+        "recording_missing_album",
+        "error",
+        "DimRecording",
+        "Recordings whose AlbumID is not in DimAlbum.",
+        _missing("DimRecording", "AlbumID", "DimAlbum", "AlbumID", "RecordingID"),
+    ),
+    (
+        "recording_missing_movement",
+        "error",
+        "DimRecording",
+        "Recordings whose MovementID is not in DimMovement.",
+        _missing(
+            "DimRecording", "MovementID", "DimMovement", "MovementID", "RecordingID"
+        ),
+    ),
+    (
+        "recording_missing_work",
+        "error",
+        "DimRecording",
+        "Recordings whose WorkID is not in DimMusicalWork.",
+        _missing("DimRecording", "WorkID", "DimMusicalWork", "WorkID", "RecordingID"),
+    ),
+    (
+        "recording_missing_performer",
+        "error",
+        "DimRecording",
+        "Recordings whose PerformerID is not in DimPerformer.",
+        _missing(
+            "DimRecording", "PerformerID", "DimPerformer", "PerformerID", "RecordingID"
+        ),
+    ),
+    (
+        "movement_missing_work",
+        "error",
+        "DimMovement",
+        "Movements whose WorkID is not in DimMusicalWork.",
+        _missing("DimMovement", "WorkID", "DimMusicalWork", "WorkID", "MovementID"),
+    ),
+    (
+        "album_missing_performer",
+        "error",
+        "DimAlbum",
+        "Albums whose PerformerID is not in DimPerformer.",
+        _missing("DimAlbum", "PerformerID", "DimPerformer", "PerformerID", "AlbumID"),
+    ),
+    (
+        "bridge_missing_album",
+        "error",
+        "BridgeAlbumMovement",
+        "Bridge rows whose album_id is not in DimAlbum.",
+        _missing(
+            "BridgeAlbumMovement", "album_id", "DimAlbum", "AlbumID", "recording_id"
+        ),
+    ),
+    (
+        "bridge_missing_movement",
+        "error",
+        "BridgeAlbumMovement",
+        "Bridge rows whose movement_id is not in DimMovement.",
+        _missing(
+            "BridgeAlbumMovement",
+            "movement_id",
+            "DimMovement",
+            "MovementID",
+            "recording_id",
+        ),
+    ),
+    (
+        "bridge_missing_recording",
+        "error",
+        "BridgeAlbumMovement",
+        "Bridge rows whose recording_id is not in DimRecording.",
+        _missing(
+            "BridgeAlbumMovement",
+            "recording_id",
+            "DimRecording",
+            "RecordingID",
+            "album_id",
+        ),
+    ),
+    (
+        "playlist_orphan_journey",
+        "warning",
+        "DimPlaylist",
+        "Playlists whose JourneyID is not in DimJourney.",
+        _missing("DimPlaylist", "JourneyID", "DimJourney", "JourneyID", "ServiceID"),
+    ),
+    (
+        "recording_url_format",
+        "error",
+        "DimRecording",
+        "Recording SpotifyURLs that are not https://open.spotify.com/track/<22-character ID>.",
+        f"""
+        SELECT RecordingID, SpotifyURL FROM DimRecording
+        WHERE SpotifyURL IS NOT NULL AND SpotifyURL NOT GLOB '{TRACK_URL_GLOB}'
+        """,
+    ),
+    (
+        "album_url_format",
+        "error",
+        "DimAlbum",
+        "Album SpotifyURLs that are not https://open.spotify.com/album/<22-character ID>.",
+        f"""
+        SELECT AlbumID, SpotifyURL FROM DimAlbum
+        WHERE SpotifyURL IS NOT NULL AND SpotifyURL NOT GLOB '{ALBUM_URL_GLOB}'
+        """,
+    ),
+    (
+        "playlist_url_format",
+        "warning",
+        "DimPlaylist",
+        "Spotify playlist references that are neither a playlist ID nor its URL.",
+        f"""
+        SELECT JourneyID, SpotifyPlaylistURL FROM DimPlaylist
+        WHERE ServiceID = 'Spotify' AND SpotifyPlaylistURL IS NOT NULL
+          AND {' AND '.join(f"SpotifyPlaylistURL NOT GLOB '{g}'" for g in PLAYLIST_URL_GLOBS)}
+        """,
+    ),
+    (
+        "track_step_without_url",
+        "warning",
+        "FactJourneyStep",
+        "Steps of track journeys whose recording has no SpotifyURL (left out of the playlist).",
+        """
+        SELECT f.JourneyStepID, f.JourneyID FROM FactJourneyStep f
+        JOIN DimJourney j ON j.JourneyID = f.JourneyID
+        JOIN DimRecording r ON r.RecordingID = f.RecordingID
+        WHERE j.Granularity = 'Track' AND r.SpotifyURL IS NULL
+        """,
+    ),
+    (
+        "spotify_title_mismatch",
+        "warning",
+        "DimRecording",
+        "Recordings whose Spotify track title did not match the movement title at build time, even after normalization.",
+        """
+        SELECT RecordingID, SpotifyURL, SpotifyTitle, SpotifyTitleScore FROM DimRecording
+        WHERE SpotifyTitleReason = 'mismatch'
+        """,
+    ),
+)
+CHECK_QUERIES = {name: text(query) for name, _, _, _, query in CHECKS}
+
+# URLs that passed the format checks, for the Spotify existence check
+SPOTIFY_URLS_QUERIES = {
+    "track": text(
+        f"""
+        SELECT DISTINCT SpotifyURL FROM DimRecording
+        WHERE SpotifyURL GLOB '{TRACK_URL_GLOB}'
+        """
+    ),
+    "album": text(
+        f"""
+        SELECT DISTINCT SpotifyURL FROM DimAlbum WHERE SpotifyURL GLOB '{ALBUM_URL_GLOB}'
+        """
+    ),
+}
+
+
+def _json_value(value):
+    return (
+        value if value is None or isinstance(value, (int, float, str)) else str(value)
+    )
+
+
+def run_checks(connection, sample_size=SAMPLE_SIZE):
+    """Runs every check in CHECKS; returns one result per check."""
+    results = []
+    for name, severity, table, description, _ in CHECKS:
+        with stage("validate.check"):
+            result = connection.execute(CHECK_QUERIES[name])
+            columns = list(result.keys())
+            offending = 0
+            sample = []
+            for row in result:
+                offending += 1
+                if len(sample) < sample_size:
+                    sample.append({c: _json_value(v) for c, v in zip(columns, row)})
+        count(f"validate.{severity}_rows", offending)
+        results.append(
+            {
+                "name": name,
+                "severity": severity,
+                "table": table,
+                "description": description,
+                "count": offending,
+                "sample": sample,
+            }
+        )
+    return results
+
+
+def check_spotify_urls(connection, logger, sample_size=SAMPLE_SIZE):
+    """
+    Looks up every well-formed album and track URL on Spotify in batches.
+    Returns, per kind, the URLs checked, not found, and left unchecked (rate
+    limit, outage).
+    """
+    # Only the Spotify check needs spotipy
+    from spotipy.exceptions import SpotifyBaseException
+
+    from src.spotify_client import fetch_items, get_spotify_client
+
+    try:
+        sp = get_spotify_client()
+    except (SpotifyBaseException, OSError) as e:
+        logger.error(
+            "Could not connect to Spotify; skipping the existence check: %s", e
+        )
+        return None
+
+    report = {}
+    for kind, query in SPOTIFY_URLS_QUERIES.items():
+        urls = [row[0] for row in connection.execute(query)]
+        ids = {url: url.rsplit("/", 1)[1] for url in urls}
+        with stage("validate.spotify"):
+            found = fetch_items(sp, kind, ids.values())
+        not_found = [
+            url
+            for url, item_id in ids.items()
+            if item_id in found and found[item_id] is None
+        ]
+        unchecked = sum(1 for item_id in ids.values() if item_id not in found)
+        report[kind] = {
+            "checked": len(ids) - unchecked,
+            "not_found": len(not_found),
+            "unchecked": unchecked,
+            "sample": not_found[:sample_size],
+        }
+    return report
+
+
+def validate_dwh(db_path=DB_PATH, output=REPORT_PATH, spotify=True):
+    """
+    Validates the DWH at `db_path` and writes the JSON report to `output`.
+    With spotify=False the Spotify existence check is skipped. Returns the
+    report; report["ok"] is False when an error-severity check failed or a
+    Spotify URL was not found.
+    """
+    logger = setup_logger()
+    started_utc = datetime.now(UTC).isoformat()
+    started = time.perf_counter()
+    engine = get_engine(db_path)
+
+    with engine.connect() as connection:
+        checks = run_checks(connection)
+        spotify_report = check_spotify_urls(connection, logger) if spotify else None
+
+    error_rows = sum(c["count"] for c in checks if c["severity"] == "error")
+    warning_rows = sum(c["count"] for c in checks if c["severity"] == "warning")
+    not_found = sum(kind["not_found"] for kind in (spotify_report or {}).values())
+    report = {
+        "db_path": db_path,
+        "started_utc": started_utc,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        "ok": not error_rows and not not_found,
+        "summary": {
+            "error_rows": error_rows,
+            "warning_rows": warning_rows,
+            "spotify_not_found": not_found,
+        },
+        "checks": checks,
+        "spotify": spotify_report,
+    }
+
+    for check in checks:
+        if check["count"]:
+            log = logger.error if check["severity"] == "error" else logger.warning
+            log("%s: %s rows. %s", check["name"], check["count"], check["description"])
+    for kind, stats in (spotify_report or {}).items():
+        log = logger.error if stats["not_found"] else logger.info
+        log(
+            "Spotify %ss: %s checked, %s not found, %s unchecked.",
+            kind,
+            stats["checked"],
+            stats["not_found"],
+            stats["unchecked"],
+        )
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info(
+        "Validation %s: %s error rows, %s warning rows in %.0f ms. Report written to %s",
+        "passed" if report["ok"] else "failed",
+        error_rows,
+        warning_rows,
+        report["elapsed_ms"],
+        output,
+    )
+    return report
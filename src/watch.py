@@ -0,0 +1,241 @@
+"""
+Watch mode: keeps the DWH and Spotify in step with edits as they happen.
+
+data/*.csv and journeys/*.md are polled for content changes. A burst of edits
+is coalesced until the files have been quiet for the debounce window, then
+changed CSVs are applied as row-level deltas, changed markdown is synced, and
+only the journeys recorded in the change log are re-synced to Spotify. One
+Spotify client and pooled SQLite connections are reused for the whole session.
+"""
+
+import csv
+import glob
+import hashlib
+import os
+import sqlite3
+import time
+
+from spotipy.exceptions import SpotifyException
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.build_dwh import DATA_DIR, TABLES, apply_csv_delta
+from src.catalog_index import refresh_catalog_index
+from src.change_log import (
+    advance_consumer,
+    consumer_cursor,
+    current_seq,
+    ensure_change_log,
+    pending_journeys,
+    record_journey_changes,
+)
+from src.db import get_engine, raw_connection
+from src.logger import setup_logger
+from src.spotify_playlists import connect_spotify, sync_journey_playlist
+from src.sync_journey_md_to_db import (
+    JOURNEYS_DIR,
+    is_journey_markdown,
+    sync_journey_files,
+)
+
+# --- Configuration ---
+POLL_INTERVAL_SECONDS = 1.0
+DEBOUNCE_SECONDS = 2.0
+WATCH_CONSUMER = "watch"
+
+# Tables whose rows feed the local catalog index
+CATALOG_TABLES = {"DimAlbum", "DimPerformer"}
+CSV_TABLES = {csv_file: table_name for table_name, csv_file in TABLES.items()}
+# Errors that fail one batch of edits without stopping the watcher; requests' errors are OSErrors
+BATCH_ERRORS = (
+    SQLAlchemyError,
+    sqlite3.Error,
+    SpotifyException,
+    OSError,
+    csv.Error,
+    ValueError,
+    KeyError,
+)
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_watched(path):
+    """True for every matched file except the prompt templates next to the journeys."""
+    return not path.endswith(".md") or is_journey_markdown(path)
+
+
+class FileWatcher:
+    """Tracks files by (mtime, size) and reports those whose content hash changed."""
+
+    def __init__(self, patterns, include=is_watched):
+        self.patterns = patterns
+        self.include = include
+        self.known = {}
+        # The first poll only records the baseline
+        self.poll()
+
+    def poll(self):
+        """Returns the paths created, edited or removed since the last poll."""
+        changed = []
+        paths = set()
+        for pattern in self.patterns:
+            paths.update(filter(self.include, glob.glob(pattern)))
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime, stat.st_size)
+            previous = self.known.get(path)
+            if previous and previous[0] == signature:
+                continue
+            # Only files whose mtime or size moved are re-hashed
+            content_hash = _file_hash(path)
+            self.known[path] = (signature, content_hash)
+            if not previous or previous[1] != content_hash:
+                changed.append(path)
+        for path in set(self.known) - paths:
+            del self.known[path]
+            changed.append(path)
+        return changed
+
+
+def apply_changes(engine, md_connection, paths, logger):
+    """Applies changed CSVs as deltas and syncs changed markdown; returns True if the DB changed."""
+    # CSVs are applied in build order
+    load_order = list(TABLES.values())
+    csv_paths = sorted(
+        (
+            path
+            for path in paths
+            if os.path.basename(path) in CSV_TABLES and os.path.exists(path)
+        ),
+        key=lambda path: load_order.index(os.path.basename(path)),
+    )
+    md_paths = sorted(
+        path
+        for path in paths
+        if path.endswith(".md") and is_journey_markdown(path) and os.path.exists(path)
+    )
+    touched_tables = set()
+    if csv_paths:
+        with engine.begin() as connection:
+            for path in csv_paths:
+                table_name = CSV_TABLES[os.path.basename(path)]
+                inserted, updated, deleted = apply_csv_delta(
+                    connection, table_name, path
+                )
+                logger.info(
+                    "%s: %s inserted, %s updated, %s deleted.",
+                    table_name,
+                    inserted,
+                    updated,
+                    deleted,
+                )
+                if inserted or updated or deleted:
+                    touched_tables.add(table_name)
+    if md_paths:
+        # The markdown sync runs in md_connection's transaction
+        try:
+            results = sync_journey_files(md_paths, incremental=True, conn=md_connection)
+            md_connection.commit()
+        except Exception:
+            md_connection.rollback()
+            raise
+        for journey_id, match in sorted(results.items()):
+            if not match:
+                logger.warning(
+                    "Journey markdown and database do not match for %s.", journey_id
+                )
+        logger.info("Synced %s changed journey markdown files.", len(results))
+    if touched_tables & CATALOG_TABLES:
+        refresh_catalog_index(engine, logger)
+    return bool(touched_tables or md_paths)
+
+
+def sync_changed_journeys(engine, sp, user_id, logger):
+    """Re-syncs the Spotify playlists of the journeys changed since the last pass."""
+    with engine.begin() as connection:
+        changed, high_seq = pending_journeys(connection, WATCH_CONSUMER)
+        if not changed:
+            advance_consumer(connection, WATCH_CONSUMER, high_seq)
+            return []
+        journeys = connection.execute(
+            text(
+                "SELECT JourneyID, JourneyName, JourneyDescription, Granularity "
+                "FROM DimJourney WHERE JourneyID IN :journey_ids"
+            ).bindparams(bindparam("journey_ids", expanding=True)),
+            {"journey_ids": changed},
+        ).fetchall()
+    logger.info("Re-syncing %s changed journeys to Spotify.", len(journeys))
+    failed = [
+        journey[0]
+        for journey in journeys
+        if sync_journey_playlist(engine, sp, user_id, journey, logger) is False
+    ]
+    with engine.begin() as connection:
+        advance_consumer(connection, WATCH_CONSUMER, high_seq)
+        record_journey_changes(connection, failed, source="retry")
+    return [journey[0] for journey in journeys]
+
+
+def watch(
+    interval=POLL_INTERVAL_SECONDS, debounce=DEBOUNCE_SECONDS, sync_playlists=True
+):
+    """Runs until interrupted, applying edits and syncing the journeys they affect."""
+    logger = setup_logger()
+    engine = get_engine()
+    # Pooled connection kept checked out for the raw markdown sync
+    md_connection = raw_connection()
+    with engine.begin() as connection:
+        ensure_change_log(connection)
+        if consumer_cursor(connection, WATCH_CONSUMER) is None:
+            advance_consumer(connection, WATCH_CONSUMER, current_seq(connection))
+
+    sp = user_id = None
+    if sync_playlists:
+        sp, user_id = connect_spotify(logger)
+        if not sp:
+            logger.warning("Watching without Spotify sync.")
+
+    watcher = FileWatcher(
+        [os.path.join(DATA_DIR, "*.csv"), os.path.join(JOURNEYS_DIR, "*.md")]
+    )
+    logger.info(
+        "Watching %s/*.csv and %s/*.md (poll %ss, debounce %ss). Press Ctrl+C to stop.",
+        DATA_DIR,
+        JOURNEYS_DIR,
+        interval,
+        debounce,
+    )
+    pending = set()
+    last_change = None
+    try:
+        while True:
+            changed = watcher.poll()
+            if changed:
+                pending.update(changed)
+                last_change = time.monotonic()
+            if pending and time.monotonic() - last_change >= debounce:
+                batch, pending = pending, set()
+                started = time.monotonic()
+                logger.info("Applying %s changed files.", len(batch))
+                try:
+                    apply_changes(engine, md_connection, batch, logger)
+                    if sp:
+                        sync_changed_journeys(engine, sp, user_id, logger)
+                except BATCH_ERRORS as e:
+                    logger.error("Failed to apply changes: %s", e)
+                logger.info("Changes applied in %.2fs.", time.monotonic() - started)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching.")
+    finally:
+        md_connection.close()
@@ -0,0 +1,27 @@
+import pytest
+
+import src.logger
+from src.build_dwh import build_data_warehouse
+from src.db import DB_PATH
+from src.synthetic_dwh import generate_synthetic_dwh
+
+
+@pytest.fixture(autouse=True, scope="session")
+def log_file(tmp_path_factory):
+    """Keeps the JSON-lines log of the test run out of the repository's output/."""
+    path = tmp_path_factory.mktemp("logs") / "music_journey.log.jsonl"
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(src.logger, "LOG_FILE", str(path))
+        yield path
+
+
+@pytest.fixture
+def dwh(tmp_path, monkeypatch):
+    """
+    Builds a small synthetic DWH at the default `output/` path inside a temporary
+    working directory, so modules using `get_engine()` pick it up. Returns the DB path.
+    """
+    monkeypatch.chdir(tmp_path)
+    generate_synthetic_dwh("data", journeys=3, steps=30, recordings=40)
+    build_data_warehouse("data", DB_PATH, enrich=False)
+    return tmp_path / DB_PATH
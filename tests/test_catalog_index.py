@@ -0,0 +1,89 @@
+import sqlite3
+
+from src.catalog_index import fold, lookup_album_urls, refresh_catalog_index
+from src.db import get_engine
+
+
+def _album(dwh, album_id):
+    with sqlite3.connect(dwh) as connection:
+        return connection.execute(
+            "SELECT dp.PerformerName, da.AlbumTitle, da.SpotifyURL "
+            "FROM DimAlbum da JOIN DimPerformer dp ON dp.PerformerID = da.PerformerID "
+            "WHERE da.AlbumID = ?",
+            (album_id,),
+        ).fetchone()
+
+
+def test_fold_strips_case_diacritics_and_punctuation():
+    assert fold("Dvořák: Symphony No. 9 — “New World”") == (
+        "dvorak symphony no 9 new world"
+    )
+    assert fold(None) == ""
+
+
+def test_lookup_album_urls_matches_locally(dwh):
+    performer, album, url = _album(dwh, 1)
+    pairs = [
+        (performer, album),
+        (performer.upper(), f"  {album.upper()}!"),
+        ("Nobody Known", album),
+        ("", album),
+        (performer, "Al"),
+    ]
+
+    found = lookup_album_urls(pairs, str(dwh))
+
+    assert found == {pairs[0]: url, pairs[1]: url, pairs[3]: url}
+
+
+def test_lookup_album_urls_without_a_dwh(tmp_path):
+    assert lookup_album_urls([("A", "B")], str(tmp_path / "missing.db")) == {}
+
+
+def test_generic_and_movement_titles_do_not_resolve(dwh):
+    performer, album, _ = _album(dwh, 1)
+    with sqlite3.connect(dwh) as connection:
+        (movement,) = connection.execute(
+            "SELECT dm.MovementTitle FROM BridgeAlbumMovement bam "
+            "JOIN DimMovement dm ON dm.MovementID = bam.movement_id "
+            "WHERE bam.album_id = 1 LIMIT 1"
+        ).fetchone()
+    generic = album.split()[0]
+    pairs = [(performer, generic), ("", generic), (performer, movement)]
+
+    assert lookup_album_urls(pairs, str(dwh)) == {}
+
+
+def test_refresh_reindexes_only_changed_albums(dwh, capsys):
+    performer, album, url = _album(dwh, 1)
+    with sqlite3.connect(dwh) as connection:
+        connection.execute(
+            "UPDATE DimAlbum SET AlbumTitle = 'Nocturnes Complete' WHERE AlbumID = 1"
+        )
+        connection.execute(
+            "UPDATE DimPerformer SET PerformerName = 'Maria Pires' "
+            "WHERE PerformerID = (SELECT PerformerID FROM DimAlbum WHERE AlbumID = 1)"
+        )
+        changed = {1, 2} | {
+            album_id
+            for (album_id,) in connection.execute(
+                "SELECT AlbumID FROM DimAlbum WHERE PerformerID = "
+                "(SELECT PerformerID FROM DimAlbum WHERE AlbumID = 1)"
+            )
+        }
+        connection.execute("DELETE FROM DimAlbum WHERE AlbumID = 2")
+
+    refresh_catalog_index(get_engine(str(dwh)))
+
+    assert f"updated for {len(changed)} changed albums" in capsys.readouterr().out
+    found = lookup_album_urls(
+        [("Maria Pires", "Nocturnes Complete"), (performer, album)], str(dwh)
+    )
+    assert found == {("Maria Pires", "Nocturnes Complete"): url}
+    with sqlite3.connect(dwh) as connection:
+        assert connection.execute(
+            "SELECT COUNT(*) FROM CatalogIndex WHERE rowid = 2"
+        ).fetchone() == (0,)
+        assert connection.execute(
+            "SELECT COUNT(*) FROM CatalogIndexPending"
+        ).fetchone() == (0,)
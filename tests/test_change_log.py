@@ -0,0 +1,93 @@
+from sqlalchemy import text
+
+from src.change_log import (
+    advance_consumer,
+    consumer_cursor,
+    current_seq,
+    journeys_changed_since,
+    parse_changed_since,
+    prune_change_log,
+    register_consumer,
+    select_changed_journeys,
+)
+from src.db import get_engine
+from src.journey_step_wide import WIDE_CONSUMER, ensure_fresh_journey
+
+
+def _rename(connection, journey_ids):
+    for journey_id in journey_ids:
+        connection.execute(
+            text(
+                "UPDATE DimJourney SET JourneyName = 'Renamed' WHERE JourneyID = :jid"
+            ),
+            {"jid": journey_id},
+        )
+
+
+def test_read_path_refresh_keeps_changes_for_changed_since_readers(dwh):
+    engine = get_engine()
+    with engine.begin() as connection:
+        journey_ids = sorted(
+            connection.execute(text("SELECT JourneyID FROM DimJourney")).scalars()
+        )[:2]
+        before_seq = current_seq(connection)
+        before_time = connection.execute(
+            text("SELECT MAX(ChangedUTC) FROM JourneyChangeLog")
+        ).scalar()
+        _rename(connection, journey_ids)
+
+    with engine.begin() as connection:
+        assert set(journey_ids) <= set(journeys_changed_since(connection, 0)[0])
+        assert journeys_changed_since(connection, before_seq)[0] == journey_ids
+
+    # A read path refreshes JourneyStepWide and advances its consumer
+    with engine.begin() as connection:
+        ensure_fresh_journey(connection, journey_ids[0])
+        assert consumer_cursor(connection, WIDE_CONSUMER) == current_seq(connection)
+
+    with engine.begin() as connection:
+        assert set(journey_ids) <= set(journeys_changed_since(connection, 0)[0])
+        assert journeys_changed_since(connection, before_seq)[0] == journey_ids
+        since_time = parse_changed_since(before_time)
+        assert set(journey_ids) <= set(
+            journeys_changed_since(connection, since_time)[0]
+        )
+
+
+def test_changed_since_readers_are_registered_consumers(dwh):
+    engine = get_engine()
+    with engine.begin() as connection:
+        changed, _ = select_changed_journeys(connection, "playlist", changed_since="0")
+        assert changed
+        # Registered, but without a cursor a dirty-only run still processes everything
+        assert consumer_cursor(connection, "playlist") is None
+        assert (
+            select_changed_journeys(connection, "playlist", dirty_only=True)[0] is None
+        )
+
+
+def test_prune_keeps_recent_and_unseen_entries(dwh):
+    engine = get_engine()
+    with engine.begin() as connection:
+        total = connection.execute(
+            text("SELECT COUNT(*) FROM JourneyChangeLog")
+        ).scalar()
+        seq = current_seq(connection)
+        advance_consumer(connection, WIDE_CONSUMER, seq)
+
+        # Everything is seen, but nothing is older than the retention window
+        assert prune_change_log(connection) == 0
+
+        connection.execute(
+            text("UPDATE JourneyChangeLog SET ChangedUTC = '2000-01-01T00:00:00'")
+        )
+        register_consumer(connection, "essays")
+        # Old enough, but the registered essays consumer has not seen it yet
+        assert prune_change_log(connection) == 0
+
+        advance_consumer(connection, "essays", seq - 1)
+        assert prune_change_log(connection) == total - 1
+        remaining = connection.execute(
+            text("SELECT ChangeSeq FROM JourneyChangeLog")
+        ).scalars()
+        assert list(remaining) == [seq]
@@ -0,0 +1,43 @@
+from sqlalchemy import text
+
+from src.db import BUSY_TIMEOUT_MS, dispose_engines, get_engine, raw_connection
+from src.instrumentation import metrics
+
+
+def test_one_engine_per_database_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    engine = get_engine("shared.db")
+
+    assert get_engine(str(tmp_path / "shared.db")) is engine
+    assert get_engine("other.db") is not engine
+
+    dispose_engines()
+    assert get_engine("shared.db") is not engine
+
+
+def test_connections_are_tuned_and_counted(tmp_path):
+    db_path = str(tmp_path / "tuned.db")
+    metrics.reset()
+    with get_engine(db_path).connect() as connection:
+        journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+        busy_timeout = connection.execute(text("PRAGMA busy_timeout")).scalar()
+
+    _, counters = metrics.snapshot()
+    assert journal_mode == "wal"
+    assert busy_timeout == BUSY_TIMEOUT_MS
+    assert counters["db.statements"] >= 2
+
+
+def test_raw_connection_is_pooled(tmp_path):
+    db_path = str(tmp_path / "pooled.db")
+    connection = raw_connection(db_path)
+    connection.execute("CREATE TABLE t (x INTEGER)")
+    connection.close()
+
+    pooled = raw_connection(db_path)
+    try:
+        assert pooled.execute("PRAGMA synchronous").fetchone() == (1,)
+        assert pooled.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+    finally:
+        pooled.close()
+    assert get_engine(db_path).pool.checkedin() == 1
@@ -0,0 +1,78 @@
+import sqlite3
+
+import pandas as pd
+
+from src.dedupe_dwh import dedupe_dwh, duplicate_pairs, merge_map
+
+
+def test_merge_map_keeps_the_lowest_id_of_each_cluster():
+    assert merge_map([(3, 5), (5, 9), (2, 4)]) == {5: 3, 9: 3, 4: 2}
+    assert merge_map([]) == {}
+
+
+def test_duplicate_pairs_matches_spelling_variants_but_not_numbers():
+    performers = pd.DataFrame(
+        {
+            "PerformerID": [1, 2, 3, 4, 5],
+            "PerformerName": [
+                "Herbert von Karajan",
+                "Karajan, Herbert von",
+                "Herbert von Karajann",
+                "Symphony No. 5 Orchestra",
+                "Symphony No. 6 Orchestra",
+            ],
+        }
+    )
+
+    pairs, skipped = duplicate_pairs(performers, "PerformerID", "PerformerName")
+
+    found = {
+        (keep, merge): reason
+        for keep, merge, reason in pairs[["KeepID", "MergeID", "Reason"]].itertuples(
+            index=False
+        )
+    }
+    assert found[(1, 2)] == "normalized"
+    assert found[(1, 3)] == "similar"
+    assert (4, 5) not in found
+    assert skipped == 0
+
+
+def test_dedupe_applies_performer_and_forced_album_merges(dwh, tmp_path):
+    with sqlite3.connect(dwh) as connection:
+        connection.execute(
+            "INSERT INTO DimPerformer (PerformerID, PerformerName) "
+            "VALUES (100, '1, Performer')"
+        )
+        connection.execute(
+            "INSERT INTO DimAlbum (AlbumID, AlbumTitle, PerformerID) "
+            "SELECT 100, AlbumTitle, 100 FROM DimAlbum "
+            "WHERE AlbumID = (SELECT MIN(AlbumID) FROM DimAlbum WHERE PerformerID = 1)"
+        )
+        (kept_album,) = connection.execute(
+            "SELECT MIN(AlbumID) FROM DimAlbum WHERE PerformerID = 1"
+        ).fetchone()
+        (journey_id,) = connection.execute(
+            "SELECT MIN(JourneyID) FROM FactJourneyStep"
+        ).fetchone()
+        connection.execute(
+            "INSERT INTO FactJourneyStep (JourneyID, AlbumID, StepOrder) "
+            "VALUES (?, 100, 999)",
+            (journey_id,),
+        )
+
+    report_path = tmp_path / "pairs.csv"
+    found = dedupe_dwh(str(dwh), str(report_path))
+    merged = dedupe_dwh(str(dwh), str(report_path), apply=True, pairs=str(report_path))
+
+    assert found["performer_pairs"] == 1
+    assert found["album_pairs"] == 1
+    assert merged["merged"]["deleted"]["DimAlbum"] == 1
+    assert merged["merged"]["deleted"]["DimPerformer"] == 1
+    with sqlite3.connect(dwh) as connection:
+        assert connection.execute(
+            "SELECT AlbumID FROM FactJourneyStep WHERE StepOrder = 999"
+        ).fetchone() == (kept_album,)
+        assert not connection.execute(
+            "SELECT 1 FROM DimPerformer WHERE PerformerID = 100"
+        ).fetchall()
@@ -0,0 +1,104 @@
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import text
+
+import src.generate_dwh_journey
+from src.db import get_engine
+from src.essay_queue import (
+    claim_pending_jobs,
+    enqueue_essay_job,
+    find_stale_journeys,
+    finish_job,
+    journey_step_hashes,
+    release_expired_jobs,
+    run_essay_worker,
+)
+
+
+def _statuses(connection):
+    rows = connection.execute(text("SELECT JourneyID, Status FROM EssayJobQueue"))
+    return {journey_id: status for journey_id, status in rows}
+
+
+def test_enqueue_reuses_pending_and_running_jobs(dwh):
+    with get_engine().begin() as connection:
+        job_id = enqueue_essay_job(connection, "SYN000001", "Album")
+        assert enqueue_essay_job(connection, "SYN000001", "Album") == job_id
+
+        claimed = claim_pending_jobs(connection, 10, "worker-1")
+        assert [job["job_id"] for job in claimed] == [job_id]
+        assert claimed[0]["steps_hash"] == (
+            journey_step_hashes(connection, ["SYN000001"])["SYN000001"][1]
+        )
+        assert enqueue_essay_job(connection, "SYN000001", "Album") == job_id
+
+        finish_job(connection, job_id, 1)
+        assert enqueue_essay_job(connection, "SYN000001", "Album") != job_id
+        statuses = connection.execute(
+            text("SELECT Status FROM EssayJobQueue ORDER BY JobID")
+        ).scalars()
+        assert list(statuses) == ["done", "pending"]
+
+
+def test_steps_changed_during_generation_stay_stale(dwh, monkeypatch):
+    def generate(journey_id, granularity, stream=False):
+        # The journey is edited while its essay is being generated
+        with get_engine().begin() as connection:
+            connection.execute(
+                text(
+                    "UPDATE FactJourneyStep SET RecordingID = NULL "
+                    "WHERE JourneyID = :jid AND StepOrder = 1"
+                ),
+                {"jid": journey_id},
+            )
+
+    monkeypatch.setattr(src.generate_dwh_journey, "generate_dwh_journey", generate)
+    with get_engine().begin() as connection:
+        enqueue_essay_job(connection, "SYN000001", "Album")
+
+    run_essay_worker(max_workers=1, max_attempts=1)
+
+    with get_engine().begin() as connection:
+        assert _statuses(connection) == {"SYN000001": "done"}
+        stale = [row[0] for row in find_stale_journeys(connection, ["SYN000001"])]
+    assert stale == ["SYN000001"]
+
+
+def test_unexpected_errors_fail_only_their_job(dwh, monkeypatch):
+    def generate(journey_id, granularity, stream=False):
+        if journey_id == "SYN000001":
+            raise RuntimeError("template bug")
+
+    monkeypatch.setattr(src.generate_dwh_journey, "generate_dwh_journey", generate)
+    with get_engine().begin() as connection:
+        enqueue_essay_job(connection, "SYN000001", "Album")
+        enqueue_essay_job(connection, "SYN000002", "Album")
+
+    run_essay_worker(max_workers=1, max_attempts=1)
+
+    with get_engine().begin() as connection:
+        assert _statuses(connection) == {"SYN000001": "failed", "SYN000002": "done"}
+        error = connection.execute(
+            text("SELECT LastError FROM EssayJobQueue WHERE JourneyID = 'SYN000001'")
+        ).scalar()
+    assert error == "RuntimeError: template bug"
+
+
+def test_only_expired_leases_are_released(dwh):
+    with get_engine().begin() as connection:
+        enqueue_essay_job(connection, "SYN000001", "Album")
+        enqueue_essay_job(connection, "SYN000002", "Album")
+        claim_pending_jobs(connection, 2, "worker-1")
+        abandoned = datetime.now(UTC) - timedelta(hours=1)
+        connection.execute(
+            text(
+                "UPDATE EssayJobQueue SET UpdatedUTC = :ts WHERE JourneyID = 'SYN000001'"
+            ),
+            {"ts": abandoned.isoformat()},
+        )
+
+        assert release_expired_jobs(connection) == 1
+        assert _statuses(connection) == {
+            "SYN000001": "pending",
+            "SYN000002": "running",
+        }
@@ -0,0 +1,118 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src import gemini_client
+from src.gemini_client import cache_get, cache_key, cache_put, stream_content
+from src.instrumentation import metrics
+
+
+def _use_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(gemini_client, "CACHE_DIR", str(tmp_path / "gemini"))
+    monkeypatch.setitem(gemini_client._cache_usage, "bytes", None)
+    scans = []
+    entries = gemini_client._cache_entries
+
+    def counting_entries():
+        scans.append(1)
+        return entries()
+
+    monkeypatch.setattr(gemini_client, "_cache_entries", counting_entries)
+    return scans
+
+
+def test_cache_round_trip(tmp_path, monkeypatch):
+    _use_cache_dir(monkeypatch, tmp_path)
+    key = cache_key("model", "prompt")
+    assert cache_get(key) is None
+    cache_put(key, "model", "essay")
+    assert cache_get(key) == "essay"
+    assert cache_key("other-model", "prompt") != key
+
+
+def test_cache_put_scans_only_when_crossing_the_limit(tmp_path, monkeypatch):
+    scans = _use_cache_dir(monkeypatch, tmp_path)
+    text = "x" * 1000
+    cache_put(cache_key("m", "p0"), "m", text)
+    entry_size = gemini_client._cache_usage["bytes"]
+    # Entries differ by a few bytes (the timestamp), so leave some slack
+    max_bytes = entry_size * 5 + entry_size // 2
+
+    for n in range(1, 5):
+        cache_put(cache_key("m", f"p{n}"), "m", text, max_bytes=max_bytes)
+    assert len(scans) == 1
+
+    cache_put(cache_key("m", "p5"), "m", text, max_bytes=max_bytes)
+    assert len(scans) == 2
+    remaining = sum(size for _, size, _ in gemini_client._cache_entries())
+    assert remaining <= max_bytes * gemini_client.CACHE_EVICT_TO
+    assert gemini_client._cache_usage["bytes"] == remaining
+    assert cache_get(cache_key("m", "p5")) == text
+
+
+def test_concurrent_cache_puts_of_one_key_leave_one_whole_entry(tmp_path, monkeypatch):
+    _use_cache_dir(monkeypatch, tmp_path)
+    key = cache_key("model", "prompt")
+    texts = [str(n) * 10000 for n in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda text: cache_put(key, "model", text), texts))
+
+    assert cache_get(key) in texts
+    files = [path for path in (tmp_path / "gemini").rglob("*") if path.is_file()]
+    assert [path.name for path in files] == [f"{key}.json"]
+
+
+class FakeStream:
+    def __init__(self, chunks, fail_after=None):
+        self.chunks = chunks
+        self.fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        for n, chunk in enumerate(self.chunks):
+            if n == self.fail_after:
+                raise ConnectionError("stream dropped")
+            event = {"candidates": [{"content": {"parts": [{"text": chunk}]}}]}
+            yield "data: " + json.dumps(event)
+
+
+def test_stream_content_records_timings(tmp_path, monkeypatch):
+    _use_cache_dir(monkeypatch, tmp_path)
+    monkeypatch.setattr(
+        gemini_client.requests,
+        "post",
+        lambda *args, **kwargs: FakeStream(["Hello, ", "world."]),
+    )
+    metrics.reset()
+    output = tmp_path / "essay.md"
+    text = stream_content("prompt", str(output), api_key="key", prefix="# Title\n")
+    assert text == "Hello, world."
+    assert output.read_text(encoding="utf-8") == "# Title\nHello, world."
+    stages, counters = metrics.snapshot()
+    assert stages["gemini.first_token"]["calls"] == 1
+    assert stages["gemini.stream"]["calls"] == 1
+    assert counters["gemini.calls"] == 1
+
+
+def test_stream_content_keeps_partial_file_when_interrupted(tmp_path, monkeypatch):
+    _use_cache_dir(monkeypatch, tmp_path)
+    monkeypatch.setattr(
+        gemini_client.requests,
+        "post",
+        lambda *args, **kwargs: FakeStream(["Hello, ", "world."], fail_after=1),
+    )
+    output = tmp_path / "essay.md"
+    with pytest.raises(ConnectionError):
+        stream_content("prompt", str(output), api_key="key")
+    assert not output.exists()
+    assert (tmp_path / "essay.md.partial").read_text(encoding="utf-8") == "Hello, "
@@ -0,0 +1,66 @@
+import src.generate_dwh_journey as journey
+from src.generate_dwh_journey import (
+    chunk_steps_by_act,
+    estimate_tokens,
+    format_step_md,
+    generate_chunked_essay,
+)
+
+
+def _steps(acts):
+    steps = []
+    for act_number, size in enumerate(acts, 1):
+        for _ in range(size):
+            steps.append(
+                {
+                    "step_order": len(steps) + 1,
+                    "act_number": act_number,
+                    "act_title": f"Part {act_number}",
+                    "album": f"Album {len(steps) + 1}",
+                    "performer": "Performer",
+                    "label": "Label",
+                    "release_date": "2001",
+                    "spotify_url": "https://open.spotify.com/album/x",
+                    "apple_music_url": None,
+                }
+            )
+    return steps
+
+
+def test_chunks_follow_acts_and_split_oversized_ones():
+    steps = _steps([2, 2, 6])
+    step_tokens = estimate_tokens(format_step_md(steps[0]))
+
+    chunks = chunk_steps_by_act(steps, token_budget=step_tokens * 4 + 3)
+
+    assert [[s["act_number"] for s in chunk] for chunk in chunks] == [
+        [1, 1, 2, 2],
+        [3, 3, 3, 3],
+        [3, 3],
+    ]
+    assert chunk_steps_by_act(steps, token_budget=10**6) == [steps]
+
+
+def test_chunked_essay_maps_sections_then_merges(tmp_path, monkeypatch):
+    template = tmp_path / "prompt.md"
+    template.write_text("Playlist:\n{{ playlist }}", encoding="utf-8")
+    prompts = []
+
+    def fake_send(prompt_text, refresh=False, stream_to=None, prefix=""):
+        prompts.append(prompt_text)
+        return f"section {len(prompts)}"
+
+    monkeypatch.setattr(journey, "send_to_gemini", fake_send)
+    steps = _steps([2, 2])
+    budget = estimate_tokens(format_step_md(steps[0])) * 2 + 1
+
+    essay = generate_chunked_essay("Night", steps, str(template), token_budget=budget)
+
+    sections, merge = sorted(prompts[:2]), prompts[2]
+    assert len(prompts) == 3
+    assert "Act 1: Part 1" in sections[0]
+    assert "Album 3" not in sections[0]
+    assert "Act 2: Part 2" in sections[1]
+    assert "--- SECTION 1 ---" in merge
+    assert "--- SECTION 2 ---" in merge
+    assert essay == "section 3"
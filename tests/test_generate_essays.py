@@ -0,0 +1,51 @@
+import sqlite3
+
+import src.generate_dwh_journey
+import src.sync_journey_md_to_db
+from src.generate_essays import JOURNEYS_DIR, generate_essays
+
+
+def test_only_stale_or_failed_essays_are_regenerated(dwh, tmp_path, monkeypatch):
+    failing = {"SYN000002"}
+    rendered = []
+
+    def fake_render(journey_id, granularity, refresh=False, mode="auto"):
+        rendered.append(journey_id)
+        if journey_id in failing:
+            raise ValueError("empty response")
+        return f"# {journey_id}\n\nAn essay without steps.\n"
+
+    monkeypatch.setattr(src.generate_dwh_journey, "render_journey_essay", fake_render)
+
+    first = generate_essays(max_workers=2, max_attempts=1)
+    assert first["generated"] == ["SYN000001", "SYN000003"]
+    assert set(first["failed"]) == {"SYN000002"}
+    assert first["out_of_sync"] == []
+    assert (tmp_path / JOURNEYS_DIR / "SYN000001.md").exists()
+
+    failing.clear()
+    rendered.clear()
+    second = generate_essays(max_workers=2, max_attempts=1)
+    assert rendered == ["SYN000002"]
+    assert second["generated"] == ["SYN000002"]
+
+    rendered.clear()
+    assert generate_essays(max_attempts=1) is None
+    assert rendered == []
+
+
+def test_failed_sync_marks_every_essay_out_of_sync(dwh, monkeypatch):
+    def locked(md_paths, incremental=True, conn=None):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(
+        src.generate_dwh_journey,
+        "render_journey_essay",
+        lambda journey_id, granularity, refresh=False, mode="auto": f"# {journey_id}\n",
+    )
+    monkeypatch.setattr(src.sync_journey_md_to_db, "sync_journey_files", locked)
+
+    result = generate_essays(max_attempts=1)
+
+    assert sorted(result["out_of_sync"]) == result["generated"]
+    assert len(result["generated"]) == 3
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import sqlite3
+
+from sqlalchemy import text
+
+from src.db import get_engine
+from src.import_pipeline import run_import_pipeline
+from src.import_spotify_playlist import write_playlist_journey
+
+
+def _track(n, album_id):
+    return {
+        "track": {
+            "id": f"t{n}",
+            "artists": [{"name": f"Artist {n % 2}", "type": "artist"}],
+            "album": {"id": album_id},
+        }
+    }
+
+
+def _album(album_id):
+    return {"id": album_id, "name": f"Album {album_id}", "genres": []}
+
+
+def _steps(engine, journey_id):
+    with engine.connect() as connection:
+        return [
+            tuple(row)
+            for row in connection.execute(
+                text(
+                    "SELECT StepOrder, RecordingID FROM FactJourneyStep WHERE JourneyID = :jid ORDER BY StepOrder"
+                ),
+                {"jid": journey_id},
+            )
+        ]
+
+
+class FakeSpotify:
+    """Serves a two-page playlist and checks the DB is not write-locked while fetching."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock_checks = 0
+
+    def _assert_unlocked(self):
+        # The writer's short per-batch transactions may overlap a fetch, so wait briefly
+        probe = sqlite3.connect(self.db_path, timeout=1)
+        try:
+            probe.execute("BEGIN IMMEDIATE")
+            probe.rollback()
+        finally:
+            probe.close()
+        self.lock_checks += 1
+
+    def playlist(self, playlist_id):
+        return {
+            "name": "Imported",
+            "description": "",
+            "external_urls": {
+                "spotify": f"https://open.spotify.com/playlist/{playlist_id}"
+            },
+            "tracks": {"items": [_track(n, "a1") for n in range(3)], "next": "page-2"},
+        }
+
+    def next(self, page):
+        self._assert_unlocked()
+        return {"items": [_track(n, "a2") for n in range(3, 6)], "next": None}
+
+    def albums(self, album_ids):
+        self._assert_unlocked()
+        return {"albums": [_album(album_id) for album_id in album_ids]}
+
+
+class UnavailableAlbumSpotify(FakeSpotify):
+    """Spotify returns null for album a2, as it does for unavailable albums."""
+
+    def _assert_unlocked(self):
+        pass
+
+    def albums(self, album_ids):
+        return {
+            "albums": [
+                _album(album_id) if album_id != "a2" else None for album_id in album_ids
+            ]
+        }
+
+
+def test_pipeline_does_not_hold_write_lock_while_fetching(dwh):
+    engine = get_engine()
+    sp = FakeSpotify(dwh)
+    meta, step_count, _ = asyncio.run(
+        run_import_pipeline(
+            sp, engine, "p1", "IMPORTED", "Track", "me", logging.getLogger("test")
+        )
+    )
+    assert meta["name"] == "Imported"
+    assert step_count == 6
+    assert sp.lock_checks >= 2
+    assert _steps(engine, "IMPORTED") == [(n + 1, f"t{n}") for n in range(6)]
+
+
+def test_pipeline_counts_and_warns_about_tracks_without_album(dwh, caplog):
+    engine = get_engine()
+    with caplog.at_level(logging.WARNING, logger="test"):
+        _, step_count, all_stats = asyncio.run(
+            run_import_pipeline(
+                UnavailableAlbumSpotify(dwh),
+                engine,
+                "p1",
+                "IMPORTED",
+                "Track",
+                "me",
+                logging.getLogger("test"),
+            )
+        )
+
+    assert step_count == 3
+    assert {stats.name: stats.dropped for stats in all_stats}["resolve"] == 3
+    assert "Skipped 3 tracks of journey IMPORTED" in caplog.text
+    assert _steps(engine, "IMPORTED") == [(n + 1, f"t{n}") for n in range(3)]
+
+
+def test_bulk_writer_matches_the_pipeline(dwh, caplog):
+    engine = get_engine()
+    sp = FakeSpotify(dwh)
+    playlist = sp.playlist("p2")
+    snapshot = {
+        "name": playlist["name"],
+        "description": playlist["description"],
+        "url": playlist["external_urls"]["spotify"],
+        "tracks": playlist["tracks"]["items"] + sp.next(None)["items"],
+        "albums": {"a1": _album("a1")},
+    }
+    with engine.connect() as connection, caplog.at_level(logging.WARNING):
+        step_count = write_playlist_journey(
+            connection, snapshot, "BULK", "Track", "me", logging.getLogger("test")
+        )
+
+    assert step_count == 3
+    assert "Skipped 3 tracks of journey BULK" in caplog.text
+    assert _steps(engine, "BULK") == [(n + 1, f"t{n}") for n in range(3)]
@@ -0,0 +1,123 @@
+import io
+
+import pytest
+from spotipy.exceptions import SpotifyException
+from sqlalchemy import create_engine, text
+
+import src.import_spotify_playlist as importer
+from src.import_spotify_playlist import parse_import_entry, read_import_entries
+
+
+def test_parse_import_entry_reads_optional_granularity():
+    url = "https://open.spotify.com/playlist/abc123"
+    assert parse_import_entry(url) == {
+        "url": url,
+        "journey_id": "abc123",
+        "granularity": None,
+    }
+    assert parse_import_entry(f"{url} J1 album") == {
+        "url": url,
+        "journey_id": "J1",
+        "granularity": "Album",
+    }
+    assert parse_import_entry(f"{url} Track")["granularity"] == "Track"
+    assert parse_import_entry("J2 Album") == {
+        "url": None,
+        "journey_id": "J2",
+        "granularity": "Album",
+    }
+
+
+def test_read_import_entries_skips_comments(tmp_path):
+    source = tmp_path / "playlists.txt"
+    source.write_text("# header\n\nJ1\nJ2 Album\n", encoding="utf-8")
+    entries = read_import_entries(str(source))
+    assert [(e["journey_id"], e["granularity"]) for e in entries] == [
+        ("J1", None),
+        ("J2", "Album"),
+    ]
+
+
+def test_read_import_entries_from_stdin(monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("J1 Track\n# skipped\n"))
+    entries = read_import_entries("-")
+    assert [(e["journey_id"], e["granularity"]) for e in entries] == [("J1", "Track")]
+
+
+def _playlist_engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE DimPlaylist (JourneyID TEXT, ServiceID TEXT, SpotifyPlaylistURL TEXT)"
+            )
+        )
+    return engine
+
+
+def test_bulk_import_falls_back_to_default_granularity(tmp_path, monkeypatch):
+    source = tmp_path / "playlists.txt"
+    source.write_text(
+        "https://open.spotify.com/playlist/p1 J1\n"
+        "https://open.spotify.com/playlist/p2 J2 Album\n",
+        encoding="utf-8",
+    )
+    engine = _playlist_engine()
+    committed = {}
+
+    def fake_commit(connection, snapshot, journey_id, granularity, creator, logger):
+        committed[journey_id] = granularity
+        return True
+
+    monkeypatch.setattr(importer, "authenticate", lambda logger: (object(), "me"))
+    monkeypatch.setattr(importer, "get_engine", lambda: engine)
+    monkeypatch.setattr(
+        importer,
+        "fetch_playlist",
+        lambda sp, url, limiter: {"name": url, "tracks": [], "albums": {}},
+    )
+    monkeypatch.setattr(importer, "commit_journey", fake_commit)
+    monkeypatch.setattr(importer, "refresh_catalog_index", lambda engine, logger: None)
+
+    importer.import_spotify_playlists(str(source), granularity="Track", workers=2)
+    assert committed == {"J1": "Track", "J2": "Album"}
+
+
+def _bulk_import(tmp_path, monkeypatch, fetch_playlist):
+    source = tmp_path / "playlists.txt"
+    source.write_text(
+        "https://open.spotify.com/playlist/p1 J1\n"
+        "https://open.spotify.com/playlist/p2 J2\n",
+        encoding="utf-8",
+    )
+    engine = _playlist_engine()
+    committed = []
+    monkeypatch.setattr(importer, "authenticate", lambda logger: (object(), "me"))
+    monkeypatch.setattr(importer, "get_engine", lambda: engine)
+    monkeypatch.setattr(importer, "fetch_playlist", fetch_playlist)
+    monkeypatch.setattr(
+        importer,
+        "commit_journey",
+        lambda connection, snapshot, journey_id, *args: committed.append(journey_id)
+        or True,
+    )
+    monkeypatch.setattr(importer, "refresh_catalog_index", lambda engine, logger: None)
+    importer.import_spotify_playlists(str(source), workers=2)
+    return committed
+
+
+def test_bulk_import_skips_playlists_spotify_fails_to_fetch(tmp_path, monkeypatch):
+    def fetch_playlist(sp, url, limiter):
+        if url.endswith("p1"):
+            raise SpotifyException(404, -1, "not found")
+        return {"name": url, "tracks": [], "albums": {}}
+
+    assert _bulk_import(tmp_path, monkeypatch, fetch_playlist) == ["J2"]
+
+
+def test_bulk_import_raises_unexpected_fetch_errors(tmp_path, monkeypatch):
+    def fetch_playlist(sp, url, limiter):
+        raise KeyError("tracks")
+
+    with pytest.raises(KeyError):
+        _bulk_import(tmp_path, monkeypatch, fetch_playlist)
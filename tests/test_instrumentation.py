@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from src.instrumentation import count, metrics, run_command, stage
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_stage_is_timed_when_the_block_raises():
+    with pytest.raises(ValueError), stage("parse"):
+        raise ValueError("bad row")
+    with stage("parse"):
+        count("rows", 2)
+
+    stages, counters = metrics.snapshot()
+    assert stages["parse"]["calls"] == 2
+    assert counters == {"rows": 2}
+
+
+def test_run_command_writes_summary_and_textfile(tmp_path):
+    summary_path = tmp_path / "summary.json"
+    textfile_path = tmp_path / "metrics.prom"
+
+    def build():
+        count("rows_loaded.DimAlbum", 4)
+        return "built"
+
+    result = run_command(
+        "build",
+        build,
+        summary_path=str(summary_path),
+        textfile_path=str(textfile_path),
+    )
+
+    summary = json.loads(summary_path.read_text())
+    assert result == "built"
+    assert summary["status"] == "ok"
+    assert summary["counters"] == {"rows_loaded.DimAlbum": 4}
+    assert summary["stages"]["command"]["calls"] == 1
+    lines = textfile_path.read_text().splitlines()
+    assert 'music_journey_run_success{command="build"} 1' in lines
+    assert (
+        'music_journey_counter{command="build",name="rows_loaded.DimAlbum"} 4' in lines
+    )
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_run_command_records_errors(tmp_path):
+    summary_path = tmp_path / "summary.json"
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        run_command("build", fail, summary_path=str(summary_path))
+
+    assert json.loads(summary_path.read_text())["status"] == "error"
@@ -0,0 +1,137 @@
+from sqlalchemy import text
+
+from src.db import get_engine
+from src.journey_step_wide import (
+    ensure_fresh_journey,
+    rebuild_journey_step_wide,
+    refresh_changed_journeys,
+)
+from src.spotify_playlists import TRACK_URIS_QUERY
+
+
+def _wide(connection, column, journey_id, step_order=1):
+    return connection.execute(
+        text(
+            f"SELECT {column} FROM JourneyStepWide "
+            "WHERE JourneyID = :journey_id AND StepOrder = :step_order"
+        ),
+        {"journey_id": journey_id, "step_order": step_order},
+    ).scalar()
+
+
+def test_refresh_rematerializes_only_changed_journeys(dwh):
+    with get_engine().begin() as connection:
+        assert refresh_changed_journeys(connection) == []
+        connection.execute(
+            text(
+                "UPDATE FactJourneyStep SET ActTitle = 'Nightfall' "
+                "WHERE JourneyID = 'SYN000001' AND StepOrder = 1"
+            )
+        )
+        assert _wide(connection, "ActTitle", "SYN000001") != "Nightfall"
+
+        assert refresh_changed_journeys(connection) == ["SYN000001"]
+        assert _wide(connection, "ActTitle", "SYN000001") == "Nightfall"
+        assert refresh_changed_journeys(connection) == []
+
+
+def test_album_edits_reach_every_journey_using_the_album(dwh):
+    with get_engine().begin() as connection:
+        album_id, journey_id, step_order = connection.execute(
+            text(
+                "SELECT AlbumID, JourneyID, StepOrder FROM FactJourneyStep "
+                "ORDER BY JourneyStepID LIMIT 1"
+            )
+        ).one()
+        connection.execute(
+            text("UPDATE DimAlbum SET AlbumTitle = 'Renamed' WHERE AlbumID = :id"),
+            {"id": album_id},
+        )
+
+        ensure_fresh_journey(connection, journey_id)
+
+        assert _wide(connection, "AlbumTitle", journey_id, step_order) == "Renamed"
+        assert not connection.execute(
+            text(
+                "SELECT 1 FROM JourneyStepWide w JOIN FactJourneyStep f "
+                "ON f.JourneyID = w.JourneyID AND f.StepOrder = w.StepOrder "
+                "WHERE f.AlbumID = :id AND w.AlbumTitle != 'Renamed'"
+            ),
+            {"id": album_id},
+        ).fetchall()
+
+
+def _bridge_rows(connection, recording_id):
+    return connection.execute(
+        text(
+            "SELECT album_id, movement_id, track_number FROM BridgeAlbumMovement "
+            "WHERE CAST(recording_id AS INTEGER) = :id ORDER BY movement_id"
+        ),
+        {"id": recording_id},
+    ).fetchall()
+
+
+def test_step_keeps_one_row_and_its_first_movement(dwh):
+    with get_engine().begin() as connection:
+        recording_id = connection.execute(
+            text(
+                "SELECT RecordingID FROM FactJourneyStep "
+                "WHERE JourneyID = 'SYN000001' AND StepOrder = 1"
+            )
+        ).scalar()
+        album_id, movement_id, track_number = _bridge_rows(connection, recording_id)[0]
+        other_movement, first_title = connection.execute(
+            text(
+                "SELECT MovementID, MovementTitle FROM DimMovement "
+                "WHERE MovementID < :id ORDER BY MovementID LIMIT 1"
+            ),
+            {"id": movement_id},
+        ).one()
+        connection.execute(
+            text(
+                "INSERT INTO BridgeAlbumMovement VALUES (:album, :movement, :track, :rec)"
+            ),
+            {
+                "album": album_id,
+                "movement": other_movement,
+                "track": track_number,
+                "rec": str(recording_id),
+            },
+        )
+        rebuild_journey_step_wide(connection)
+
+        assert _wide(connection, "MovementTitle", "SYN000001") == first_title
+        uris = connection.execute(TRACK_URIS_QUERY, {"jid": "SYN000001"}).fetchall()
+        steps = connection.execute(
+            text("SELECT COUNT(*) FROM FactJourneyStep WHERE JourneyID = 'SYN000001'")
+        ).scalar()
+        assert len(uris) == steps
+
+
+def test_step_without_a_movement_is_left_out_of_track_uris(dwh):
+    with get_engine().begin() as connection:
+        recording_id = connection.execute(
+            text(
+                "SELECT RecordingID FROM FactJourneyStep "
+                "WHERE JourneyID = 'SYN000001' AND StepOrder = 1"
+            )
+        ).scalar()
+        connection.execute(
+            text(
+                "DELETE FROM BridgeAlbumMovement "
+                "WHERE CAST(recording_id AS INTEGER) = :id"
+            ),
+            {"id": recording_id},
+        )
+        rebuild_journey_step_wide(connection)
+
+        assert not _wide(connection, "HasMovement", "SYN000001")
+        uris = connection.execute(TRACK_URIS_QUERY, {"jid": "SYN000001"}).fetchall()
+        other_steps = connection.execute(
+            text(
+                "SELECT COUNT(*) FROM FactJourneyStep "
+                "WHERE JourneyID = 'SYN000001' AND RecordingID != :id"
+            ),
+            {"id": recording_id},
+        ).scalar()
+        assert len(uris) == other_steps
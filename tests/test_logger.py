@@ -0,0 +1,48 @@
+import json
+import logging
+
+import src.logger
+from src.logger import ProgressLog, log_sample, setup_logger
+
+
+def flush_log():
+    """Stops and restarts the listener so every queued record is written."""
+    listener = src.logger._queue["listener"]
+    listener.stop()
+    listener.start()
+
+
+def test_records_are_written_as_json_lines(log_file):
+    setup_logger("test").info("Synced %s", "journey-1", extra={"rows": 3})
+    flush_log()
+
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    entry = next(e for e in entries if e["message"] == "Synced journey-1")
+    assert entry["logger"] == "music_journey.test"
+    assert entry["level"] == "INFO"
+    assert entry["rows"] == 3
+
+
+def test_listener_starts_once():
+    setup_logger()
+    listener = src.logger._queue["listener"]
+    setup_logger("other")
+
+    assert src.logger._queue["listener"] is listener
+    handlers = logging.getLogger(src.logger.LOGGER_NAME).handlers
+    assert sum(isinstance(h, src.logger.LazyQueueHandler) for h in handlers) == 1
+
+
+def test_progress_log_and_sample(caplog):
+    logger = logging.getLogger("progress_test")
+    progress = ProgressLog(logger, "Import", total=3, interval=3600)
+    for outcome in ("ok", "ok", "failed"):
+        progress.update(outcome)
+    with caplog.at_level(logging.INFO, logger="progress_test"):
+        progress.finish()
+        log_sample(logger, logging.INFO, [f"item {i}" for i in range(12)], limit=2)
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages[0].startswith("Import done: 3/3 items")
+    assert messages[0].endswith(", 1 failed, 2 ok")
+    assert messages[1:] == ["     item 0", "     item 1", "     ... and 10 more"]
@@ -0,0 +1,68 @@
+import importlib
+import inspect
+import subprocess
+import sys
+
+import pytest
+
+from main import COMMANDS, build_parser
+from src.benchmark import MAIN_SCRIPT, time_cli_startup
+
+HEAVY_MODULES = ("pandas", "sqlalchemy", "spotipy", "http.server")
+
+# Runs `main.py <argv>` in-process and prints the heavy modules it imported
+IMPORTED_HEAVY_MODULES = """
+import runpy, sys
+sys.argv = [{script!r}, *{argv!r}]
+try:
+    runpy.run_path({script!r}, run_name="__main__")
+except SystemExit:
+    pass
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+# Minimal argv per command that needs a positional argument
+REQUIRED_ARGS = {"import-spotify-playlist": ["https://open.spotify.com/playlist/x"]}
+
+
+def test_help_leaves_heavy_modules_to_the_commands():
+    timings = {}
+
+    assert time_cli_startup(timings, samples=1) == []
+    assert timings["startup_help_p50_ms"] > 0
+
+
+@pytest.mark.parametrize("argv", [["--help"], ["standin", "--help"]])
+def test_help_does_not_import_heavy_modules(argv):
+    code = IMPORTED_HEAVY_MODULES.format(
+        script=MAIN_SCRIPT, argv=argv, heavy=HEAVY_MODULES
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.splitlines()[-1] == ""
+
+
+def test_every_command_is_registered_with_matching_arguments():
+    subparsers = next(
+        action for action in build_parser()._actions if action.dest == "command"
+    )
+
+    assert set(subparsers.choices) == set(COMMANDS)
+    for name, command in COMMANDS.items():
+        args = build_parser().parse_args([name, *REQUIRED_ARGS.get(name, [])])
+        handler = getattr(importlib.import_module(command.module), command.function)
+        inspect.signature(handler).bind(**command.arguments(args))
+
+
+def test_registered_command_runs_its_handler(dwh):
+    result = subprocess.run(
+        [sys.executable, MAIN_SCRIPT, "search", "Synthetic", "--limit", "1"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert "Search index rebuilt" not in result.stdout
+    assert result.stdout.startswith("[")
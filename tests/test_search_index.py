@@ -0,0 +1,32 @@
+from sqlalchemy import text
+
+from src.db import get_engine
+from src.search_index import reindex, search
+
+
+def test_triggers_keep_the_index_in_sync(dwh):
+    engine = get_engine()
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "UPDATE DimJourney SET JourneyDescription = 'A moonlit nocturne' "
+                "WHERE JourneyID = 'SYN000001'"
+            )
+        )
+        connection.execute(text("DELETE FROM DimJourney WHERE JourneyID = 'SYN000002'"))
+
+    with engine.connect() as connection:
+        matches = search(connection, "nocturne", kinds=["journey"])
+        assert [(m["kind"], m["ref_id"]) for m in matches] == [("journey", "SYN000001")]
+        assert "[nocturne]" in matches[0]["snippet"]
+        assert not search(connection, "SYN000002", kinds=["journey"])
+
+
+def test_search_falls_back_to_plain_terms(dwh):
+    with get_engine().begin() as connection:
+        documents = reindex(connection)
+        steps = search(connection, 'benchmark step"', kinds=["step"], limit=5)
+
+    assert documents > 0
+    assert len(steps) == 5
+    assert {m["kind"] for m in steps} == {"step"}
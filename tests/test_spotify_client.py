@@ -0,0 +1,78 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar
+
+import pytest
+import requests
+
+from src import spotify_client
+from src.spotify_client import CircuitBreaker, SpotifySession
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers 503, 429 or drops the connection, as chosen by the request path."""
+
+    calls: ClassVar[dict] = {}
+
+    def _handle(self):
+        key = (self.command, self.path)
+        FlakyHandler.calls[key] = FlakyHandler.calls.get(key, 0) + 1
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if self.path == "/drop":
+            # A read error: the request arrived, but no response comes back
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        status = 429 if self.path == "/busy" else 503
+        self.send_response(status)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_POST = do_PUT = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    FlakyHandler.calls = {}
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(spotify_client, "MAX_RETRIES", 2)
+    monkeypatch.setattr(spotify_client, "BACKOFF_FACTOR", 0)
+    monkeypatch.setattr(spotify_client, "breaker", CircuitBreaker(threshold=100))
+    return SpotifySession()
+
+
+def test_post_is_not_retried_on_5xx(server, session):
+    assert session.post(f"{server}/fail", json={}, timeout=5).status_code == 503
+    assert FlakyHandler.calls[("POST", "/fail")] == 1
+
+
+def test_post_is_not_retried_on_read_error(server, session):
+    with pytest.raises(requests.ConnectionError):
+        session.post(f"{server}/drop", json={}, timeout=5)
+    assert FlakyHandler.calls[("POST", "/drop")] == 1
+
+
+def test_idempotent_methods_are_retried_on_5xx(server, session):
+    assert session.get(f"{server}/fail", timeout=5).status_code == 503
+    assert session.put(f"{server}/fail", json={}, timeout=5).status_code == 503
+    assert FlakyHandler.calls[("GET", "/fail")] == 3
+    assert FlakyHandler.calls[("PUT", "/fail")] == 3
+
+
+def test_rate_limited_post_is_retried(server, session):
+    assert session.post(f"{server}/busy", json={}, timeout=5).status_code == 429
+    assert FlakyHandler.calls[("POST", "/busy")] == 3
@@ -0,0 +1,53 @@
+import logging
+
+from spotipy.exceptions import SpotifyException
+
+import src.spotify_url_resolver as resolver
+from src.logger import LOGGER_NAME
+
+MARKDOWN = """# Journey
+
+1. **Performer:** Artist A
+2. **Album:** Album A
+Spotify URL: old
+
+1. **Performer:** Artist B
+2. **Album:** Album B
+"""
+
+
+class FakeSpotify:
+    def search(self, q, type, market, limit):
+        if "Album B" in q:
+            raise SpotifyException(500, -1, "server error")
+        return {"albums": {"items": [{"external_urls": {"spotify": "url-a"}}]}}
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_update_spotify_urls_logs_through_project_logger(monkeypatch):
+    monkeypatch.setenv("SPOTIFY_CLIENT_ID", "id")
+    monkeypatch.setenv("SPOTIFY_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(resolver, "lookup_album_urls", lambda pairs: {})
+    monkeypatch.setattr(resolver, "get_spotify_client", FakeSpotify)
+    monkeypatch.setattr(resolver, "_url_cache", {})
+    handler = ListHandler()
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.addHandler(handler)
+    try:
+        markdown = resolver.update_spotify_urls(MARKDOWN)
+    finally:
+        logger.removeHandler(handler)
+
+    assert "Spotify URL: url-a\n" in markdown
+    assert "Spotify URL: old" not in markdown
+    assert markdown.count("Spotify URL:") == 1
+    warnings = [r.getMessage() for r in handler.records if r.levelno == logging.WARNING]
+    assert any("Spotify search failed for Artist B - Album B" in w for w in warnings)
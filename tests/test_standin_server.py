@@ -0,0 +1,73 @@
+import json
+
+import pytest
+import requests
+
+from src.standin_server import (
+    SPOTIFY_UPSTREAM,
+    Cassette,
+    request_key,
+    serve_in_background,
+    spotify_id,
+)
+
+
+@pytest.fixture
+def standin():
+    servers = []
+
+    def start(**options):
+        server, base_url = serve_in_background(**options)
+        servers.append(server)
+        return base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_simulated_pages_link_back_to_the_standin(standin):
+    base_url = standin(page_size=3)
+    album_id = spotify_id("album")
+
+    first = requests.get(f"{base_url}/v1/albums/{album_id}/tracks", timeout=5).json()
+    second = requests.get(first["next"], timeout=5).json()
+
+    assert first["next"].startswith(f"{base_url}/v1/albums/{album_id}/tracks?")
+    assert [len(first["items"]), len(second["items"])] == [3, 3]
+    assert first["total"] == 8
+    assert first["items"][0]["id"] != second["items"][0]["id"]
+
+
+def test_replay_serves_the_cassette_in_order_and_repeats_the_last(standin, tmp_path):
+    album_id = spotify_id("album")
+    path = f"/v1/albums/{album_id}"
+    key = request_key("GET", path, "", b"")
+    cassette = Cassette(str(tmp_path / "session.jsonl"))
+    for status, body in (
+        (429, {"error": {"status": 429}}),
+        (200, {"id": album_id, "href": f"{SPOTIFY_UPSTREAM}{path}"}),
+    ):
+        cassette.append(
+            {
+                "key": key,
+                "status": status,
+                "content_type": "application/json",
+                "retry_after": "1" if status == 429 else None,
+                "body": json.dumps(body),
+            }
+        )
+    assert cassette.load() == 2
+    base_url = standin(mode="replay", cassette=cassette)
+
+    limited = requests.get(f"{base_url}{path}", timeout=5)
+    replayed = requests.get(f"{base_url}{path}", timeout=5)
+    repeated = requests.get(f"{base_url}{path}", timeout=5)
+    missing = requests.get(f"{base_url}{path}/tracks", timeout=5)
+
+    assert limited.status_code == 429
+    assert limited.headers["Retry-After"] == "1"
+    assert replayed.json() == {"id": album_id, "href": f"{base_url}{path}"}
+    assert repeated.json() == replayed.json()
+    assert missing.status_code == 501
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from src.build_dwh import build_data_warehouse
+from src.synthetic_dwh import generate_synthetic_dwh
+
+# Tables stamped with the wall clock of the build
+VOLATILE_TABLES = {"JourneyChangeLog", "ChangeConsumer"}
+
+
+def table_rows(db_path):
+    with sqlite3.connect(db_path) as connection:
+        tables = [
+            name
+            for (name,) in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+            )
+        ]
+        return {
+            table: sorted(
+                connection.execute(f'SELECT * FROM "{table}"').fetchall(), key=repr
+            )
+            for table in tables
+            if table not in VOLATILE_TABLES
+        }
+
+
+@pytest.fixture(scope="module")
+def builds(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("stream_build")
+    data_dir = tmp_path / "data"
+    generate_synthetic_dwh(str(data_dir), journeys=3, steps=30, recordings=40)
+    paths = {}
+    for load_engine in ("pandas", "stream"):
+        paths[load_engine] = str(tmp_path / f"{load_engine}.db")
+        build_data_warehouse(
+            str(data_dir), paths[load_engine], enrich=False, load_engine=load_engine
+        )
+    return paths
+
+
+def test_stream_build_matches_pandas_build(builds):
+    pandas_rows = table_rows(builds["pandas"])
+    stream_rows = table_rows(builds["stream"])
+
+    assert stream_rows.keys() == pandas_rows.keys()
+    assert pandas_rows["FactJourneyStep"]
+    for table, rows in pandas_rows.items():
+        assert stream_rows[table] == rows, table
+
+
+def test_stream_build_logs_the_same_changes(builds):
+    query = "SELECT JourneyID, SourceTable FROM JourneyChangeLog ORDER BY ChangeSeq"
+    with sqlite3.connect(builds["pandas"]) as pandas_db, sqlite3.connect(
+        builds["stream"]
+    ) as stream_db:
+        pandas_changes = pandas_db.execute(query).fetchall()
+        assert pandas_changes
+        assert stream_db.execute(query).fetchall() == pandas_changes
@@ -0,0 +1,118 @@
+from sqlalchemy import text
+
+from src.db import get_engine, raw_connection
+from src.sync_journey_md_to_db import (
+    TEMPLATE_FILES,
+    is_journey_markdown,
+    journey_markdown_paths,
+    parse_journey_md,
+    sync_journey_files,
+    sync_journeys_dir,
+)
+
+# Shaped like the prompt templates in journeys/: Jinja placeholders in step fields
+TEMPLATE = """# {{ theme }} Journey
+
+Write a listening journey for {{ artist }} with this structure:
+
+## Act I: {{ act_title }}
+1. **Performer:** <performer>
+2. **Album:** <album>
+3. **Why This Recording:** <why>
+"""
+
+ESSAY = """# Night Music
+
+## Act I: Dusk
+- **Performer:** Performer 1
+- **Album:** Album 1
+- **Why This Recording:** It opens quietly.
+
+## Act II: Midnight
+- **Performer:** Performer 2
+- **Album:** Album 2
+- **Why This Recording:** It builds.
+"""
+
+
+def _journeys_dir(tmp_path):
+    journeys = tmp_path / "journeys"
+    journeys.mkdir()
+    for name in TEMPLATE_FILES:
+        (journeys / name).write_text(TEMPLATE, encoding="utf-8")
+    (journeys / "NIGHT_01.md").write_text(ESSAY, encoding="utf-8")
+    (journeys / "notes.md").write_text("# Ideas\n\nNo steps yet.\n", encoding="utf-8")
+    return journeys
+
+
+def test_templates_are_not_journey_markdown(tmp_path):
+    journeys = _journeys_dir(tmp_path)
+    assert not any(is_journey_markdown(journeys / name) for name in TEMPLATE_FILES)
+    assert journey_markdown_paths(str(journeys)) == [
+        str(journeys / "NIGHT_01.md"),
+        str(journeys / "notes.md"),
+    ]
+
+
+def test_sync_journeys_dir_skips_templates_and_stepless_files(dwh, tmp_path):
+    journeys = _journeys_dir(tmp_path)
+    results = sync_journeys_dir(str(journeys), incremental=False)
+    assert results == {"NIGHT_01": True}
+    with get_engine().connect() as connection:
+        journey_ids = set(
+            connection.execute(text("SELECT JourneyID FROM DimJourney")).scalars()
+        )
+    assert "NIGHT_01" in journey_ids
+    assert not journey_ids & {
+        "journey_prompt_template",
+        "joruney_import_prompt",
+        "notes",
+    }
+
+
+def test_parse_journey_md_reads_dashed_act_headings(tmp_path):
+    md_path = tmp_path / "DAWN_01.md"
+    md_path.write_text(
+        ESSAY.replace("Act I: Dusk", "Act I \u2013 Dusk").replace(
+            "Act II: Midnight", "Act II \u2014 Midnight"
+        ),
+        encoding="utf-8",
+    )
+
+    title, steps = parse_journey_md(str(md_path))
+
+    assert title == "Night Music"
+    assert [(s["step_order"], s["act_number"], s["act_title"]) for s in steps] == [
+        (1, "I", "Dusk"),
+        (2, "II", "Midnight"),
+    ]
+
+
+def _step_count(journey_id):
+    with get_engine().connect() as connection:
+        return connection.execute(
+            text("SELECT COUNT(*) FROM FactJourneyStep WHERE JourneyID = :jid"),
+            {"jid": journey_id},
+        ).scalar()
+
+
+def test_sync_journey_files_leaves_the_callers_transaction_open(dwh, tmp_path):
+    md_path = _journeys_dir(tmp_path) / "NIGHT_01.md"
+    connection = raw_connection()
+    try:
+        assert sync_journey_files([str(md_path)], conn=connection) == {"NIGHT_01": True}
+        connection.rollback()
+    finally:
+        connection.close()
+
+    assert _step_count("NIGHT_01") == 0
+
+
+def test_sync_reports_stored_steps_the_markdown_no_longer_has(dwh, tmp_path):
+    journeys = _journeys_dir(tmp_path)
+    md_path = journeys / "NIGHT_01.md"
+    sync_journeys_dir(str(journeys), incremental=False)
+    md_path.write_text(ESSAY.split("## Act II")[0], encoding="utf-8")
+
+    assert sync_journey_files([str(md_path)], incremental=False) == {"NIGHT_01": False}
+    assert _step_count("NIGHT_01") == 2
@@ -0,0 +1,35 @@
+import pytest
+
+from src.benchmark import compare_results
+from src.synthetic_dwh import generate_synthetic_dwh
+
+
+def test_generation_is_deterministic_per_seed(tmp_path):
+    counts = generate_synthetic_dwh(tmp_path / "a", journeys=2, steps=20, recordings=40)
+    generate_synthetic_dwh(tmp_path / "b", journeys=2, steps=20, recordings=40)
+    generate_synthetic_dwh(tmp_path / "c", journeys=2, steps=20, recordings=40, seed=7)
+
+    assert counts["FactJourneyStep"] == 20
+    assert counts["DimJourney"] == 2
+    assert counts["DimRecording"] == 40
+    for table in counts:
+        csv = f"{table}.csv"
+        assert (tmp_path / "a" / csv).read_bytes() == (
+            tmp_path / "b" / csv
+        ).read_bytes()
+    assert (tmp_path / "a" / "DimRecording.csv").read_bytes() != (
+        tmp_path / "c" / "DimRecording.csv"
+    ).read_bytes()
+
+
+def test_generation_rejects_empty_journeys(tmp_path):
+    with pytest.raises(ValueError):
+        generate_synthetic_dwh(tmp_path, journeys=3, steps=2, recordings=10)
+
+
+def test_compare_results_flags_only_real_regressions():
+    baseline = {"timings": {"build_ms": 100.0, "query_ms": 2.0, "gone_ms": 1.0}}
+    results = {"timings": {"build_ms": 140.0, "query_ms": 4.0}}
+
+    assert compare_results(results, baseline) == [("build_ms", 100.0, 140.0)]
+    assert compare_results(results, baseline, tolerance=0.5) == []
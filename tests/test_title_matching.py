@@ -0,0 +1,53 @@
+from src.title_matching import match_titles, title_key
+
+
+def test_title_key_normalizes_editions_and_catalogue_numbers():
+    assert title_key("Piano Sonata No.14, Op.27 No.2 - Remastered 2011") == (
+        "piano sonata no 14 op 27 no 2"
+    )
+    assert title_key("Prélude in C# minor (Live)") == "prelude in c sharp minor"
+    assert title_key(None) == ""
+    assert title_key(float("nan")) == ""
+
+
+def test_match_titles_scores_each_pair():
+    matches = match_titles(
+        [
+            "Clair de lune",
+            "Gymnopédie No. 1",
+            "II. Adagio sostenuto",
+            "The Four Seasons: Spring, Allegro",
+            "Symphony No. 5",
+            None,
+        ],
+        [
+            "clair de lune ",
+            "Gymnopedie No.1 - Remastered",
+            "Piano Sonata No. 14, Op. 27 No. 2: II. Adagio sostenuto",
+            "The Four Seasons - Spring: Largo",
+            "Goldberg Variations",
+            "Anything",
+        ],
+    )
+
+    assert list(matches["SpotifyTitleReason"]) == [
+        "exact",
+        "normalized",
+        "contained",
+        "similar",
+        "mismatch",
+        "mismatch",
+    ]
+    assert list(matches["SpotifyTitleScore"][:2]) == [1.0, 1.0]
+    assert matches["SpotifyTitleScore"][3] == 0.8
+    assert matches["SpotifyTitleScore"][4] < 0.8
+    assert matches["SpotifyTitleKey"][1] == "gymnopedie no 1"
+
+
+def test_single_token_titles_are_not_contained_in_longer_ones():
+    matches = match_titles(
+        ["Adagio", "Adagio sostenuto"],
+        ["Piano Sonata No. 14: II. Adagio", "Sonata No. 14: Adagio sostenuto"],
+    )
+
+    assert list(matches["SpotifyTitleReason"]) == ["mismatch", "contained"]
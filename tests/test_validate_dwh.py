@@ -0,0 +1,34 @@
+import sqlite3
+
+from src.validate_dwh import validate_dwh
+
+
+def test_synthetic_dwh_passes(dwh, tmp_path):
+    report = validate_dwh(str(dwh), str(tmp_path / "report.json"), spotify=False)
+
+    assert report["ok"]
+    assert report["summary"]["error_rows"] == 0
+    assert (tmp_path / "report.json").exists()
+
+
+def test_orphan_step_fails(dwh, tmp_path):
+    with sqlite3.connect(dwh) as connection:
+        connection.execute(
+            "UPDATE FactJourneyStep SET JourneyID = 'missing' "
+            "WHERE JourneyStepID = (SELECT MIN(JourneyStepID) FROM FactJourneyStep)"
+        )
+
+    report = validate_dwh(str(dwh), str(tmp_path / "report.json"), spotify=False)
+
+    orphans = {c["name"]: c["count"] for c in report["checks"]}["step_orphan_journey"]
+    assert not report["ok"]
+    assert orphans == 1
+
+
+def test_spotify_check_skipped_without_credentials(dwh, tmp_path, monkeypatch):
+    for variable in ("SPOTIPY_CLIENT_ID", "SPOTIPY_CLIENT_SECRET"):
+        monkeypatch.delenv(variable, raising=False)
+
+    report = validate_dwh(str(dwh), str(tmp_path / "report.json"), spotify=True)
+
+    assert report["spotify"] is None
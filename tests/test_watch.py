@@ -0,0 +1,133 @@
+import csv
+import logging
+import os
+
+from sqlalchemy import create_engine, text
+
+from src.build_dwh import apply_csv_delta
+from src.db import get_engine, raw_connection
+from src.sync_journey_md_to_db import TEMPLATE_FILES
+from src.watch import FileWatcher, apply_changes
+
+ESSAY = """# Night Music
+
+## Act I: Dusk
+- **Performer:** Performer 1
+- **Album:** Album 1
+- **Why This Recording:** It opens quietly.
+"""
+
+TEMPLATE = """# {{ theme }}
+
+1. **Performer:** <performer>
+2. **Album:** <album>
+"""
+
+
+def _touch(path, content):
+    path.write_text(content, encoding="utf-8")
+    # Make sure the (mtime, size) signature moves even on coarse clocks
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 1))
+
+
+def test_file_watcher_ignores_prompt_templates(tmp_path):
+    journeys = tmp_path / "journeys"
+    journeys.mkdir()
+    watcher = FileWatcher([str(journeys / "*.md")])
+
+    for name in TEMPLATE_FILES:
+        _touch(journeys / name, TEMPLATE)
+    _touch(journeys / "NIGHT_01.md", ESSAY)
+    assert watcher.poll() == [str(journeys / "NIGHT_01.md")]
+
+    for name in TEMPLATE_FILES:
+        _touch(journeys / name, TEMPLATE + "\nEdited.\n")
+    assert watcher.poll() == []
+
+
+def test_apply_changes_does_not_sync_templates(dwh, tmp_path):
+    journeys = tmp_path / "journeys"
+    journeys.mkdir()
+    template = journeys / TEMPLATE_FILES[0]
+    essay = journeys / "NIGHT_01.md"
+    _touch(template, TEMPLATE)
+    _touch(essay, ESSAY)
+
+    connection = raw_connection()
+    try:
+        assert (
+            apply_changes(
+                get_engine(),
+                connection,
+                [str(template)],
+                logging.getLogger("test"),
+            )
+            is False
+        )
+        assert (
+            apply_changes(
+                get_engine(),
+                connection,
+                [str(template), str(essay)],
+                logging.getLogger("test"),
+            )
+            is True
+        )
+        journey_ids = {
+            row[0] for row in connection.execute("SELECT JourneyID FROM DimJourney")
+        }
+    finally:
+        connection.close()
+    assert "NIGHT_01" in journey_ids
+    assert os.path.splitext(TEMPLATE_FILES[0])[0] not in journey_ids
+
+
+def test_apply_csv_delta_touches_only_changed_rows(dwh, tmp_path):
+    csv_path = tmp_path / "data" / "DimJourney.csv"
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    rows[0]["JourneyName"] = "Renamed Journey"
+    del rows[1]
+    rows.append(dict(rows[-1], JourneyID="SYN999999", JourneyName="New Journey"))
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    with get_engine().begin() as connection:
+        assert apply_csv_delta(connection, "DimJourney", str(csv_path)) == (1, 1, 1)
+        assert apply_csv_delta(connection, "DimJourney", str(csv_path)) == (0, 0, 0)
+        names = {
+            journey_id: name
+            for journey_id, name in connection.exec_driver_sql(
+                "SELECT JourneyID, JourneyName FROM DimJourney"
+            )
+        }
+    assert names[rows[0]["JourneyID"]] == "Renamed Journey"
+    assert names["SYN999999"] == "New Journey"
+    assert len(names) == len(rows)
+
+
+def test_apply_csv_delta_matches_keys_with_null_columns(tmp_path):
+    engine = create_engine("sqlite://")
+    csv_path = tmp_path / "Notes.csv"
+    csv_path.write_text("Title,Part,Note\nA,,new\nB,1,kept\n", encoding="utf-8")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE Notes (Title TEXT, Part TEXT, Note TEXT, UNIQUE (Title, Part))"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO Notes VALUES ('A', NULL, 'old'), ('B', '1', 'kept'), "
+                "('C', NULL, 'gone')"
+            )
+        )
+
+        assert apply_csv_delta(connection, "Notes", str(csv_path)) == (0, 1, 1)
+        rows = connection.execute(
+            text("SELECT Title, Part, Note FROM Notes ORDER BY Title")
+        ).fetchall()
+    assert [tuple(row) for row in rows] == [("A", None, "new"), ("B", "1", "kept")]